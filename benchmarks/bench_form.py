@@ -0,0 +1,63 @@
+"""
+Benchmark of the application/x-www-form-urlencoded serialization of messages.
+
+Times `to_urlencoded` and `from_urlencoded` of typical authorization and access
+token requests. Run it on two revisions to compare them.
+
+Run with: python benchmarks/bench_form.py [number of iterations]
+"""
+import sys
+import time
+
+from oic.oic.message import AccessTokenRequest
+from oic.oic.message import AuthorizationRequest
+
+SHAPES = [
+    (
+        AuthorizationRequest,
+        {
+            "response_type": ["code"],
+            "client_id": "s6BhdRkqt3",
+            "redirect_uri": "https://client.example.org/cb",
+            "scope": ["openid", "profile", "email"],
+            "state": "af0ifjsldkj",
+            "nonce": "n-0S6_WzA2Mj",
+            "prompt": ["consent"],
+            "code_challenge": "E9Melhoa2OwvFrEMTJguCHaoeK1t8URWbuGJSstw-cM",
+            "code_challenge_method": "S256",
+        },
+    ),
+    (
+        AccessTokenRequest,
+        {
+            "grant_type": "authorization_code",
+            "code": "SplxlOBeZQQYbYS6WxSbIA",
+            "redirect_uri": "https://client.example.org/cb",
+            "client_id": "s6BhdRkqt3",
+            "code_verifier": "dBjftJeZ4CVP-mB92K27uhbUJU1p1r_wW1gFWFOEjXk",
+        },
+    ),
+]
+
+
+def run(label, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{:<50} {:>10.0f} ops/s".format(label, count / elapsed))
+
+
+def main(count=20000):
+    for cls, data in SHAPES:
+        msg = cls(**data)
+        txt = msg.to_urlencoded()
+        name = cls.__name__
+        run("{}.to_urlencoded".format(name), msg.to_urlencoded, count)
+        run(
+            "{}.from_urlencoded".format(name), lambda: cls().from_urlencoded(txt), count
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
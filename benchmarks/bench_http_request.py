@@ -0,0 +1,61 @@
+"""
+Benchmark of `PBase.http_request` against a local stand-in OP.
+
+Compares the pooled keep-alive session used by `PBase` with a fresh
+connection per request, as done by the module-level `requests.request`.
+
+Run with: python benchmarks/bench_http_request.py [number of requests]
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import requests
+
+from oic.oauth2.base import PBase
+
+JWKS = json.dumps({"keys": []}).encode("utf-8")
+
+
+class StandInOP(BaseHTTPRequestHandler):
+    """Answers every GET with an empty JWKS, keeping connections alive."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(JWKS)))
+        self.end_headers()
+        self.wfile.write(JWKS)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(label, func, url, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func(url)
+    elapsed = time.perf_counter() - start
+    print("{:<28} {:>10.0f} requests/s".format(label, count / elapsed))
+
+
+def main(count=2000):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInOP)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/jwks".format(server.server_port)
+
+    try:
+        run("requests.request", lambda u: requests.request("GET", u), url, count)
+        run("PBase.http_request", PBase().http_request, url, count)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,77 @@
+"""
+Benchmark of ID Token signing by the provider.
+
+Compares picking the signing key and signing through `Message.to_jwt` for
+every token with the signers cached by `Provider.id_token_signer`, and
+signing a batch of RSA signed tokens over a pool of processes.
+
+Run with: python benchmarks/bench_id_token.py [number of tokens]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Cryptodome.PublicKey import RSA
+
+from oic.oic.message import IdToken
+from oic.oic.provider import Provider
+from oic.utils.jwt import sign_many
+from oic.utils.keyio import KeyBundle
+
+CLIENT_ID = "client_1"
+
+
+def run(label, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{:<28} {:>10.0f} tokens/s".format(label, count / elapsed))
+
+
+def main(count=2000):
+    provider = Provider("https://op.example.com", {}, {}, None, None, None, None, None)
+    provider.keyjar[""] = KeyBundle(
+        [{"kty": "RSA", "key": RSA.generate(2048), "use": "sig", "kid": "rsa1"}]
+    )
+    provider.cdb = {CLIENT_ID: {"client_secret": "abcdefghijklmnopqrstuvwxyz012345"}}
+
+    now = int(time.time())
+    idt = IdToken(
+        iss=provider.name,
+        sub="248289761001",
+        aud=CLIENT_ID,
+        exp=now + 3600,
+        iat=now,
+        nonce="n-0S6_WzA2Mj",
+    )
+
+    for alg, _count in [("HS256", count * 10), ("RS256", count)]:
+
+        def uncached():
+            keys = provider._id_token_signing_keys(alg, CLIENT_ID, provider.keyjar)
+            idt.to_jwt(keys, alg)
+
+        def cached():
+            provider.id_token_signer(alg, CLIENT_ID).sign(idt.to_json())
+
+        run("{} Message.to_jwt".format(alg), uncached, _count)
+        run("{} id_token_signer".format(alg), cached, _count)
+
+    jobs = [(provider.id_token_signer("RS256", CLIENT_ID), idt.to_json())] * count
+    with ProcessPoolExecutor() as executor:
+        # Start the worker processes
+        sign_many(jobs[:1], executor)
+        start = time.perf_counter()
+        sign_many(jobs, executor)
+        elapsed = time.perf_counter() - start
+    print(
+        "{:<28} {:>10.0f} tokens/s".format(
+            "RS256 batch, {} processes".format(os.cpu_count()), count / elapsed
+        )
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,160 @@
+"""
+Benchmark of the JSON serialization of messages.
+
+Times `to_json` and `from_json` of provider configuration, registration, ID
+token and access token responses with the standard library codec, and with
+orjson when it is installed.
+
+Run with: python benchmarks/bench_json.py [number of iterations]
+"""
+import sys
+import time
+
+from oic.oic.message import AccessTokenResponse
+from oic.oic.message import IdToken
+from oic.oic.message import ProviderConfigurationResponse
+from oic.oic.message import RegistrationResponse
+from oic.utils.json_codec import JSONCodec
+from oic.utils.json_codec import set_json_codec
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ISSUER = "https://op.example.com"
+
+SHAPES = [
+    (
+        ProviderConfigurationResponse,
+        {
+            "issuer": ISSUER,
+            "authorization_endpoint": ISSUER + "/authorization",
+            "token_endpoint": ISSUER + "/token",
+            "userinfo_endpoint": ISSUER + "/userinfo",
+            "jwks_uri": ISSUER + "/jwks",
+            "registration_endpoint": ISSUER + "/registration",
+            "end_session_endpoint": ISSUER + "/end_session",
+            "scopes_supported": ["openid", "profile", "email", "address", "phone"],
+            "response_types_supported": [
+                "code",
+                "id_token",
+                "code id_token",
+                "id_token token",
+                "code id_token token",
+            ],
+            "response_modes_supported": ["query", "fragment", "form_post"],
+            "grant_types_supported": ["authorization_code", "implicit"],
+            "subject_types_supported": ["public", "pairwise"],
+            "id_token_signing_alg_values_supported": ["RS256", "ES256", "HS256"],
+            "userinfo_signing_alg_values_supported": ["RS256", "ES256", "none"],
+            "request_object_signing_alg_values_supported": ["RS256", "ES256"],
+            "token_endpoint_auth_methods_supported": [
+                "client_secret_basic",
+                "client_secret_post",
+                "client_secret_jwt",
+                "private_key_jwt",
+            ],
+            "claims_supported": [
+                "sub",
+                "iss",
+                "auth_time",
+                "name",
+                "given_name",
+                "family_name",
+                "email",
+                "email_verified",
+            ],
+            "claims_parameter_supported": True,
+            "request_uri_parameter_supported": True,
+            "require_request_uri_registration": False,
+        },
+    ),
+    (
+        RegistrationResponse,
+        {
+            "client_id": "s6BhdRkqt3",
+            "client_secret": "ZJYCqe3GGRvdrudKyZS0XhGv_Z45DuKhCUk0gBR1vZk",
+            "client_id_issued_at": 1311280970,
+            "client_secret_expires_at": 0,
+            "registration_access_token": "this.is.an.access.token.value.ffx83",
+            "registration_client_uri": ISSUER + "/registration?client_id=s6BhdRkqt3",
+            "redirect_uris": [
+                "https://client.example.org/callback",
+                "https://client.example.org/callback2",
+            ],
+            "response_types": ["code"],
+            "grant_types": ["authorization_code", "refresh_token"],
+            "application_type": "web",
+            "client_name": "My Example",
+            "logo_uri": "https://client.example.org/logo.png",
+            "token_endpoint_auth_method": "client_secret_basic",
+            "jwks_uri": "https://client.example.org/my_public_keys.jwks",
+            "id_token_signed_response_alg": "RS256",
+            "contacts": ["ve7jtb@example.org", "mary@example.org"],
+        },
+    ),
+    (
+        IdToken,
+        {
+            "iss": ISSUER,
+            "sub": "248289761001",
+            "aud": ["s6BhdRkqt3"],
+            "exp": 1311281970,
+            "iat": 1311280970,
+            "auth_time": 1311280969,
+            "nonce": "n-0S6_WzA2Mj",
+            "acr": "urn:mace:incommon:iap:silver",
+            "at_hash": "77QmUPtjPfzWtF2AnpK9RQ",
+            "c_hash": "LDktKdoQak3Pk0cnXxCltA",
+        },
+    ),
+    (
+        AccessTokenResponse,
+        {
+            "access_token": "SlAV32hkKG",
+            "token_type": "Bearer",
+            "refresh_token": "8xLOxBtZp8",
+            "expires_in": 3600,
+            "scope": ["openid", "profile"],
+            "id_token": "eyJhbGciOiJSUzI1NiIsImtpZCI6IjFlOWdkazcifQ.ewogImlzcyI6ICJo"
+            "dHRwOi8vc2VydmVyLmV4YW1wbGUuY29tIiwKICJzdWIiOiAiMjQ4Mjg5NzYxMDAxIn0."
+            "ggW8hZ1EuVLuxNuuIJKX_V8a_OMXzR0EHR9R6jgdqrOOF4daGU96Sr_P6qJp6IcmD3HP9",
+        },
+    ),
+]
+
+CODECS = [("json", None)]
+if orjson is not None:
+    CODECS.append(
+        (
+            "orjson",
+            JSONCodec(dumps=lambda obj: orjson.dumps(obj).decode(), loads=orjson.loads),
+        )
+    )
+
+
+def run(label, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{:<50} {:>10.0f} ops/s".format(label, count / elapsed))
+
+
+def main(count=20000):
+    try:
+        for codec_name, codec in CODECS:
+            set_json_codec(codec)
+            for cls, data in SHAPES:
+                msg = cls(**data)
+                txt = msg.to_json()
+                name = "{} {}".format(codec_name, cls.__name__)
+                run("{}.to_json".format(name), msg.to_json, count)
+                run("{}.from_json".format(name), lambda: cls().from_json(txt), count)
+    finally:
+        set_json_codec(None)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
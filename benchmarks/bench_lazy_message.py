@@ -0,0 +1,102 @@
+"""
+Benchmark of building messages from JSON lazily.
+
+Compares `from_json` with and without `lazy` when a single field of the message
+is read afterwards, for an authorization request with a claims request and a
+provider configuration, and the memory allocated to build each message.
+
+Run with: python benchmarks/bench_lazy_message.py [number of iterations]
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from oic.oic.message import AuthorizationRequest
+from oic.oic.message import ProviderConfigurationResponse
+
+ISSUER = "https://op.example.com"
+
+SHAPES = [
+    (
+        AuthorizationRequest,
+        "state",
+        {
+            "response_type": ["code"],
+            "client_id": "s6BhdRkqt3",
+            "redirect_uri": "https://client.example.org/cb",
+            "scope": ["openid", "profile", "email"],
+            "state": "af0ifjsldkj",
+            "nonce": "n-0S6_WzA2Mj",
+            "claims": {
+                "userinfo": {
+                    "given_name": {"essential": True},
+                    "email": {"essential": True},
+                    "email_verified": {"essential": True},
+                    "picture": None,
+                },
+                "id_token": {
+                    "auth_time": {"essential": True},
+                    "acr": {"values": ["urn:mace:incommon:iap:silver"]},
+                },
+            },
+        },
+    ),
+    (
+        ProviderConfigurationResponse,
+        "issuer",
+        {
+            "issuer": ISSUER,
+            "authorization_endpoint": ISSUER + "/authorization",
+            "token_endpoint": ISSUER + "/token",
+            "userinfo_endpoint": ISSUER + "/userinfo",
+            "jwks_uri": ISSUER + "/jwks",
+            "registration_endpoint": ISSUER + "/registration",
+            "scopes_supported": ["openid", "profile", "email", "address", "phone"],
+            "response_types_supported": ["code", "id_token", "code id_token"],
+            "subject_types_supported": ["public", "pairwise"],
+            "id_token_signing_alg_values_supported": ["RS256", "ES256", "HS256"],
+            "token_endpoint_auth_methods_supported": [
+                "client_secret_basic",
+                "client_secret_post",
+                "private_key_jwt",
+            ],
+            "claims_supported": ["sub", "iss", "name", "email", "email_verified"],
+            "claims_parameter_supported": True,
+            "request_uri_parameter_supported": True,
+        },
+    ),
+]
+
+
+def run(label, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{:<50} {:>10.0f} ops/s".format(label, count / elapsed))
+
+
+def allocated(func):
+    tracemalloc.start()
+    func()
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size
+
+
+def main(count=20000):
+    for cls, key, data in SHAPES:
+        txt = json.dumps(data)
+        for lazy in [False, True]:
+            label = "{} {}".format(cls.__name__, "lazy" if lazy else "eager")
+
+            def read():
+                return cls().from_json(txt, lazy=lazy)[key]
+
+            run(label, read, count)
+            print("{:<50} {:>10} bytes".format(label, allocated(read)))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,99 @@
+"""
+Benchmark of `Message` construction and serialization.
+
+Times building messages from dicts, `to_urlencoded`, `to_dict` and `verify`
+for typical request and response shapes. Run it on two revisions to compare
+them.
+
+Run with: python benchmarks/bench_message.py [number of iterations]
+"""
+import sys
+import time
+
+from oic.oic.message import AccessTokenResponse
+from oic.oic.message import AuthorizationRequest
+from oic.oic.message import OpenIDSchema
+from oic.oic.message import ProviderConfigurationResponse
+
+ISSUER = "https://op.example.com"
+
+SHAPES = [
+    (
+        AuthorizationRequest,
+        {
+            "response_type": ["code"],
+            "client_id": "s6BhdRkqt3",
+            "redirect_uri": "https://client.example.org/cb",
+            "scope": ["openid", "profile", "email"],
+            "state": "af0ifjsldkj",
+            "nonce": "n-0S6_WzA2Mj",
+            "prompt": ["consent"],
+        },
+    ),
+    (
+        AccessTokenResponse,
+        {
+            "access_token": "SlAV32hkKG",
+            "token_type": "Bearer",
+            "refresh_token": "8xLOxBtZp8",
+            "expires_in": 3600,
+            "scope": ["openid", "profile"],
+        },
+    ),
+    (
+        OpenIDSchema,
+        {
+            "sub": "248289761001",
+            "name": "Jane Doe",
+            "name#ja-Kana-JP": "ジェーン ドウ",
+            "given_name": "Jane",
+            "family_name": "Doe",
+            "email": "janedoe@example.com",
+            "email_verified": True,
+            "address": {"country": "US", "locality": "Anytown"},
+            "updated_at": 1311280970,
+        },
+    ),
+    (
+        ProviderConfigurationResponse,
+        {
+            "issuer": ISSUER,
+            "authorization_endpoint": ISSUER + "/authorization",
+            "token_endpoint": ISSUER + "/token",
+            "userinfo_endpoint": ISSUER + "/userinfo",
+            "jwks_uri": ISSUER + "/jwks",
+            "registration_endpoint": ISSUER + "/registration",
+            "scopes_supported": ["openid", "profile", "email", "address"],
+            "response_types_supported": ["code", "id_token", "code id_token"],
+            "subject_types_supported": ["public", "pairwise"],
+            "id_token_signing_alg_values_supported": ["RS256", "ES256"],
+            "token_endpoint_auth_methods_supported": [
+                "client_secret_basic",
+                "private_key_jwt",
+            ],
+            "claims_supported": ["sub", "iss", "name", "email"],
+        },
+    ),
+]
+
+
+def run(label, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{:<50} {:>10.0f} ops/s".format(label, count / elapsed))
+
+
+def main(count=20000):
+    for cls, data in SHAPES:
+        msg = cls(**data)
+        name = cls.__name__
+        run("{} construct".format(name), lambda: cls(**data), count)
+        run("{}.to_urlencoded".format(name), msg.to_urlencoded, count)
+        run("{}.to_dict".format(name), msg.to_dict, count)
+        run("{}.verify".format(name), msg.verify, count)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,85 @@
+"""
+Benchmark of the refresh token storage.
+
+Compares the dict storing a deep copy of the session for every refresh token
+with `RefreshTokenFamilies`: the memory per active refresh token and the rate
+at which refresh tokens are issued and checked.
+
+Run with: python benchmarks/bench_refresh_token.py [number of iterations]
+"""
+import sys
+import time
+import tracemalloc
+
+import oic.oauth2  # noqa: F401 Imports oic.utils.sdb, which can not be imported first
+from oic.oic.message import AuthorizationRequest
+from oic.utils.sdb import DefaultToken
+from oic.utils.session_backend import AuthnEvent
+from oic.utils.session_backend import SessionRecord
+from oic.utils.token_family import RefreshTokenFamilies
+
+AREQ = AuthorizationRequest(
+    response_type=["code"],
+    client_id="s6BhdRkqt3",
+    redirect_uri="https://client.example.org/cb",
+    scope=["openid", "offline_access"],
+    state="af0ifjsldkj",
+    nonce="n-0S6_WzA2Mj",
+)
+
+
+def session(index):
+    return SessionRecord(
+        oauth_state="token",
+        code="A_" + "x" * 160,
+        code_used=True,
+        authzreq=AREQ.to_json(),
+        client_id=AREQ["client_id"],
+        response_type=AREQ["response_type"],
+        revoked=False,
+        authn_event=AuthnEvent("user{}".format(index), "salt").to_json(),
+        scope=AREQ["scope"],
+        sub="{:064d}".format(index),
+        access_token="T_" + "x" * 160,
+        token_type="Bearer",
+    )
+
+
+def run(label, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{:<28} {:>10.0f} x/s".format(label, count / elapsed))
+
+
+def memory(storage, sessions):
+    factory = DefaultToken("secret", "password", typ="R", token_storage=storage)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i, sinfo in enumerate(sessions):
+        factory(sid="sid{}".format(i), sinfo=sinfo)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used // len(sessions)
+
+
+def main(count=5000):
+    sessions = [session(i) for i in range(1000)]
+    print("dict memory per token:     {} bytes".format(memory({}, sessions)))
+    print(
+        "families memory per token: {} bytes".format(
+            memory(RefreshTokenFamilies(), sessions)
+        )
+    )
+
+    sinfo = sessions[0]
+    for label, storage in (("dict", {}), ("families", RefreshTokenFamilies())):
+        factory = DefaultToken("secret", "password", typ="R", token_storage=storage)
+        run("{} issue".format(label), lambda: factory(sid="sid", sinfo=sinfo), count)
+        token = factory(sid="sid", sinfo=sinfo)
+        run("{} valid".format(label), lambda: factory.valid(token), count)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,92 @@
+"""
+Benchmark of the session representation.
+
+Compares a session kept as a dict with a `SessionRecord`: the memory per
+session, the size and decoding time of the JSON and binary serializations and
+the cost of getting the AuthnEvent of a session, as done a few times per request.
+
+Run with: python benchmarks/bench_session.py [number of iterations]
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from oic.oic.message import AuthorizationRequest
+from oic.utils.session_backend import AuthnEvent
+from oic.utils.session_backend import SessionRecord
+from oic.utils.session_backend import session_authn_event
+
+AREQ = AuthorizationRequest(
+    response_type=["code"],
+    client_id="s6BhdRkqt3",
+    redirect_uri="https://client.example.org/cb",
+    scope=["openid", "profile", "email"],
+    state="af0ifjsldkj",
+    nonce="n-0S6_WzA2Mj",
+)
+
+SESSION = {
+    "oauth_state": "token",
+    "code": "A_" + "x" * 160,
+    "code_used": True,
+    "authzreq": AREQ.to_json(),
+    "client_id": AREQ["client_id"],
+    "response_type": AREQ["response_type"],
+    "revoked": False,
+    "authn_event": AuthnEvent("diana", "salt").to_json(),
+    "nonce": AREQ["nonce"],
+    "redirect_uri": AREQ["redirect_uri"],
+    "state": AREQ["state"],
+    "scope": AREQ["scope"],
+    "sub": "a" * 64,
+    "access_token": "T_" + "x" * 160,
+    "access_token_scope": "?",
+    "token_type": "Bearer",
+}
+
+
+def run(label, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{:<28} {:>10.0f} x/s".format(label, count / elapsed))
+
+
+def memory(factory, count=1000):
+    # The values are shared, only the containers are measured
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [factory(SESSION) for _ in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del sessions
+    return used // count
+
+
+def main(count=20000):
+    record = SessionRecord(SESSION)
+    as_json = json.dumps(SESSION)
+    as_bytes = record.to_bytes()
+
+    print("dict memory per session:      {} bytes".format(memory(dict)))
+    print("record memory per session:    {} bytes".format(memory(SessionRecord)))
+    print("JSON serialization:           {} bytes".format(len(as_json)))
+    print("binary serialization:         {} bytes".format(len(as_bytes)))
+    run("json.loads", lambda: json.loads(as_json), count)
+    run("SessionRecord.from_bytes", lambda: SessionRecord.from_bytes(as_bytes), count)
+    run(
+        "dict authn_event x3",
+        lambda: [session_authn_event(SESSION) for _ in "abc"],
+        count,
+    )
+    run(
+        "record authn_event x3",
+        lambda: [session_authn_event(record) for _ in "abc"],
+        count,
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
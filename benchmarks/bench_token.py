@@ -0,0 +1,36 @@
+"""
+Benchmark of the `DefaultToken` formats.
+
+Times issuing and decoding tokens in the "fernet" and "aead" formats and shows
+the length of the tokens. Decoding bypasses the cache of decoded tokens.
+
+Run with: python benchmarks/bench_token.py [number of iterations]
+"""
+import sys
+import time
+
+import oic.oauth2  # noqa: F401 Imports oic.utils.sdb, which can not be imported first
+from oic.utils.sdb import DefaultToken
+
+SID = "f9b8c2d2c3a4e0a6b9e5b8c9e8d2e6f1a7c3b4d5e6f7a8b9c0d1e2f3"
+
+
+def run(label, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{:<28} {:>10.0f} x/s".format(label, count / elapsed))
+
+
+def main(count=20000):
+    for codec in DefaultToken.CODECS:
+        factory = DefaultToken("secret", "password", typ="T", codec=codec)
+        token = factory(sid=SID)
+        print("{} token length: {}".format(codec, len(token)))
+        run("{} issue".format(codec), lambda: factory(sid=SID), count)
+        run("{} decode".format(codec), lambda: factory._split_token(token), count)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
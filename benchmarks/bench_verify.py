@@ -0,0 +1,76 @@
+"""
+Benchmark of the checks done by `Message.verify`.
+
+Every message class of the OAuth 2.0, OpenID Connect and extension modules is
+filled with a value for each of its parameters, an allowed one where the
+values are restricted, and the checks common to all messages are timed. The
+checks added by subclasses are left out. Run it on two revisions to compare them.
+
+Run with: python benchmarks/bench_verify.py [number of iterations]
+"""
+import sys
+import time
+
+from oic.extension import message as extension_message
+from oic.oauth2 import message as oauth2_message
+from oic.oauth2.message import Message
+from oic.oic import message as oic_message
+
+
+def message_classes():
+    classes = {}
+    for module in [oauth2_message, oic_message, extension_message]:
+        for obj in vars(module).values():
+            if isinstance(obj, type) and issubclass(obj, Message):
+                classes.setdefault(obj, None)
+    return list(classes)
+
+
+def sample(cparam, allowed):
+    if isinstance(cparam.type, list):
+        return [allowed[0] if allowed else "value"]
+    if allowed:
+        return allowed[0]
+    if cparam.type is int:
+        return 1
+    if cparam.type is bool:
+        return True
+    if cparam.type is dict:
+        return {"key": "value"}
+    if isinstance(cparam.type, type) and issubclass(cparam.type, Message):
+        return Message(key="value")
+    return "value"
+
+
+def filled(cls):
+    msg = cls()
+    for key, cparam in cls.c_param.items():
+        if key != "*":
+            msg._dict[key] = sample(cparam, cls.c_allowed_values.get(key))
+    return msg
+
+
+def run(label, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{:<50} {:>10.0f} ops/s".format(label, count / elapsed))
+    return elapsed
+
+
+def main(count=20000):
+    messages = [filled(cls) for cls in message_classes()]
+    elapsed = 0.0
+    for msg in messages:
+        label = "{}.{}".format(msg.__module__.split(".")[1], msg.type())
+        elapsed += run(label, lambda: Message.verify(msg), count)
+    print(
+        "{:<50} {:>10.0f} ops/s".format(
+            "All {} classes".format(len(messages)), len(messages) * count / elapsed
+        )
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -79,6 +79,7 @@ setup(
         'docs': ['Sphinx', 'sphinx-autobuild', 'alabaster'],
         'quality': ['pylama', 'isort', 'eradicate', 'mypy', 'black', 'bandit', 'readme_renderer[md]'],
         'ldap_authn': ['pyldap'],
+        'async': ['aiohttp'],
     },
     install_requires=[
         "requests",
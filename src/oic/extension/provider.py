@@ -1,4 +1,3 @@
-import json
 import logging
 import socket
 from typing import Dict
@@ -45,6 +44,7 @@ from oic.utils.keyio import KeyJar
 from oic.utils.sanitize import sanitize
 from oic.utils.sdb import AccessCodeUsed
 from oic.utils.sdb import AuthnEvent
+from oic.utils.session_backend import session_authzreq
 from oic.utils.time_util import utc_time_sans_frac
 from oic.utils.token_handler import NotAllowed
 from oic.utils.token_handler import TokenHandler
@@ -117,6 +117,7 @@ class Provider(provider.Provider):
         behavior=None,
         lifetime_policy=None,
         message_factory=ExtensionMessageFactory,
+        jti_store=None,
         **kwargs,
     ):
 
@@ -206,7 +207,7 @@ class Provider(provider.Provider):
             self.lifetime_policy = lifetime_policy
 
         self.token_handler = TokenHandler(
-            self.baseurl, self.token_policy, keyjar=self.keyjar
+            self.baseurl, self.token_policy, keyjar=self.keyjar, jti_store=jti_store
         )
 
     @staticmethod
@@ -597,7 +598,7 @@ class Provider(provider.Provider):
                 err.to_json(), content="application/json", status="401 Unauthorized"
             )
 
-        authzreq = json.loads(_info["authzreq"])
+        authzreq = session_authzreq(_info)
         if "code_verifier" in areq:
             try:
                 _method = authzreq["code_challenge_method"]
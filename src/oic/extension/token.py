@@ -1,13 +1,17 @@
 import json
 import uuid
-from typing import Dict
+
+from jwkest import b64d
 
 from oic.oauth2.message import OPTIONAL_LIST_OF_STRINGS
 from oic.oauth2.message import SINGLE_REQUIRED_STRING
 from oic.oauth2.message import Message
 from oic.oic.message import SINGLE_REQUIRED_INT
+from oic.utils.jti_store import MemoryJTIStore
 from oic.utils.jwt import JWT
+from oic.utils.sdb import ParsedToken
 from oic.utils.sdb import Token
+from oic.utils.session_backend import session_authzreq
 from oic.utils.time_util import utc_time_sans_frac
 
 __author__ = "roland"
@@ -28,13 +32,30 @@ class TokenAssertion(Message):
 class JWTToken(Token, JWT):
     usage = "authorization_grant"
 
-    def __init__(self, typ, keyjar, lt_pattern=None, extra_claims=None, **kwargs):
+    def __init__(
+        self,
+        typ,
+        keyjar,
+        lt_pattern=None,
+        extra_claims=None,
+        jti_store=None,
+        **kwargs,
+    ):
+        """
+        Initialize the factory.
+
+        :param typ: Type of the tokens
+        :param keyjar: KeyJar with the keys to sign and verify the tokens with
+        :param lt_pattern: Lifetimes of the tokens per response or grant type
+        :param extra_claims: Claims added to all tokens
+        :param jti_store: JTIStore with the active tokens, defaults to a MemoryJTIStore
+        """
         self.type = typ
         Token.__init__(self, typ, **kwargs)
         kwargs.pop("token_storage", None)
         JWT.__init__(self, keyjar, msgtype=TokenAssertion, **kwargs)
         self.lt_pattern = lt_pattern or {}
-        self.db: Dict[str, str] = {}
+        self.db = MemoryJTIStore() if jti_store is None else jti_store
         self.session_info = {"": 600}
         self.exp_args = ["sinfo"]
         self.extra_claims = extra_claims or {}
@@ -60,7 +81,7 @@ class JWTToken(Token, JWT):
                 try:
                     _scope = _sinfo["scope"]
                 except KeyError:
-                    ar = json.loads(_sinfo["authzreq"])
+                    ar = session_authzreq(_sinfo)
                     try:
                         _scope = ar["scope"]
                     except KeyError:
@@ -104,7 +125,7 @@ class JWTToken(Token, JWT):
 
         _jti = "{}-{}".format(self.type, uuid.uuid4().hex)
         _jwt = self.pack(jti=_jti, exp=exp, **kwargs)
-        self.db[_jti] = sid
+        self.db.add(_jti, sid, exp)
         return _jwt
 
     def do_exp(self, **kwargs):
@@ -133,6 +154,31 @@ class JWTToken(Token, JWT):
         msg = self.unpack(token)
         return self.type, self.db[msg["jti"]]
 
+    def parse(self, token):
+        """
+        Unpack the token once.
+
+        :param token: A token
+        :return: A ParsedToken
+        """
+        msg = self.unpack(token)
+        return ParsedToken(self.type, self.db[msg["jti"]], msg.get("iat"), msg["exp"])
+
+    def peek_type(self, token):
+        """
+        Return the type a token claims to have, read from the jti without verifying the signature.
+
+        :param token: A token
+        :return: The claimed type or None if not a signed JWT
+        """
+        if token.count(".") != 2:
+            return None
+        try:
+            jti = json.loads(b64d(token.split(".")[1].encode("utf-8")))["jti"]
+        except Exception:
+            return None
+        return jti.split("-")[0]
+
     def get_key(self, token):
         """
         Return session id.
@@ -865,25 +865,26 @@ class Client(PBase):
 
         return resp
 
-    def do_access_token_request(
+    def access_token_request_info(
         self,
         scope: str = "",
         state: str = "",
-        body_type: ENCODINGS = "json",
         method="POST",
         request_args=None,
         extra_args=None,
         http_args=None,
         authn_method="",
         **kwargs,
-    ) -> AccessTokenResponse:
+    ) -> Tuple[str, str, Dict]:
+        """
+        Construct an access token request.
 
+        :return: Tuple of the URL, the body and the arguments for the HTTP client
+        """
         request = self.message_factory.get_request_type("token_endpoint")
-        response_cls = self.message_factory.get_response_type("token_endpoint")
 
         if extra_args is None:
             extra_args = {}
-        kwargs["authn_endpoint"] = "token"
         if http_args is not None and "password" in http_args:
             extra_args["password"] = http_args.pop("password")
 
@@ -910,6 +911,35 @@ class Client(PBase):
             self.events.store("Request", body)
 
         logger.debug("<do_access_token> URL: %s, Body: %s" % (url, sanitize(body)))
+        return url, body, http_args
+
+    def do_access_token_request(
+        self,
+        scope: str = "",
+        state: str = "",
+        body_type: ENCODINGS = "json",
+        method="POST",
+        request_args=None,
+        extra_args=None,
+        http_args=None,
+        authn_method="",
+        **kwargs,
+    ) -> AccessTokenResponse:
+
+        response_cls = self.message_factory.get_response_type("token_endpoint")
+
+        kwargs["authn_endpoint"] = "token"
+        url, body, http_args = self.access_token_request_info(
+            scope=scope,
+            state=state,
+            method=method,
+            request_args=request_args,
+            extra_args=extra_args,
+            http_args=http_args,
+            authn_method=authn_method,
+            **kwargs,
+        )
+
         logger.debug("<do_access_token> response_cls: %s" % response_cls)
 
         return self.request_and_return(
@@ -923,23 +953,24 @@ class Client(PBase):
             **kwargs,
         )
 
-    def do_access_token_refresh(
+    def access_token_refresh_info(
         self,
         state: str = "",
-        body_type: ENCODINGS = "json",
         method="POST",
         request_args=None,
         extra_args=None,
         http_args=None,
         authn_method="",
         **kwargs,
-    ) -> AccessTokenResponse:
+    ) -> Tuple[str, str, Dict, Token]:
+        """
+        Construct an access token refresh request.
 
+        :return: Tuple of the URL, the body, the arguments for the HTTP client and the token being refreshed
+        """
         request = self.message_factory.get_request_type("refresh_endpoint")
-        response_cls = self.message_factory.get_response_type("refresh_endpoint")
 
         token = self.get_token(also_expired=True, state=state, **kwargs)
-        kwargs["authn_endpoint"] = "refresh"
         url, body, ht_args, csi = self.request_info(
             request,
             method=method,
@@ -954,6 +985,32 @@ class Client(PBase):
         else:
             http_args.update(ht_args)
 
+        return url, body, http_args, token
+
+    def do_access_token_refresh(
+        self,
+        state: str = "",
+        body_type: ENCODINGS = "json",
+        method="POST",
+        request_args=None,
+        extra_args=None,
+        http_args=None,
+        authn_method="",
+        **kwargs,
+    ) -> AccessTokenResponse:
+
+        response_cls = self.message_factory.get_response_type("refresh_endpoint")
+
+        url, body, http_args, token = self.access_token_refresh_info(
+            state=state,
+            method=method,
+            request_args=request_args,
+            extra_args=extra_args,
+            http_args=http_args,
+            authn_method=authn_method,
+            **kwargs,
+        )
+
         response = self.request_and_return(
             url, response_cls, method, body, body_type, state=state, http_args=http_args
         )
@@ -1114,24 +1171,31 @@ class Client(PBase):
 
             self.keyjar.load_keys(pcr, _pcr_issuer)
 
-    def provider_config(
-        self,
-        issuer: str,
-        keys: bool = True,
-        endpoints: bool = True,
-        serv_pattern: str = OIDCONF_PATTERN,
-    ) -> ASConfigurationResponse:
-
-        response_cls = self.message_factory.get_response_type("configuration_endpoint")
+    @staticmethod
+    def provider_config_url(issuer: str, serv_pattern: str = OIDCONF_PATTERN) -> str:
+        """Return the URL of the provider configuration of issuer."""
         if issuer.endswith("/"):
             _issuer = issuer[:-1]
         else:
             _issuer = issuer
 
-        url = serv_pattern % _issuer
+        return serv_pattern % _issuer
+
+    def handle_provider_config_response(
+        self, r, url: str, issuer: str, keys: bool = True, endpoints: bool = True
+    ) -> ASConfigurationResponse:
+        """
+        Parse the HTTP response carrying the provider configuration and deal with it.
+
+        :param r: The HTTP response
+        :param url: The URL the configuration was fetched from
+        :param issuer: The one I thought should be the issuer of the config
+        :param keys: Should I deal with keys
+        :param endpoints: Should I deal with endpoints, that is store them as attributes in self.
+        """
+        response_cls = self.message_factory.get_response_type("configuration_endpoint")
 
         pcr = None
-        r = self.http_request(url, allow_redirects=True)
         if r.status_code == 200:
             try:
                 pcr = response_cls().from_json(r.text)
@@ -1147,6 +1211,18 @@ class Client(PBase):
         self.handle_provider_config(pcr, issuer, keys, endpoints)
         return pcr
 
+    def provider_config(
+        self,
+        issuer: str,
+        keys: bool = True,
+        endpoints: bool = True,
+        serv_pattern: str = OIDCONF_PATTERN,
+    ) -> ASConfigurationResponse:
+
+        url = self.provider_config_url(issuer, serv_pattern)
+        r = self.http_request(url, allow_redirects=True)
+        return self.handle_provider_config_response(r, url, issuer, keys, endpoints)
+
 
 class Server(PBase):
     """OAuth Server class."""
@@ -2,13 +2,13 @@ import copy
 import logging
 import warnings
 from http import cookiejar as cookielib
-from http.cookies import CookieError
-from http.cookies import SimpleCookie
+from typing import Any
+from typing import Dict
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from oic.oauth2.exception import NonFatalException
-from oic.oauth2.util import set_cookie
+from oic.utils.json_codec import install_json_codec
 from oic.utils.keyio import KeyJar
 from oic.utils.sanitize import sanitize
 from oic.utils.settings import PyoidcSettings
@@ -76,12 +76,23 @@ class PBase(object):
             )
             self.settings.timeout = timeout
 
+        if self.settings.json_codec is not None:
+            install_json_codec(self.settings.json_codec)
+
         self.keyjar = keyjar or KeyJar(verify_ssl=self.settings.verify_ssl)
 
+        # Keep-alive connections are pooled and reused among requests
+        self.http_session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.settings.pool_connections,
+            pool_maxsize=self.settings.pool_maxsize,
+        )
+        self.http_session.mount("http://", adapter)
+        self.http_session.mount("https://", adapter)
         self.cookiejar = cookielib.FileCookieJar()
 
         # Additional args for the requests library calls
-        self.request_args = {
+        self.request_args: Dict[str, Any] = {
             "allow_redirects": False,
             "cert": self.settings.client_cert,
             "verify": self.settings.verify_ssl,
@@ -92,16 +103,14 @@ class PBase(object):
         self.events = None
         self.req_callback = None
 
-    def _cookies(self):
-        """Turn cookiejar into a dict."""
-        cookie_dict = {}
-
-        for _, a in list(self.cookiejar._cookies.items()):  # type: ignore
-            for _, b in list(a.items()):
-                for cookie in list(b.values()):
-                    cookie_dict[cookie.name] = cookie.value
+    @property
+    def cookiejar(self):
+        """Cookie jar used by the HTTP session."""
+        return self.http_session.cookies
 
-        return cookie_dict
+    @cookiejar.setter
+    def cookiejar(self, jar):
+        self.http_session.cookies = jar
 
     def http_request(self, url, method="GET", **kwargs):
         """
@@ -120,15 +129,12 @@ class PBase(object):
         if kwargs:
             _kwargs.update(kwargs)
 
-        if self.cookiejar:
-            _kwargs["cookies"] = self._cookies()
-            logger.debug("SENT %s COOKIES", len(_kwargs["cookies"]))  # type: ignore
-
         if self.req_callback is not None:
             _kwargs = self.req_callback(method, url, **_kwargs)
 
         try:
-            r = requests.request(method, url, **_kwargs)
+            # Cookies are sent from and stored into the session cookie jar
+            r = self.http_session.request(method, url, **_kwargs)
         except Exception as err:
             logger.error(
                 "http_request failed: %s, url: %s, htargs: %s, method: %s"
@@ -139,17 +145,6 @@ class PBase(object):
         if self.events is not None:
             self.events.store("HTTP response", r, ref=url)
 
-        try:
-            _cookie = r.headers["set-cookie"]
-            logger.debug("RECEIVED COOKIE")
-            try:
-                set_cookie(self.cookiejar, SimpleCookie(_cookie))
-            except CookieError as err:
-                logger.error(err)
-                raise NonFatalException(r, "{}".format(err))
-        except (AttributeError, KeyError):
-            pass
-
         return r
 
     def send(self, url, method="GET", **kwargs):
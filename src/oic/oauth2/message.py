@@ -1,19 +1,21 @@
 import copy
+import hashlib
 import json
 import logging
+import re
 import warnings
 from collections import namedtuple
 from collections.abc import MutableMapping
-from json import JSONDecodeError
 from typing import Any
 from typing import Dict
+from typing import Iterator
 from typing import List
 from typing import Mapping
 from typing import Optional
 from typing import Tuple
-from typing import Union
-from urllib.parse import parse_qs
-from urllib.parse import urlencode
+from typing import cast
+from urllib.parse import quote_plus
+from urllib.parse import unquote
 
 from jwkest import as_unicode
 from jwkest import b64d
@@ -29,6 +31,7 @@ from jwkest.jwt import JWT
 from oic.exception import MessageException
 from oic.exception import PyoidcError
 from oic.oauth2.exception import VerificationError
+from oic.utils import json_codec
 from oic.utils.keyio import key_summary
 from oic.utils.keyio import update_keyjar
 from oic.utils.sanitize import sanitize
@@ -136,13 +139,227 @@ def swap_dict(dic):
 
 
 def jwt_header(txt):
-    return json.loads(b64d(str(txt.split(".")[0])))
+    return json_codec.loads(b64d(str(txt.split(".")[0])))
+
+
+def parse_form(txt: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield the name and value pairs of an application/x-www-form-urlencoded string.
+
+    Pairs are decoded like :func:`urllib.parse.parse_qsl` does it, pairs without
+    a value are skipped.
+    """
+    for pair in txt.split("&"):
+        name, _, value = pair.partition("=")
+        if not value:
+            continue
+        if "+" in name:
+            name = name.replace("+", " ")
+        if "%" in name:
+            name = unquote(name, errors="replace")
+        if "+" in value:
+            value = value.replace("+", " ")
+        if "%" in value:
+            value = unquote(value, errors="replace")
+        yield name, value
+
+
+# Characters quote_plus leaves as they are
+_form_safe = re.compile(r"[A-Za-z0-9_.~-]*").fullmatch
+
+
+def quote_form(val: str) -> str:
+    """Quote a name or a value of an application/x-www-form-urlencoded string."""
+    if _form_safe(val):
+        return val
+    return quote_plus(val)
+
+
+class ParamDict(dict):
+    """
+    The parameter definitions of a message class.
+
+    Changing it invalidates the schema compiled from it.
+    """
+
+    __slots__ = ("version",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def _changed(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._changed()
+        return value
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+
+class MessageSchema(object):
+    """
+    Lookup tables compiled from the parameter definitions of a message class.
+
+    Parameters are looked up directly, then without the language tag and last as
+    the ``*`` wildcard parameter.
+    """
+
+    __slots__ = (
+        "spec",
+        "version",
+        "params",
+        "wildcard",
+        "direct",
+        "required",
+        "attributes",
+    )
+
+    def __init__(self, spec: Mapping[str, ParamDefinition]):
+        self.spec = spec
+        self.version = getattr(spec, "version", None)
+        self.params = dict(spec)
+        self.wildcard = spec.get("*")
+        # Types for which a value of exactly that type is stored as it is
+        self.direct = {
+            key: cparam.type
+            for key, cparam in spec.items()
+            if isinstance(cparam.type, type) and cparam.type is not list
+        }
+        self.required = tuple(key for key, cparam in spec.items() if cparam.required)
+        self.attributes = tuple(
+            (key, cparam) for key, cparam in spec.items() if key != "*"
+        )
+
+    def valid(self, spec: Mapping[str, ParamDefinition]) -> bool:
+        return (
+            spec is self.spec
+            and self.version is not None
+            and self.version == getattr(spec, "version", None)
+        )
+
+    def lookup(self, key: str) -> Optional[ParamDefinition]:
+        """Return the ParamDefinition of a key or None if there is none."""
+        cparam = self.params.get(key)
+        if cparam is None:
+            if "#" in key:
+                cparam = self.params.get(key.split("#")[0])
+            if cparam is None:
+                return self.wildcard
+        return cparam
+
+
+class VerifyPlan(object):
+    """
+    Checks done by :meth:`Message.verify`, compiled from a schema and the allowed values.
+
+    Only the required attributes and the attributes with allowed values are
+    checked, the allowed values are frozen when the plan is compiled.
+    """
+
+    __slots__ = ("schema", "allowed", "required", "checks")
+
+    def __init__(self, schema: MessageSchema, allowed: Mapping[str, Any]):
+        self.schema = schema
+        self.allowed = allowed
+        # Attribute and whether it is a boolean, which can be False
+        self.required = tuple(
+            (key, cparam.type is bool)
+            for key, cparam in schema.attributes
+            if cparam.required
+        )
+        # Attribute, whether its value is a list and the values allowed
+        checks = []
+        for key, cparam in schema.attributes:
+            if key not in allowed:
+                continue
+            if cparam.type in (str, int):
+                checks.append((key, False, frozenset(allowed[key])))
+            elif isinstance(cparam.type, list):
+                checks.append((key, True, frozenset(allowed[key])))
+        self.checks = tuple(checks)
+
+    def valid(self, schema: MessageSchema, allowed: Mapping[str, Any]) -> bool:
+        return schema is self.schema and allowed is self.allowed
+
+    def run(self, values: Mapping[str, Any]) -> None:
+        """Raise an exception if a required attribute or an allowed value is missing."""
+        for key, is_bool in self.required:
+            val = values.get(key)
+            if val is None or not (val or is_bool):
+                raise MissingRequiredAttribute("%s" % key)
+
+        for key, is_list, allowed in self.checks:
+            val = values.get(key)
+            if not val:
+                continue
+            try:
+                if is_list:
+                    if isinstance(val, list) and not allowed.issuperset(val):
+                        raise NotAllowedValue(val)
+                elif val not in allowed:
+                    raise NotAllowedValue(val)
+            except TypeError:
+                # An unhashable value is not one of the allowed ones
+                raise NotAllowedValue(val)
+
+
+class _NotLoaded(object):
+    """Placeholder of a value deserialized when it is first accessed."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<not loaded>"
+
+    def __reduce__(self):
+        # Copies and pickles keep the placeholder a singleton
+        return "_NOT_LOADED"
+
+
+_NOT_LOADED = _NotLoaded()
 
 
 class Message(MutableMapping):
-    c_param: Mapping[str, ParamDefinition] = {}
+    c_param: Mapping[str, ParamDefinition] = ParamDict()
     c_default: Dict[str, Any] = {}
     c_allowed_values = {}  # type: ignore
+    _compiled_schema: Optional[MessageSchema] = None
+    _compiled_verify_plan: Optional[VerifyPlan] = None
+    # Values given to from_dict in lazy mode and not deserialized yet
+    _lazy: Optional[Dict[str, Any]] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        spec = cls.__dict__.get("c_param")
+        if spec is not None and not isinstance(spec, ParamDict):
+            cls.c_param = ParamDict(spec)
 
     def __init__(self, **kwargs):
         self._dict = self.c_default.copy()
@@ -153,7 +370,41 @@ class Message(MutableMapping):
         self.from_dict(kwargs)
         self.verify_ssl = True
 
+    @classmethod
+    def _schema(cls) -> MessageSchema:
+        """Return the schema compiled from the parameter definitions of the class."""
+        schema = cls.__dict__.get("_compiled_schema")
+        if schema is None or not schema.valid(cls.c_param):
+            schema = MessageSchema(cls.c_param)
+            cls._compiled_schema = schema
+        return schema
+
+    def _load(self, key: str) -> None:
+        """Deserialize a value kept as it was given to `from_dict` in lazy mode."""
+        lazy = cast(Dict[str, Any], self._lazy)
+        val = lazy[key]
+        cparam = self._schema().lookup(key)
+        if cparam is None:
+            self._dict[key] = val
+        else:
+            self._add_value(
+                key, cparam.type, key, val, cparam.deserializer, cparam.null_allowed
+            )
+        del lazy[key]
+        if not lazy:
+            self._lazy = None
+        # Like from_dict, _add_value skips some values
+        if self._dict.get(key) is _NOT_LOADED:
+            del self._dict[key]
+
+    def _load_all(self) -> None:
+        """Deserialize all the values kept by `from_dict` in lazy mode."""
+        for key in list(self._lazy or []):
+            self._load(key)
+
     def __iter__(self):
+        if self._lazy:
+            self._load_all()
         return iter(self._dict)
 
     def type(self):
@@ -163,6 +414,8 @@ class Message(MutableMapping):
         return self.c_param.keys()
 
     def set_defaults(self):
+        if self._lazy:
+            self._load_all()
         for key, val in self.c_default.items():
             self._dict[key] = val
 
@@ -185,16 +438,20 @@ class Message(MutableMapping):
 
         :return: A string of the application/x-www-form-urlencoded format
         """
-        _spec = self.c_param
+        if self._lazy:
+            self._load_all()
+        schema = self._schema()
         if not self.lax:
-            for attribute, cparam in _spec.items():
-                if cparam.required and attribute not in self._dict:
+            for attribute in schema.required:
+                if attribute not in self._dict:
                     raise MissingRequiredAttribute("%s" % attribute, "%s" % self)
 
-        params: List[Tuple[str, Optional[Union[str, bytes, Message]]]] = []
+        # Every parameter is quoted as it is met, as urlencode would do it
+        params: List[str] = []
+        append = params.append
 
         for key, val in self._dict.items():
-            cparam = self._extract_cparam(key, _spec)
+            cparam = schema.lookup(key)
             if cparam is not None:
                 _ser = cparam.serializer
                 null_allowed = cparam.null_allowed
@@ -202,41 +459,39 @@ class Message(MutableMapping):
                 _ser = None
                 null_allowed = False
 
+            _key = quote_form(key) + "="
             if val is None and null_allowed is False:
                 continue
             elif isinstance(val, str):
                 # Should I allow parameters with "" as value ???
-                params.append((key, val.encode("utf-8")))
+                append(_key + quote_form(val))
             elif isinstance(val, list):
                 if _ser:
-                    params.append((key, str(_ser(val, sformat="urlencoded", lev=lev))))
+                    append(
+                        _key + quote_form(str(_ser(val, sformat="urlencoded", lev=lev)))
+                    )
                 else:
                     for item in val:
-                        params.append((key, str(item).encode("utf-8")))
+                        append(_key + quote_form(str(item)))
             elif isinstance(val, Message):
                 try:
-                    _val = json.dumps(_ser(val, sformat="dict", lev=lev + 1))
-                    params.append((key, _val))
+                    _val = json_codec.dumps(_ser(val, sformat="dict", lev=lev + 1))
                 except TypeError:
-                    params.append((key, val))
+                    _val = str(val)
+                append(_key + quote_form(_val))
             elif val is None:
-                params.append((key, val))
+                append(_key + "None")
             else:
                 try:
-                    params.append((key, _ser(val, lev=lev)))
+                    _val = _ser(val, lev=lev)
                 except Exception:
-                    params.append((key, str(val)))
-
-        try:
-            return urlencode(params)
-        except UnicodeEncodeError:
-            _val2: List[Tuple[str, Optional[Union[str, bytes, Message]]]] = []
-            for k, v in params:
-                if isinstance(v, str):
-                    _val2.append((k, v.encode("utf-8")))
+                    _val = val
+                if isinstance(_val, bytes):
+                    append(_key + quote_plus(_val))
                 else:
-                    _val2.append((k, v))
-            return urlencode(_val2)
+                    append(_key + quote_form(str(_val)))
+
+        return "&".join(params)
 
     def serialize(self, method="urlencoded", lev=0, **kwargs):
         return getattr(self, "to_%s" % method)(lev=lev, **kwargs)
@@ -256,44 +511,52 @@ class Message(MutableMapping):
         :param urlencoded: The string
         :return: An instance of the cls class
         """
-        # parse_qs returns a dictionary with keys and values. The values are
-        # always lists even if there is only one value in the list.
-        # keys only appears once.
-
-        if isinstance(urlencoded, str):
-            pass
-        elif isinstance(urlencoded, list):
+        if isinstance(urlencoded, list):
             urlencoded = urlencoded[0]
-
-        _spec = self.c_param
-
-        for key, val in parse_qs(urlencoded).items():
-            cparam = self._extract_cparam(key, _spec)
+        if isinstance(urlencoded, bytes):
+            urlencoded = urlencoded.decode("ascii")
+        if self._lazy:
+            self._load_all()
+
+        lookup = self._schema().lookup
+        _dict = self._dict
+        # Values of the parameters that may be repeated, and the parameters seen
+        multiple: Dict[str, List[str]] = {}
+        seen = set()
+
+        for key, val in parse_form(urlencoded):
+            cparam = lookup(key)
             if cparam is None:
-                if len(val) == 1:
-                    val = val[0]  # type: ignore
-
-                self._dict[key] = val
-                continue
-
-            if isinstance(cparam.type, list):
+                # A single value is stored as it is, several as a list
+                if key in multiple:
+                    multiple[key].append(val)
+                    _dict[key] = multiple[key]
+                else:
+                    multiple[key] = [val]
+                    _dict[key] = val
+            elif isinstance(cparam.type, list):
                 if cparam.deserializer is not None:
-                    self._dict[key] = cparam.deserializer(val[0], "urlencoded")
+                    # Only the first value is deserialized
+                    if key not in seen:
+                        seen.add(key)
+                        _dict[key] = cparam.deserializer(val, "urlencoded")
+                elif key in multiple:
+                    multiple[key].append(val)
                 else:
-                    self._dict[key] = val
-            else:  # must be single value
-                if len(val) == 1:
-                    if cparam.deserializer is not None:
-                        self._dict[key] = cparam.deserializer(val[0], "urlencoded")
-                    elif isinstance(val[0], cparam.type):
-                        self._dict[key] = val[0]
-                    else:
-                        try:
-                            self._dict[key] = cparam.type(val[0])
-                        except KeyError:
-                            raise ParameterError(key)
+                    multiple[key] = _dict[key] = [val]
+            elif key in seen:  # must be single value
+                raise TooManyValues("{}".format(key))
+            else:
+                seen.add(key)
+                if cparam.deserializer is not None:
+                    _dict[key] = cparam.deserializer(val, "urlencoded")
+                elif isinstance(val, cparam.type):
+                    _dict[key] = val
                 else:
-                    raise TooManyValues("{}".format(key))
+                    try:
+                        _dict[key] = cparam.type(val)
+                    except KeyError:
+                        raise ParameterError(key)
 
         return self
 
@@ -303,16 +566,15 @@ class Message(MutableMapping):
 
         :return: A dict
         """
-        _spec = self.c_param
+        if self._lazy:
+            self._load_all()
+        lookup = self._schema().lookup
 
         _res = {}
         lev += 1
         for key, val in self._dict.items():
-            cparam = self._extract_cparam(key, _spec)
-            if cparam is not None:
-                _ser = cparam.serializer
-            else:
-                _ser = None
+            cparam = lookup(key)
+            _ser = cparam.serializer if cparam is not None else None
             if _ser:
                 val = _ser(val, "dict", lev)
 
@@ -327,25 +589,51 @@ class Message(MutableMapping):
 
         return _res
 
-    def from_dict(self, dictionary, **kwargs):
+    def from_dict(self, dictionary, lazy=False, **kwargs):
         """
         Direct translation so the value for one key might be a list or a single value.
 
         :param dictionary: The info
+        :param lazy: Keep the values that need to be deserialized as they are
+            and deserialize each one when it is first accessed. They are all
+            deserialized by `verify` or when the whole message is used.
         :return: A class instance or raise an exception on error
         """
-        _spec = self.c_param
+        if self._lazy:
+            self._load_all()
+        schema = self._schema()
+        direct = schema.direct
+        lookup = schema.lookup
+        _dict = self._dict
+
+        if lazy:
+            pending = {}
+            for key, val in dictionary.items():
+                if val in ("", [""]):
+                    continue
+                if val.__class__ is direct.get(key) or lookup(key) is None:
+                    _dict[key] = val
+                else:
+                    # The placeholder keeps the order of the keys
+                    _dict[key] = _NOT_LOADED
+                    pending[key] = val
+            if pending:
+                self._lazy = pending
+            return self
 
         for key, val in dictionary.items():
             if val in ("", [""]):
                 continue
-            cparam = self._extract_cparam(key, _spec)
+            if val.__class__ is direct.get(key):
+                _dict[key] = val
+                continue
+            cparam = lookup(key)
             if cparam is not None:
                 self._add_value(
                     key, cparam.type, key, val, cparam.deserializer, cparam.null_allowed
                 )
             else:
-                self._dict[key] = val
+                _dict[key] = val
         return self
 
     def _add_value(self, skey, vtyp, key, val, _deser, null_allowed):
@@ -458,18 +746,20 @@ class Message(MutableMapping):
     def to_json(self, lev=0, indent=None):
         if lev:
             return self.to_dict(lev + 1)
+        elif indent is None:
+            return json_codec.dumps(self.to_dict(1))
         else:
             return json.dumps(self.to_dict(1), indent=indent)
 
-    def from_json(self, txt: str, **kwargs) -> "Message":
+    def from_json(self, txt: str, lazy: bool = False, **kwargs) -> "Message":
         """Create the Message from json encoded string."""
         try:
-            unpacked = json.loads(txt)
-        except JSONDecodeError:
+            unpacked = json_codec.loads(txt)
+        except ValueError:
             raise DecodeError("Cannot unpack, not a valid JSON.")
         if not isinstance(unpacked, dict):
             raise DecodeError("Cannot unpack, not a valid message.")
-        return self.from_dict(unpacked)
+        return self.from_dict(unpacked, lazy=lazy)
 
     def to_jwt(self, key=None, algorithm="", lev=0):
         """
@@ -591,7 +881,9 @@ class Message(MutableMapping):
                 self._add_key(keyjar, jso[ent], key, _key_type, _kid, nki)
         return key
 
-    def from_jwt(self, txt, key=None, verify=True, keyjar=None, **kwargs):
+    def from_jwt(
+        self, txt, key=None, verify=True, keyjar=None, check_payload=None, **kwargs
+    ):
         """
         Given a signed and/or encrypted JWT, verify its correctness and then create a class instance from the content.
 
@@ -600,9 +892,19 @@ class Message(MutableMapping):
             signature of the JWT
         :param verify: Whether the signature should be verified or not
         :param keyjar: A KeyJar that might contain the necessary key.
+        :param check_payload: Callable given the decoded payload before the
+            signature is verified, may raise an exception to reject the JWT
         :param kwargs: Extra key word arguments
         :return: A class instance
         """
+        _cache = getattr(keyjar, "jwt_cache", None) if verify and key is None else None
+        if _cache is not None:
+            _cache_key = self._jwt_cache_key(txt, kwargs)
+            jso = self._jwt_cache_lookup(_cache, _cache_key, keyjar)
+            if jso is not None:
+                self._check_payload(check_payload, jso)
+                return self.from_dict(jso)
+
         _jw = jwe.factory(txt)
         if _jw:
             logger.debug("JWE headers: {}".format(_jw.jwt.headers))
@@ -644,53 +946,108 @@ class Message(MutableMapping):
                     raise WrongSigningAlgorithm(
                         "%s != %s" % (_alg, kwargs["algs"]["sign"])
                     )
-            try:
-                _jwt = JWT().unpack(txt)
-                jso = _jwt.payload()
-                _header = _jwt.headers
-
-                if key is None and keyjar is not None:
-                    key = keyjar.get_verify_key(owner="")
-                elif key is None:
-                    key = []
+            _jwt = JWT().unpack(txt)
+            jso = _jwt.payload()
+            _header = _jwt.headers
+
+            if key is None and keyjar is not None:
+                key = keyjar.get_verify_key(owner="")
+            elif key is None:
+                key = []
+
+            if keyjar is not None and "sender" in kwargs:
+                key.extend(keyjar.get_verify_key(owner=kwargs["sender"]))
+
+            logger.debug("Raw JSON: {}".format(sanitize(jso)))
+            logger.debug("JWS header: {}".format(sanitize(_header)))
+            self._check_payload(check_payload, jso)
+            if _header["alg"] == "none":
+                pass
+            elif verify:
+                if keyjar:
+                    key = self.get_verify_keys(keyjar, key, jso, _header, _jw, **kwargs)
 
-                if keyjar is not None and "sender" in kwargs:
-                    key.extend(keyjar.get_verify_key(owner=kwargs["sender"]))
+                if "alg" in _header and _header["alg"] != "none":
+                    if not key:
+                        raise MissingSigningKey("alg=%s" % _header["alg"])
 
-                logger.debug("Raw JSON: {}".format(sanitize(jso)))
-                logger.debug("JWS header: {}".format(sanitize(_header)))
-                if _header["alg"] == "none":
-                    pass
-                elif verify:
+                logger.debug("Found signing key.")
+                try:
+                    _jw.verify_compact(txt, key)
+                except NoSuitableSigningKeys:
                     if keyjar:
+                        update_keyjar(keyjar)
                         key = self.get_verify_keys(
                             keyjar, key, jso, _header, _jw, **kwargs
                         )
-
-                    if "alg" in _header and _header["alg"] != "none":
-                        if not key:
-                            raise MissingSigningKey("alg=%s" % _header["alg"])
-
-                    logger.debug("Found signing key.")
-                    try:
                         _jw.verify_compact(txt, key)
-                    except NoSuitableSigningKeys:
-                        if keyjar:
-                            update_keyjar(keyjar)
-                            key = self.get_verify_keys(
-                                keyjar, key, jso, _header, _jw, **kwargs
-                            )
-                            _jw.verify_compact(txt, key)
-            except Exception:
-                raise
-            else:
-                self.jws_header = _jwt.headers
+
+            self.jws_header = _jwt.headers
+            if _cache is not None and _header["alg"] != "none":
+                self._jwt_cache_store(_cache, _cache_key, keyjar, jso, txt, kwargs)
         else:
-            jso = json.loads(txt)
+            jso = json_codec.loads(txt)
+            self._check_payload(check_payload, jso)
 
         self.jwt = txt
         return self.from_dict(jso)
 
+    @staticmethod
+    def _jwt_cache_key(txt, kwargs):
+        """Key of a JWT in the cache of verified JWTs, the arguments that affect the verification are part of it."""
+        args = {
+            k: v
+            for k, v in kwargs.items()
+            if k in ["algs", "sender", "opponent_id", "no_kid_issuer", "trusting"]
+        }
+        return (
+            hashlib.sha256(txt.encode("utf-8")).digest(),
+            json.dumps(args, sort_keys=True, default=str),
+        )
+
+    @staticmethod
+    def _check_payload(check_payload, jso):
+        if check_payload is not None:
+            check_payload(jso)
+
+    def _jwt_cache_lookup(self, cache, cache_key, keyjar):
+        """Return the payload of a verified JWT if the keys that may have verified it are unchanged, else None."""
+        _cached = cache.get(cache_key)
+        if _cached is None:
+            return None
+        payload, issuers, version, headers = _cached
+        if keyjar.key_set_version(issuers) != version:
+            cache.delete(cache_key)
+            return None
+        self.jwt, self.jws_header, self.jwe_header = headers
+        return json_codec.loads(payload)
+
+    def _jwt_cache_store(self, cache, cache_key, keyjar, jso, txt, kwargs):
+        """Store the payload of a verified JWT together with the version of the keys that may have verified it."""
+        if not isinstance(jso, dict):
+            return
+        issuers = ["", kwargs.get("sender"), kwargs.get("opponent_id")]
+        issuers.extend(jso.get(ent) for ent in ["iss", "client_id"])
+        _aud = jso.get("aud")
+        issuers.extend([_aud] if isinstance(_aud, str) else _aud or [])
+        issuers = [iss for iss in issuers if isinstance(iss, str)]
+
+        try:
+            expires_at = float(jso["exp"])
+        except (KeyError, TypeError, ValueError):
+            expires_at = None
+
+        cache.set(
+            cache_key,
+            (
+                json_codec.dumps(jso),
+                issuers,
+                keyjar.key_set_version(issuers),
+                (txt, self.jws_header, self.jwe_header),
+            ),
+            expires_at,
+        )
+
     def __str__(self):
         return "{}".format(self.to_dict())
 
@@ -709,45 +1066,21 @@ class Message(MutableMapping):
         elif val is None and na is False:
             raise NotAllowedValue(val)
 
+    @classmethod
+    def _verify_plan(cls, allowed: Mapping[str, Any]) -> VerifyPlan:
+        """Return the verification plan compiled for the class and the allowed values."""
+        schema = cls._schema()
+        plan = cls.__dict__.get("_compiled_verify_plan")
+        if plan is None or not plan.valid(schema, allowed):
+            plan = VerifyPlan(schema, allowed)
+            cls._compiled_verify_plan = plan
+        return plan
+
     def verify(self, **kwargs):
         """Make sure all the required values are there and that the values are of the correct type."""
-        _spec = self.c_param
-        try:
-            _allowed = self.c_allowed_values
-        except KeyError:
-            _allowed = {}
-
-        for attribute, cparam in _spec.items():
-            if attribute == "*":
-                continue
-
-            val = self._dict.get(attribute)
-            if val is None:
-                if cparam.required:
-                    raise MissingRequiredAttribute("%s" % attribute)
-                continue
-            if cparam.type != bool and not val:
-                if cparam.required:
-                    raise MissingRequiredAttribute("%s" % attribute)
-                continue
-
-            if attribute not in _allowed:
-                continue
-
-            if isinstance(cparam.type, tuple):
-                for _typ in cparam.type:
-                    try:
-                        self._type_check(_typ, _allowed[attribute], val)
-                        break
-                    except ValueError:
-                        pass
-                    else:
-                        raise NotAllowedValue(val)
-            else:
-                self._type_check(
-                    cparam.type, _allowed[attribute], val, cparam.null_allowed
-                )
-
+        if self._lazy:
+            self._load_all()
+        self._verify_plan(self.c_allowed_values).run(self._dict)
         return True
 
     def keys(self):
@@ -756,10 +1089,16 @@ class Message(MutableMapping):
 
         :return: A list of attribute names
         """
+        if self._lazy:
+            self._load_all()
         return self._dict.keys()
 
     def __getitem__(self, item):
-        return self._dict[item]
+        val = self._dict[item]
+        if val is _NOT_LOADED:
+            self._load(item)
+            return self._dict[item]
+        return val
 
     def get(self, item, default=None):
         try:
@@ -768,12 +1107,18 @@ class Message(MutableMapping):
             return default
 
     def items(self):
+        if self._lazy:
+            self._load_all()
         return self._dict.items()
 
     def values(self):
+        if self._lazy:
+            self._load_all()
         return self._dict.values()
 
     def __contains__(self, item):
+        if self._dict.get(item) is _NOT_LOADED:
+            self._load(item)
         return item in self._dict
 
     def request(self, location, fragment_enc=False):
@@ -787,7 +1132,18 @@ class Message(MutableMapping):
             else:
                 return "%s?%s" % (_l, _qp)
 
+    def _drop_pending(self, key) -> bool:
+        """Forget the value kept for a key by `from_dict` in lazy mode, return whether there was one."""
+        if not self._lazy or key not in self._lazy:
+            return False
+        del self._lazy[key]
+        if not self._lazy:
+            self._lazy = None
+        del self._dict[key]
+        return True
+
     def __setitem__(self, key, value):
+        self._drop_pending(key)
         try:
             cparam = self.c_param[key]
             self._add_value(
@@ -807,23 +1163,35 @@ class Message(MutableMapping):
         if self.type() != other.type():
             return False
 
+        if self._lazy:
+            self._load_all()
+        if other._lazy:
+            other._load_all()
+
         if self._dict != other._dict:
             return False
 
         return True
 
     def __delitem__(self, key):
-        del self._dict[key]
+        if not self._drop_pending(key):
+            del self._dict[key]
 
     def __len__(self):
+        if self._lazy:
+            self._load_all()
         return len(self._dict)
 
     def extra(self):
+        if self._lazy:
+            self._load_all()
         return dict(
             [(key, val) for key, val in self._dict.items() if key not in self.c_param]
         )
 
     def only_extras(self):
+        if self._lazy:
+            self._load_all()
         extras = [key for key in self._dict.keys() if key in self.c_param]
         if not extras:
             return True
@@ -831,6 +1199,8 @@ class Message(MutableMapping):
             return False
 
     def update(self, item):
+        if self._lazy:
+            self._load_all()
         if isinstance(item, dict):
             self._dict.update(item)
         elif isinstance(item, Message):
@@ -879,12 +1249,16 @@ class Message(MutableMapping):
 
     def weed(self):
         """Get rid of key value pairs that are not standard."""
+        if self._lazy:
+            self._load_all()
         _ext = [k for k in self._dict.keys() if k not in self.c_param]
         for k in _ext:
             del self._dict[k]
 
     def rm_blanks(self):
         """Get rid of parameters that has no value."""
+        if self._lazy:
+            self._load_all()
         _blanks = [k for k in self._dict.keys() if not self._dict[k]]
         for key in _blanks:
             del self._dict[key]
@@ -942,11 +1316,11 @@ def sp_sep_list_deserializer(val, sformat="urlencoded"):
 
 
 def json_serializer(obj, sformat="urlencoded", lev=0):
-    return json.dumps(obj)
+    return json_codec.dumps(obj)
 
 
 def json_deserializer(txt, sformat="urlencoded"):
-    return json.loads(txt)
+    return json_codec.loads(txt)
 
 
 VTYPE = 0
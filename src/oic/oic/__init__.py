@@ -711,6 +711,11 @@ class Client(oauth2.Client):
             authn_method=authn_method,
             **kwargs,
         )
+        self.verify_token_response_nonce(atr, state)
+        return atr
+
+    def verify_token_response_nonce(self, atr, state=""):
+        """Verify that the nonce in the returned ID Token matches the one sent for state."""
         try:
             _idt = atr["id_token"]
         except KeyError:
@@ -721,7 +726,6 @@ class Client(oauth2.Client):
                     raise ParameterError('Someone has messed with "nonce"')
             except KeyError:
                 pass
-        return atr
 
     def do_registration_request(
         self,
@@ -931,10 +935,14 @@ class Client(oauth2.Client):
 
         return path, body, method, h_args
 
-    def do_user_info_request(
+    def user_info_request_info(
         self, method="POST", state="", scope="openid", request="openid", **kwargs
     ):
+        """
+        Construct a user info request.
 
+        :return: Tuple of the path, the body, the HTTP method and the arguments for the HTTP client
+        """
         kwargs["request"] = request
         path, body, method, h_args = self.user_info_request(
             method, state, scope, **kwargs
@@ -950,11 +958,31 @@ class Client(oauth2.Client):
             self.events.store("request_url", path)
             self.events.store("request_http_args", h_args)
 
+        return path, body, method, h_args
+
+    def do_user_info_request(
+        self, method="POST", state="", scope="openid", request="openid", **kwargs
+    ):
+
+        path, body, method, h_args = self.user_info_request_info(
+            method, state, scope, request, **kwargs
+        )
+
         try:
             resp = self.http_request(path, method, data=body, **h_args)
         except oauth2.exception.MissingRequiredAttribute:
             raise
 
+        return self.handle_user_info_response(resp, state, **kwargs)
+
+    def handle_user_info_response(self, resp, state="", **kwargs):
+        """
+        Parse and verify the HTTP response from the user info endpoint.
+
+        :param resp: The HTTP response
+        :param state: The state
+        :return: The user info or an error response
+        """
         if resp.status_code == 200:
             if "application/json" in resp.headers["content-type"]:
                 sformat = "json"
@@ -1086,7 +1114,15 @@ class Client(oauth2.Client):
 
         return userinfo
 
-    def fetch_distributed_claims(self, userinfo, callback=None):
+    def distributed_claims_requests(self, userinfo, callback=None):
+        """
+        Collect the user info requests needed to fetch the distributed claims.
+
+        :param userinfo: The user info with distributed claims
+        :param callback: Callable returning the access token for a claims endpoint
+        :return: List of tuples of the claim source and the user info request kwargs
+        """
+        sources = []
         for csrc, spec in userinfo["_claim_sources"].items():
             if "endpoint" in spec:
                 if not spec["endpoint"].startswith("https://"):
@@ -1094,42 +1130,39 @@ class Client(oauth2.Client):
                         "Fetching distributed claims from an untrusted source: %s",
                         spec["endpoint"],
                     )
+                kwargs = {
+                    "method": "GET",
+                    "userinfo_endpoint": spec["endpoint"],
+                    "verify": False,
+                }
                 if "access_token" in spec:
-                    _uinfo = self.do_user_info_request(
-                        method="GET",
-                        token=spec["access_token"],
-                        userinfo_endpoint=spec["endpoint"],
-                        verify=False,
-                    )
-                else:
-                    if callback:
-                        _uinfo = self.do_user_info_request(
-                            method="GET",
-                            token=callback(spec["endpoint"]),
-                            userinfo_endpoint=spec["endpoint"],
-                            verify=False,
-                        )
-                    else:
-                        _uinfo = self.do_user_info_request(
-                            method="GET",
-                            userinfo_endpoint=spec["endpoint"],
-                            verify=False,
-                        )
+                    kwargs["token"] = spec["access_token"]
+                elif callback:
+                    kwargs["token"] = callback(spec["endpoint"])
+                sources.append((csrc, kwargs))
+        return sources
 
-                claims = [
-                    value
-                    for value, src in userinfo["_claim_names"].items()
-                    if src == csrc
-                ]
+    @staticmethod
+    def add_distributed_claims(userinfo, claims_info):
+        """
+        Add the claims fetched from the distributed claims sources to userinfo.
 
-                if set(claims) != set(list(_uinfo.keys())):
-                    logger.warning(
-                        "Claims from claim source doesn't match what's in "
-                        "the userinfo"
-                    )
+        :param userinfo: The user info with distributed claims
+        :param claims_info: List of tuples of the claim source and the fetched claims
+        :return: The user info with the distributed claims resolved
+        """
+        for csrc, _uinfo in claims_info:
+            claims = [
+                value for value, src in userinfo["_claim_names"].items() if src == csrc
+            ]
+
+            if set(claims) != set(list(_uinfo.keys())):
+                logger.warning(
+                    "Claims from claim source doesn't match what's in the userinfo"
+                )
 
-                for key, vals in _uinfo.items():
-                    userinfo[key] = vals
+            for key, vals in _uinfo.items():
+                userinfo[key] = vals
 
         # Remove the `_claim_sources` and `_claim_names` from userinfo and better be safe than sorry
         if "_claim_sources" in userinfo:
@@ -1138,6 +1171,13 @@ class Client(oauth2.Client):
             del userinfo["_claim_names"]
         return userinfo
 
+    def fetch_distributed_claims(self, userinfo, callback=None):
+        claims_info = [
+            (csrc, self.do_user_info_request(**kwargs))
+            for csrc, kwargs in self.distributed_claims_requests(userinfo, callback)
+        ]
+        return self.add_distributed_claims(userinfo, claims_info)
+
     def verify_alg_support(self, alg, usage, other):
         """
         Verify that the algorithm to be used are supported by the other side.
@@ -1374,14 +1414,13 @@ class Client(oauth2.Client):
 
         return req
 
-    def register(self, url, registration_token=None, **kwargs):
+    def registration_request_info(self, registration_token=None, **kwargs):
         """
-        Register the client at an OP.
+        Construct a registration request.
 
-        :param url: The OPs registration endpoint
         :param registration_token: Initial Access Token for registration endpoint
         :param kwargs: parameters to the registration request
-        :return:
+        :return: Tuple of the request body and the HTTP headers
         """
         req = self.create_registration_request(**kwargs)
 
@@ -1401,7 +1440,19 @@ class Client(oauth2.Client):
             finally:
                 headers["Authorization"] = "Bearer " + registration_token
 
-        rsp = self.http_request(url, "POST", data=req.to_json(), headers=headers)
+        return req.to_json(), headers
+
+    def register(self, url, registration_token=None, **kwargs):
+        """
+        Register the client at an OP.
+
+        :param url: The OPs registration endpoint
+        :param registration_token: Initial Access Token for registration endpoint
+        :param kwargs: parameters to the registration request
+        :return:
+        """
+        body, headers = self.registration_request_info(registration_token, **kwargs)
+        rsp = self.http_request(url, "POST", data=body, headers=headers)
 
         return self.handle_registration_info(rsp)
 
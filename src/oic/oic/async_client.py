@@ -0,0 +1,385 @@
+"""
+Asynchronous OpenID Connect Relying Party.
+
+The requests are constructed and the responses parsed and verified by a wrapped
+:class:`oic.oic.Client`, only the HTTP requests are performed asynchronously.
+This allows a large number of flows to be in flight on a single event loop.
+
+The default transport needs ``aiohttp`` to be installed, any object with a
+coroutine ``request(method, url, **kwargs)`` can be used instead.
+"""
+import asyncio
+import copy
+import logging
+import os
+import ssl
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # type: ignore
+
+from oic.oauth2 import OIDCONF_PATTERN
+from oic.oic import Client
+from oic.utils.keyio import REMOTE_FAILED
+from oic.utils.keyio import KeyBundle
+from oic.utils.keyio import UpdateFailed
+from oic.utils.keyio import raise_exception
+from oic.utils.sanitize import sanitize
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncResponse(object):
+    """HTTP response, as much of the ``requests.Response`` interface as the clients use."""
+
+    def __init__(self, status_code: int, text: str, headers: Any, url: str):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.url = url
+
+
+class AiohttpTransport(object):
+    """Asynchronous HTTP transport using a pooled ``aiohttp.ClientSession``."""
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 0):
+        """
+        Initialize the transport.
+
+        :param limit: Maximum number of simultaneous connections
+        :param limit_per_host: Maximum number of simultaneous connections to one host, 0 for no limit
+        """
+        if aiohttp is None:
+            raise ImportError(
+                "AiohttpTransport can be used only with aiohttp installed."
+            )
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ssl_contexts: Dict[Tuple, Any] = {}
+
+    def _ssl(self, verify: Union[bool, str], cert: Union[None, str, Tuple[str, str]]):
+        """Translate the ``requests`` verify and cert arguments."""
+        key = (verify, cert)
+        if key not in self._ssl_contexts:
+            if verify is False:
+                context: Any = False
+            elif verify is True:
+                context = ssl.create_default_context() if cert else None
+            elif os.path.isdir(verify):
+                context = ssl.create_default_context(capath=verify)
+            else:
+                context = ssl.create_default_context(cafile=verify)
+            if cert:
+                if context is False:
+                    context = ssl.create_default_context()
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+                if isinstance(cert, tuple):
+                    context.load_cert_chain(*cert)
+                else:
+                    context.load_cert_chain(cert)
+            self._ssl_contexts[key] = context
+        return self._ssl_contexts[key]
+
+    @staticmethod
+    def _timeout(timeout: Union[None, float, Tuple[float, float]]):
+        """Translate the ``requests`` timeout argument."""
+        if timeout is None:
+            return None
+        if isinstance(timeout, tuple):
+            return aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return aiohttp.ClientTimeout(total=timeout)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        verify: Union[bool, str] = True,
+        cert: Union[None, str, Tuple[str, str]] = None,
+        timeout: Union[None, float, Tuple[float, float]] = None,
+        **kwargs,
+    ) -> AsyncResponse:
+        """
+        Perform a HTTP request.
+
+        Accepts the same keyword arguments as ``requests.request``
+        as far as they are used by the clients.
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+
+        async with self._session.request(
+            method,
+            url,
+            ssl=self._ssl(verify, cert),
+            timeout=self._timeout(timeout),
+            **kwargs,
+        ) as resp:
+            text = await resp.text()
+            return AsyncResponse(resp.status, text, resp.headers, str(resp.url))
+
+    async def close(self) -> None:
+        """Close all the pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncClient(object):
+    """
+    OpenID Connect client doing its HTTP requests asynchronously.
+
+    Attributes not defined here are those of the wrapped client.
+    """
+
+    def __init__(
+        self, client: Optional[Client] = None, transport: Any = None, **kwargs
+    ):
+        """
+        Initialize the instance.
+
+        :param client: The client used to construct requests and parse responses,
+            if not given one is created using kwargs
+        :param transport: Asynchronous HTTP transport, defaults to :class:`AiohttpTransport`
+        """
+        self.client = client or Client(**kwargs)
+        if transport is None:
+            transport = AiohttpTransport(
+                limit_per_host=self.client.settings.pool_maxsize
+            )
+        self.transport = transport
+
+    def __getattr__(self, item):
+        if item == "client":
+            raise AttributeError(item)
+        return getattr(self.client, item)
+
+    async def close(self) -> None:
+        await self.transport.close()
+
+    async def http_request(self, url, method="GET", **kwargs):
+        """
+        Run a HTTP request to fetch the given url.
+
+        :param url: The URL to fetch
+        :param method: The HTTP method to use.
+        :param kwargs: Additional keyword arguments to pass through.
+        """
+        _kwargs = copy.copy(self.client.request_args)
+        if kwargs:
+            _kwargs.update(kwargs)
+
+        if self.client.req_callback is not None:
+            _kwargs = self.client.req_callback(method, url, **_kwargs)
+
+        try:
+            r = await self.transport.request(method, url, **_kwargs)
+        except Exception as err:
+            logger.error(
+                "http_request failed: %s, url: %s, htargs: %s, method: %s"
+                % (err, url, sanitize(_kwargs), method)
+            )
+            raise
+
+        if self.client.events is not None:
+            self.client.events.store("HTTP response", r, ref=url)
+
+        return r
+
+    async def update_keys(self) -> None:
+        """Fetch all the remote key sets whose cache time has passed."""
+        now = time.time()
+        bundles = [
+            kb
+            for kbs in self.client.keyjar.issuer_keys.values()
+            for kb in kbs
+            if kb.remote and now > kb.time_out
+        ]
+        await asyncio.gather(*[self._update_bundle(kb) for kb in bundles])
+
+    async def _update_bundle(self, kb: KeyBundle) -> None:
+        try:
+            r = await self.http_request(
+                kb.source, "GET", allow_redirects=True, **kb.remote_request_args()
+            )
+        except Exception as err:
+            logger.error(err)
+            raise_exception(UpdateFailed, REMOTE_FAILED.format(kb.source, str(err)))
+        kb.handle_remote_response(r)
+
+    async def request_and_return(
+        self,
+        url,
+        response=None,
+        method="GET",
+        body=None,
+        body_type="json",
+        state="",
+        http_args=None,
+        **kwargs,
+    ):
+        """
+        Perform a request and return the response.
+
+        :param url: The URL to which the request should be sent
+        :param response: Response type
+        :param method: Which HTTP method to use
+        :param body: A message body if any
+        :param body_type: The format of the body of the return message
+        :param http_args: Arguments for the HTTP client
+        :return: A cls or ErrorResponse instance or the HTTP response instance if no response body was expected.
+        """
+        if http_args is None:
+            http_args = {}
+
+        resp = await self.http_request(url, method, data=body, **http_args)
+
+        if "keyjar" not in kwargs:
+            kwargs["keyjar"] = self.client.keyjar
+
+        # Make sure verifying signatures does not block on fetching keys
+        await self.update_keys()
+        return self.client.parse_request_response(
+            resp, response, body_type, state, **kwargs
+        )
+
+    async def provider_config(
+        self,
+        issuer: str,
+        keys: bool = True,
+        endpoints: bool = True,
+        serv_pattern: str = OIDCONF_PATTERN,
+    ):
+        url = self.client.provider_config_url(issuer, serv_pattern)
+        r = await self.http_request(url, allow_redirects=True)
+        pcr = self.client.handle_provider_config_response(
+            r, url, issuer, keys, endpoints
+        )
+        if keys:
+            await self.update_keys()
+        return pcr
+
+    async def register(self, url, registration_token=None, **kwargs):
+        """
+        Register the client at an OP.
+
+        :param url: The OPs registration endpoint
+        :param registration_token: Initial Access Token for registration endpoint
+        :param kwargs: parameters to the registration request
+        """
+        body, headers = self.client.registration_request_info(
+            registration_token, **kwargs
+        )
+        rsp = await self.http_request(url, "POST", data=body, headers=headers)
+
+        return self.client.handle_registration_info(rsp)
+
+    async def do_access_token_request(
+        self,
+        scope="",
+        state="",
+        body_type="json",
+        method="POST",
+        request_args=None,
+        extra_args=None,
+        http_args=None,
+        authn_method="client_secret_basic",
+        **kwargs,
+    ):
+        response_cls = self.client.message_factory.get_response_type("token_endpoint")
+
+        kwargs["authn_endpoint"] = "token"
+        url, body, http_args = self.client.access_token_request_info(
+            scope=scope,
+            state=state,
+            method=method,
+            request_args=request_args,
+            extra_args=extra_args,
+            http_args=http_args,
+            authn_method=authn_method,
+            **kwargs,
+        )
+
+        atr = await self.request_and_return(
+            url,
+            response_cls,
+            method,
+            body,
+            body_type,
+            state=state,
+            http_args=http_args,
+            **kwargs,
+        )
+        self.client.verify_token_response_nonce(atr, state)
+        return atr
+
+    async def do_access_token_refresh(
+        self,
+        state="",
+        body_type="json",
+        method="POST",
+        request_args=None,
+        extra_args=None,
+        http_args=None,
+        authn_method="",
+        **kwargs,
+    ):
+        response_cls = self.client.message_factory.get_response_type("refresh_endpoint")
+
+        url, body, http_args, token = self.client.access_token_refresh_info(
+            state=state,
+            method=method,
+            request_args=request_args,
+            extra_args=extra_args,
+            http_args=http_args,
+            authn_method=authn_method,
+            **kwargs,
+        )
+
+        response = await self.request_and_return(
+            url, response_cls, method, body, body_type, state=state, http_args=http_args
+        )
+        if token.replaced:
+            grant = self.client.get_grant(state)
+            grant.delete_token(token)
+        return response
+
+    async def do_user_info_request(
+        self, method="POST", state="", scope="openid", request="openid", **kwargs
+    ):
+        if state and "token" not in kwargs and not kwargs.get("access_token"):
+            # Refresh here, the wrapped client would otherwise do it synchronously
+            grant = self.client.grant.get(state)
+            token = grant.get_token(scope) if grant else None
+            if token is not None and not token.is_valid():
+                await self.do_access_token_refresh(token=token, state=state)
+
+        path, body, method, h_args = self.client.user_info_request_info(
+            method, state, scope, request, **kwargs
+        )
+
+        resp = await self.http_request(path, method, data=body, **h_args)
+
+        await self.update_keys()
+        return self.client.handle_user_info_response(resp, state, **kwargs)
+
+    async def fetch_distributed_claims(self, userinfo, callback=None):
+        """Fetch the claims from all distributed claims sources concurrently."""
+        sources = self.client.distributed_claims_requests(userinfo, callback)
+        results: List[Any] = await asyncio.gather(
+            *[self.do_user_info_request(**kwargs) for _, kwargs in sources]
+        )
+        claims_info = [(csrc, res) for (csrc, _), res in zip(sources, results)]
+        return self.client.add_distributed_claims(userinfo, claims_info)
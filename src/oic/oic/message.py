@@ -1,5 +1,4 @@
 import inspect
-import json
 import logging
 import sys
 import time
@@ -11,8 +10,6 @@ from urllib.parse import urlparse
 
 from jwkest import jws
 from jwkest.jwe import JWEException
-from jwkest.jwe import factory as JWE_factory
-from jwkest.jwt import JWT
 
 from oic.exception import InvalidRequest
 from oic.exception import IssuerMismatch
@@ -37,6 +34,7 @@ from oic.oauth2.message import MissingRequiredValue
 from oic.oauth2.message import NotAllowedValue
 from oic.oauth2.message import ParamDefinition
 from oic.oauth2.message import SchemeError
+from oic.utils import json_codec
 from oic.utils import time_util
 from oic.utils.time_util import utc_time_sans_frac
 
@@ -64,11 +62,11 @@ class IATError(VerificationError):
 
 
 def json_ser(val, sformat=None, lev=0):
-    return json.dumps(val)
+    return json_codec.dumps(val)
 
 
 def json_deser(val, sformat=None, lev=0):
-    return json.loads(val)
+    return json_codec.loads(val)
 
 
 def json_conv(val, sformat=None, lev=0):
@@ -112,7 +110,7 @@ def idtoken_deser(val, sformat="urlencoded"):
 def address_deser(val, sformat="urlencoded"):
     if sformat in ["dict", "json"]:
         if not isinstance(val, str):
-            val = json.dumps(val)
+            val = json_codec.dumps(val)
             sformat = "json"
         elif sformat == "dict":
             sformat = "json"
@@ -122,7 +120,7 @@ def address_deser(val, sformat="urlencoded"):
 def claims_deser(val, sformat="urlencoded"):
     if sformat in ["dict", "json"]:
         if not isinstance(val, str):
-            val = json.dumps(val)
+            val = json_codec.dumps(val)
             sformat = "json"
     return Claims().deserialize(val, sformat)
 
@@ -130,7 +128,7 @@ def claims_deser(val, sformat="urlencoded"):
 def message_deser(val, sformat="urlencoded"):
     if sformat in ["dict", "json"]:
         if not isinstance(val, str):
-            val = json.dumps(val)
+            val = json_codec.dumps(val)
             sformat = "json"
     return Message().deserialize(val, sformat)
 
@@ -203,7 +201,7 @@ def claims_ser(val, sformat="urlencoded", lev=0):
         if lev:
             res = item
         else:
-            res = json.dumps(item)
+            res = json_codec.dumps(item)
     elif sformat == "dict":
         if isinstance(item, dict):
             res = item
@@ -218,7 +216,7 @@ def claims_ser(val, sformat="urlencoded", lev=0):
 def registration_request_deser(val, sformat="urlencoded"):
     if sformat in ["dict", "json"]:
         if not isinstance(val, str):
-            val = json.dumps(val)
+            val = json_codec.dumps(val)
             sformat = "json"
     return RegistrationRequest().deserialize(val, sformat)
 
@@ -229,7 +227,7 @@ def claims_request_deser(val, sformat="json"):
         sformat = "json"
     if sformat in ["dict", "json"]:
         if not isinstance(val, str):
-            val = json.dumps(val)
+            val = json_codec.dumps(val)
             sformat = "json"
     return ClaimsRequest().deserialize(val, sformat)
 
@@ -255,15 +253,10 @@ REQUIRED_MESSAGE = ParamDefinition(Message, True, msg_ser, message_deser, False)
 # ----------------------------------------------------------------------------
 
 
-SCOPE_CHARSET = []
-for char in ["\x21", ("\x23", "\x5b"), ("\x5d", "\x7E")]:
-    if isinstance(char, tuple):
-        c = char[0]
-        while c <= char[1]:
-            SCOPE_CHARSET.append(c)
-            c = chr(ord(c) + 1)
-    else:
-        SCOPE_CHARSET.append(set)
+# scope-token = 1*( %x21 / %x23-5B / %x5D-7E )
+SCOPE_CHARSET = frozenset(
+    chr(c) for c in [0x21, *range(0x23, 0x5B + 1), *range(0x5D, 0x7E + 1)]
+)
 
 
 def check_char_set(string, allowed):
@@ -284,30 +277,24 @@ def verify_id_token(instance, check_hash=False, **kwargs):
         except KeyError:
             pass
 
-    _jws = str(instance["id_token"])
+    if "keyjar" in kwargs:
+        keyjar = kwargs["keyjar"]
 
-    # It can be encrypted, so try to decrypt first
-    _jwe = JWE_factory(_jws)
-    if _jwe is not None:
-        try:
-            _jws = _jwe.decrypt(keys=kwargs["keyjar"].get_decrypt_key())
-        except JWEException as err:
-            raise VerificationError("Could not decrypt id_token", err)
-    _packer = JWT()
-    _body = _packer.unpack(_jws).payload()
+        def check_issuer(payload):
+            try:
+                if payload["iss"] not in keyjar:
+                    raise ValueError("Unknown issuer")
+            except KeyError:
+                raise MissingRequiredAttribute("iss")
 
-    if "keyjar" in kwargs:
-        try:
-            if _body["iss"] not in kwargs["keyjar"]:
-                raise ValueError("Unknown issuer")
-        except KeyError:
-            raise MissingRequiredAttribute("iss")
+        args["check_payload"] = check_issuer
 
-    if _jwe is not None:
-        # Use the original encrypted token to set correct headers
+    # The token is decrypted and parsed once, the issuer is checked on the
+    # parsed payload before the signature is verified.
+    try:
         idt = IdToken().from_jwt(str(instance["id_token"]), **args)
-    else:
-        idt = IdToken().from_jwt(_jws, **args)
+    except JWEException as err:
+        raise VerificationError("Could not decrypt id_token", err)
     if not idt.verify(**kwargs):
         raise VerificationError("Could not verify id_token", idt)
 
@@ -969,7 +956,7 @@ def jwt_deser(val, sformat="json"):
         sformat = "json"
     if sformat in ["dict", "json"]:
         if not isinstance(val, str):
-            val = json.dumps(val)
+            val = json_codec.dumps(val)
             sformat = "json"
     return JasonWebToken().deserialize(val, sformat)
 
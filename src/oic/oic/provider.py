@@ -68,6 +68,7 @@ from oic.oic.message import OIDCMessageFactory
 from oic.oic.message import OpenIDRequest
 from oic.oic.message import OpenIDSchema
 from oic.utils import sort_sign_alg
+from oic.utils.cache import LRUCache
 from oic.utils.http_util import OAUTH2_NOCACHE_HEADERS
 from oic.utils.http_util import BadRequest
 from oic.utils.http_util import CookieDealer
@@ -76,6 +77,8 @@ from oic.utils.http_util import Response
 from oic.utils.http_util import SeeOther
 from oic.utils.http_util import Unauthorized
 from oic.utils.jwt import JWT
+from oic.utils.jwt import CompactSigner
+from oic.utils.jwt import sign_many
 from oic.utils.keyio import KEYS
 from oic.utils.keyio import KeyBundle
 from oic.utils.keyio import KeyJar
@@ -84,9 +87,10 @@ from oic.utils.keyio import key_export
 from oic.utils.sanitize import sanitize
 from oic.utils.sdb import AccessCodeUsed
 from oic.utils.sdb import ExpiredToken
+from oic.utils.sdb import SessionConflict
 from oic.utils.sdb import WrongTokenType
 from oic.utils.sdb import session_get
-from oic.utils.session_backend import AuthnEvent
+from oic.utils.session_backend import session_authn_event
 from oic.utils.settings import OicProviderSettings
 from oic.utils.settings import PyoidcSettings
 from oic.utils.template_render import render_template
@@ -332,6 +336,9 @@ class Provider(AProvider):
         self.logout_path = logout_path
         self.logout_verify_url = ""
 
+        # Signers for ID Tokens, see id_token_signer
+        self.signer_cache = LRUCache(maxsize=1024, ttl=None)
+
     @property
     def default_capabilities(self):
         """Define default capabilities for implementation."""
@@ -406,7 +413,46 @@ class Provider(AProvider):
         extra_claims=None,
         **kwargs,
     ):
+        alg, _idt = self._make_id_token(
+            session,
+            loa,
+            alg,
+            code,
+            access_token,
+            user_info,
+            auth_time,
+            exp,
+            extra_claims,
+        )
+
+        if "keys" in kwargs or "keyjar" in kwargs:
+            try:
+                ckey = kwargs["keys"]
+            except KeyError:
+                ckey = self._id_token_signing_keys(
+                    alg, session["client_id"], kwargs["keyjar"]
+                )
+            return _idt.to_jwt(key=ckey, algorithm=alg)
+
+        return self.id_token_signer(alg, session["client_id"]).sign(_idt.to_json())
+
+    def _make_id_token(
+        self,
+        session,
+        loa="2",
+        alg="",
+        code=None,
+        access_token=None,
+        user_info=None,
+        auth_time=0,
+        exp=None,
+        extra_claims=None,
+    ):
+        """
+        Resolve the signing algorithm and build the claims of an ID Token.
 
+        :return: A tuple of the signing algorithm and the IdToken instance
+        """
         if alg == "":
             alg = self.jwx_def["signing_alg"]["id_token"]
 
@@ -427,32 +473,56 @@ class Provider(AProvider):
             exp,
             extra_claims,
         )
+        logger.debug("id_token: %s" % sanitize(_idt.to_dict()))
+        return alg, _idt
+
+    def _id_token_signing_keys(self, alg, client_id, keyjar):
+        # My signing key if its RS*, can use client secret if HS*
+        if alg.startswith("HS"):
+            logger.debug("client_id: %s" % client_id)
+            ckey = keyjar.get_signing_key(alg2keytype(alg), client_id)
+            if not ckey:  # create a new key
+                _secret = self.cdb[client_id]["client_secret"]
+                ckey = [SYMKey(key=_secret)]
+        else:
+            if "" in self.keyjar:
+                ckey = keyjar.get_signing_key(alg2keytype(alg), "", alg=alg)
+            else:
+                ckey = None
+        return ckey
 
-        try:
-            ckey = kwargs["keys"]
-        except KeyError:
+    def id_token_signer(self, alg, client_id):
+        """
+        Return the signer for ID Tokens for a client.
+
+        Signers are cached per algorithm, and per client for HS* algorithms.
+        A cached signer is replaced once the keys it was picked from or the
+        client secret change.
+
+        :param alg: The signing algorithm
+        :param client_id: The client the ID Token is for
+        :return: A :class:`oic.utils.jwt.CompactSigner`
+        """
+        if alg.startswith("HS"):
             try:
-                _keyjar = kwargs["keyjar"]
+                _secret = self.cdb[client_id].get("client_secret")
             except KeyError:
-                _keyjar = self.keyjar
-
-            logger.debug("id_token: %s" % sanitize(_idt.to_dict()))
-            # My signing key if its RS*, can use client secret if HS*
-            if alg.startswith("HS"):
-                logger.debug("client_id: %s" % session["client_id"])
-                ckey = _keyjar.get_signing_key(alg2keytype(alg), session["client_id"])
-                if not ckey:  # create a new key
-                    _secret = self.cdb[session["client_id"]]["client_secret"]
-                    ckey = [SYMKey(key=_secret)]
-            else:
-                if "" in self.keyjar:
-                    ckey = _keyjar.get_signing_key(alg2keytype(alg), "", alg=alg)
-                else:
-                    ckey = None
-
-        _signed_jwt = _idt.to_jwt(key=ckey, algorithm=alg)
+                _secret = None
+            cache_key = (
+                alg,
+                client_id,
+                _secret,
+                self.keyjar.key_set_version([client_id]),
+            )
+        else:
+            cache_key = (alg, "", None, self.keyjar.key_set_version([""]))
 
-        return _signed_jwt
+        signer = self.signer_cache.get(cache_key)
+        if signer is None:
+            ckey = self._id_token_signing_keys(alg, client_id, self.keyjar)
+            signer = CompactSigner(alg, ckey)
+            self.signer_cache.set(cache_key, signer)
+        return signer
 
     def _parse_openid_request(self, request, **kwargs):
         return OpenIDRequest().from_jwt(request, keyjar=self.keyjar, **kwargs)
@@ -569,7 +639,6 @@ class Provider(AProvider):
         except KeyError:
             oidc_req = None
 
-        sid = self.sdb.create_authz_session(authn_event, areq, oidreq=oidc_req)
         kwargs = {}
         for param in ["sector_id", "subject_type"]:
             try:
@@ -577,7 +646,9 @@ class Provider(AProvider):
             except KeyError:
                 pass
 
-        self.sdb.do_sub(sid, cinfo["client_salt"], **kwargs)
+        with self.sdb.transaction():
+            sid = self.sdb.create_authz_session(authn_event, areq, oidreq=oidc_req)
+            self.sdb.do_sub(sid, cinfo["client_salt"], **kwargs)
         return sid
 
     def match_sp_sep(self, first, second):
@@ -806,18 +877,9 @@ class Provider(AProvider):
         :param user_info: User information
         :return: IDToken instance
         """
-        try:
-            alg = client_info["id_token_signed_response_alg"]
-        except KeyError:
-            try:
-                alg = self.jwx_def["signing_alg"]["id_token"]
-            except KeyError:
-                alg = PROVIDER_DEFAULT["id_token_signed_response_alg"]
-            else:
-                if not alg:
-                    alg = PROVIDER_DEFAULT["id_token_signed_response_alg"]
+        alg = self._id_token_signing_alg(client_info)
 
-        _authn_event = AuthnEvent.from_json(sinfo["authn_event"])
+        _authn_event = session_authn_event(sinfo)
         id_token = self.id_token_as_signed_jwt(
             sinfo,
             loa=_authn_event.authn_info,
@@ -836,12 +898,90 @@ class Provider(AProvider):
 
         return id_token
 
+    def _id_token_signing_alg(self, client_info):
+        try:
+            alg = client_info["id_token_signed_response_alg"]
+        except KeyError:
+            try:
+                alg = self.jwx_def["signing_alg"]["id_token"]
+            except KeyError:
+                alg = PROVIDER_DEFAULT["id_token_signed_response_alg"]
+            else:
+                if not alg:
+                    alg = PROVIDER_DEFAULT["id_token_signed_response_alg"]
+        return alg
+
+    def sign_encrypt_id_tokens(self, batch, executor=None, chunk_size=64):
+        """
+        Sign and or encrypt many IDTokens.
+
+        The signers are resolved once per algorithm and client for the whole batch.
+
+        :param batch: Dictionaries with the arguments of :meth:`sign_encrypt_id_token`
+        :param executor: A :class:`concurrent.futures.Executor` the signing is spread
+            over, use a ``ProcessPoolExecutor`` to sign on all cores.
+        :param chunk_size: Number of IDTokens signed per task given to the executor
+        :return: The IDTokens, in the order of the batch
+        """
+        batch = list(batch)
+        signers: Dict[Tuple[str, str], CompactSigner] = {}
+        jobs = []
+        for item in batch:
+            sinfo = item["sinfo"]
+            _authn_event = session_authn_event(sinfo)
+            alg, _idt = self._make_id_token(
+                sinfo,
+                loa=_authn_event.authn_info,
+                alg=self._id_token_signing_alg(item["client_info"]),
+                code=item.get("code"),
+                access_token=item.get("access_token"),
+                user_info=item.get("user_info"),
+                auth_time=_authn_event.authn_time,
+            )
+            try:
+                signer = signers[(alg, sinfo["client_id"])]
+            except KeyError:
+                signer = self.id_token_signer(alg, sinfo["client_id"])
+                signers[(alg, sinfo["client_id"])] = signer
+            jobs.append((signer, _idt.to_json()))
+
+        id_tokens = sign_many(jobs, executor, chunk_size)
+
+        # Then encrypt
+        for pos, item in enumerate(batch):
+            client_info = item["client_info"]
+            if "id_token_encrypted_response_alg" in client_info:
+                id_tokens[pos] = self.encrypt(
+                    id_tokens[pos],
+                    client_info,
+                    item["areq"]["client_id"],
+                    "id_token",
+                    "JWT",
+                )
+        return id_tokens
+
     def code_grant_type(self, areq):
         """
         Token authorization using Code Grant.
 
         RFC6749 section 4.1
         """
+        # The session is written once, when the code has been exchanged
+        try:
+            with self.sdb.transaction():
+                return self._code_grant_type(areq)
+        except SessionConflict as err:
+            # The code was exchanged by a concurrent request, handle it as a
+            # reused code and revoke all tokens issued for it
+            logger.error("Access code exchanged concurrently")
+            self.sdb.revoke_all_tokens(areq["code"].replace(" ", "+"))
+            # Including the refresh token issued here, it was never stored
+            _rtoken = (err.session or {}).get("refresh_token")
+            if _rtoken:
+                self.sdb.revoke_refresh_token(_rtoken)
+            return error_response("access_denied", descr="Access Code already used")
+
+    def _code_grant_type(self, areq):
         _sdb = self.sdb
         _log_debug = logger.debug
 
@@ -1008,7 +1148,7 @@ class Provider(AProvider):
         logger.debug("Session info: %s" % sanitize(session))
 
         if "authn_event" in session:
-            uid = AuthnEvent.from_json(session["authn_event"]).uid
+            uid = session_authn_event(session).uid
         else:
             uid = session["uid"]
 
@@ -1098,11 +1238,12 @@ class Provider(AProvider):
         _sdb = self.sdb
         # should be an access token
         try:
-            typ, key = _sdb.access_token.type_and_key(token)
+            parsed = _sdb.access_token.parse(token)
         except Exception:
             return error_response(
                 "invalid_token", descr="Invalid Token", status_code=401
             )
+        typ, key = parsed.type, parsed.sid
 
         _log_debug("access_token type: '%s'" % (typ,))
 
@@ -1110,7 +1251,7 @@ class Provider(AProvider):
             logger.error("Wrong token type: {}".format(typ))
             raise FailedAuthentication("Wrong type of token")
 
-        if _sdb.access_token.is_expired(token):
+        if parsed.is_expired():
             return error_response(
                 "invalid_token", descr="Token is expired", status_code=401
             )
@@ -1871,6 +2012,7 @@ class Provider(AProvider):
                             key.inactive_since = time.time()
 
         self.keyjar.add_kb("", kb)
+        self.signer_cache.clear()
 
         if self.jwks_name:
             # print to the jwks file
@@ -1890,6 +2032,7 @@ class Provider(AProvider):
                         kb.remove(key)
             if len(kb) == 0:
                 self.keyjar.issuer_keys[""].remove(kb)
+        self.signer_cache.clear()
 
     def get_by_sub_and_(self, sub: str, key: str, val: Any) -> Optional[str]:
         """
@@ -2047,10 +2190,8 @@ class Provider(AProvider):
 
         :param usids: List of session IDs
         """
-        _sdb = self.sdb
         # Clean out all sessions
-        for sid in usids:
-            del _sdb[sid]
+        self.sdb.delete_many(usids)
 
     def logout_info_for_all_clients(
         self, uid: Optional[str] = "", sid: Optional[str] = ""
@@ -0,0 +1,77 @@
+"""Bounded in-memory caches."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from typing import Hashable
+from typing import Optional
+from typing import Tuple
+
+
+class LRUCache(object):
+    """
+    Thread safe least recently used cache whose entries also expire.
+
+    Every entry lives at most `ttl` seconds, or less if an earlier expiry time is
+    given when it is stored. When `maxsize` entries are stored the least recently
+    used one is dropped to make room for a new one.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 600):
+        """
+        Initialize the cache.
+
+        :param maxsize: Maximum number of entries
+        :param ttl: Maximum number of seconds an entry is kept, None for no limit
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value of a live entry or the default."""
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                return default
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """
+        Store an entry.
+
+        :param key: The key
+        :param value: The value
+        :param expires_at: Time at which the entry expires, limited by the ttl of the cache
+        """
+        if self.ttl is not None:
+            _max = time.time() + self.ttl
+            if expires_at is None or expires_at > _max:
+                expires_at = _max
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,73 @@
+"""
+JSON encoding and decoding of messages.
+
+The standard library :mod:`json` module is used by default. A faster drop-in
+encoder and decoder can be installed with :func:`set_json_codec`, or by giving a
+:class:`JSONCodec` as the ``json_codec`` setting of a client or a server. The
+codec is used by all the messages of the process, so a client or a server never
+replaces a codec installed by someone else.
+"""
+import json
+import threading
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import Union
+
+
+class JSONCodec(object):
+    """
+    A pair of functions encoding to and decoding from JSON.
+
+    ``dumps`` is given a JSON serializable object and returns a ``str``, ``loads``
+    is given a ``str`` or ``bytes`` and raises a :class:`ValueError` if it is not
+    valid JSON. With orjson, for example::
+
+        JSONCodec(dumps=lambda obj: orjson.dumps(obj).decode(), loads=orjson.loads)
+    """
+
+    def __init__(
+        self,
+        dumps: Callable[[Any], str] = json.dumps,
+        loads: Callable[[Union[str, bytes]], Any] = json.loads,
+    ):
+        self.dumps = dumps
+        self.loads = loads
+
+
+STDLIB_CODEC = JSONCodec()
+
+_codec = STDLIB_CODEC
+_lock = threading.Lock()
+
+
+def get_json_codec() -> JSONCodec:
+    """Return the codec in use."""
+    return _codec
+
+
+def set_json_codec(codec: Optional[JSONCodec]) -> None:
+    """Install a codec, None restores the standard library one."""
+    global _codec
+    _codec = codec or STDLIB_CODEC
+
+
+def install_json_codec(codec: JSONCodec) -> None:
+    """
+    Install a codec unless another one than the standard library one is installed.
+
+    :raises: ValueError if a different codec is installed
+    """
+    global _codec
+    with _lock:
+        if _codec is not STDLIB_CODEC and _codec is not codec:
+            raise ValueError("Another JSON codec is already installed")
+        _codec = codec
+
+
+def dumps(obj: Any) -> str:
+    return _codec.dumps(obj)
+
+
+def loads(txt: Union[str, bytes]) -> Any:
+    return _codec.loads(txt)
@@ -0,0 +1,213 @@
+"""
+Storage of the JWT IDs of issued tokens.
+
+A token is active as long as its JWT ID is stored, the stored value is the
+session the token belongs to. Entries are dropped some time after the token
+expired, when it can no longer be used anyway.
+"""
+import heapq
+import sqlite3
+import threading
+from abc import ABCMeta
+from abc import abstractmethod
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from oic.utils.time_util import utc_time_sans_frac
+
+
+class JTIStore(metaclass=ABCMeta):
+    """Mapping of JWT IDs to session ids, with an expiry time per entry."""
+
+    def __init__(self, grace: int = 600):
+        """
+        Initialize the store.
+
+        :param grace: Number of seconds an entry is kept after the token expired
+        """
+        self.grace = grace
+
+    @abstractmethod
+    def add(self, jti: str, sid: str, exp: Optional[int] = None) -> None:
+        """
+        Store the session id of a token.
+
+        :param jti: The JWT ID of the token
+        :param sid: The session id
+        :param exp: Expiry time of the token, None if it never expires
+        """
+
+    @abstractmethod
+    def __getitem__(self, jti: str) -> str:
+        """Return the session id stored for a JWT ID."""
+
+    @abstractmethod
+    def __delitem__(self, jti: str) -> None:
+        """Remove a JWT ID, raise KeyError if it is not stored."""
+
+    @abstractmethod
+    def remove_expired(self, when: Optional[int] = None) -> int:
+        """
+        Remove the entries of tokens that expired more than `grace` seconds ago.
+
+        :param when: Timestamp to compare the expiry times with, defaults to now
+        :return: Number of removed entries
+        """
+
+    def __setitem__(self, jti: str, sid: str) -> None:
+        self.add(jti, sid)
+
+    def __contains__(self, jti: str) -> bool:
+        try:
+            self[jti]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, jti: str, default: Any = None) -> Any:
+        try:
+            return self[jti]
+        except KeyError:
+            return default
+
+
+class MemoryJTIStore(JTIStore):
+    """
+    JTI store kept in memory.
+
+    The expiry times are kept in a heap, expired entries are removed as new ones are added.
+    """
+
+    def __init__(self, grace: int = 600):
+        super().__init__(grace)
+        self._db: Dict[str, Tuple[str, Optional[int]]] = {}
+        self._expiry: List[Tuple[int, str]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._db)
+
+    def add(self, jti: str, sid: str, exp: Optional[int] = None) -> None:
+        with self._lock:
+            self._remove_expired(utc_time_sans_frac())
+            self._db[jti] = (sid, exp)
+            if exp is not None:
+                heapq.heappush(self._expiry, (exp, jti))
+
+    def __getitem__(self, jti: str) -> str:
+        return self._db[jti][0]
+
+    def __delitem__(self, jti: str) -> None:
+        with self._lock:
+            del self._db[jti]
+
+    def remove_expired(self, when: Optional[int] = None) -> int:
+        if when is None:
+            when = utc_time_sans_frac()
+        with self._lock:
+            return self._remove_expired(when)
+
+    def _remove_expired(self, when: int) -> int:
+        removed = 0
+        while self._expiry and self._expiry[0][0] + self.grace < when:
+            exp, jti = heapq.heappop(self._expiry)
+            # The entry may have been removed or stored again since
+            try:
+                _, _exp = self._db[jti]
+            except KeyError:
+                continue
+            if _exp == exp:
+                del self._db[jti]
+                removed += 1
+        return removed
+
+
+class SQLJTIStore(JTIStore):
+    """
+    JTI store in a SQL database, to be shared among processes.
+
+    Uses sqlite3 by default, a file path makes the store persistent. Any DB-API 2.0
+    connection using the qmark parameter style can be given instead. Expired
+    entries are removed by calling :meth:`remove_expired`.
+    """
+
+    def __init__(
+        self, db: Any = ":memory:", table: str = "pyoidc_jti", grace: int = 600
+    ):
+        """
+        Create the storage.
+
+        :param db: Path to an sqlite3 database or an open DB-API 2.0 connection
+        :param table: Name of the table used to store the JWT IDs
+        :param grace: Number of seconds an entry is kept after the token expired
+        """
+        super().__init__(grace)
+        if not table.isidentifier():
+            raise ValueError("Invalid table name: {}".format(table))
+        if isinstance(db, str):
+            db = sqlite3.connect(db, check_same_thread=False)
+        self._conn = db
+        self._lock = threading.RLock()
+        self.table = table
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS {table} ("
+            "jti VARCHAR(255) PRIMARY KEY, "
+            "sid VARCHAR(255) NOT NULL, "
+            "exp INTEGER)"
+        )
+        self._execute("CREATE INDEX IF NOT EXISTS {table}_exp ON {table} (exp)")
+
+    def _execute(self, query: str, params: Tuple = ()) -> Any:
+        """Run a single query in its own transaction and return the cursor."""
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute(query.format(table=self.table), params)
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+            return cursor
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def add(self, jti: str, sid: str, exp: Optional[int] = None) -> None:
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute(
+                    "DELETE FROM {} WHERE jti = ?".format(self.table), (jti,)
+                )
+                cursor.execute(
+                    "INSERT INTO {} (jti, sid, exp) "
+                    "VALUES (?, ?, ?)".format(self.table),  # nosec
+                    (jti, sid, exp),
+                )
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def __getitem__(self, jti: str) -> str:
+        row = self._execute("SELECT sid FROM {table} WHERE jti = ?", (jti,)).fetchone()
+        if row is None:
+            raise KeyError(jti)
+        return row[0]
+
+    def __delitem__(self, jti: str) -> None:
+        cursor = self._execute("DELETE FROM {table} WHERE jti = ?", (jti,))
+        if cursor.rowcount == 0:
+            raise KeyError(jti)
+
+    def remove_expired(self, when: Optional[int] = None) -> int:
+        if when is None:
+            when = utc_time_sans_frac()
+        cursor = self._execute(
+            "DELETE FROM {table} WHERE exp IS NOT NULL AND exp < ?",
+            (when - self.grace,),
+        )
+        return cursor.rowcount
@@ -1,16 +1,179 @@
+import hashlib
+import hmac
 import json
 import uuid
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import cast
 
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import utils as asym_utils
+from jwkest import b64e
 from jwkest import jwe
 from jwkest import jws
 from jwkest.jwe import JWE
+from jwkest.jws import JWS
+from jwkest.jws import SIGNER_ALGS
 from jwkest.jws import NoSuitableSigningKeys
+from jwkest.jws import UnknownAlgorithm
+from jwkest.jwt import b64encode_item
 
 from oic.oic.message import JasonWebToken
+from oic.utils.cache import LRUCache
+from oic.utils.keyio import KeyBundle
 from oic.utils.time_util import utc_time_sans_frac
 
 __author__ = "roland"
 
+EC_CURVES: Dict[str, Callable[[], ec.EllipticCurve]] = {
+    "P-256": ec.SECP256R1,
+    "P-384": ec.SECP384R1,
+    "P-521": ec.SECP521R1,
+}
+
+
+class CompactSigner(object):
+    """
+    Produces JWS compact serializations with a signing key picked once.
+
+    The key is picked from the given keys the same way as
+    :meth:`oic.oauth2.message.Message.to_jwt` does, and the header and the key
+    material are prepared so signing a payload only runs the signature algorithm.
+    RSA and EC signatures are made with ``cryptography``, which is a lot faster
+    than the implementations used by ``jwkest``.
+    """
+
+    def __init__(self, alg, keys):
+        """
+        Initialize the signer.
+
+        :param alg: The signing algorithm
+        :param keys: The keys to pick the signing key from
+        :raises NoSuitableSigningKeys: If no key can be used with the algorithm
+        """
+        self.alg = alg
+        self.key, headers, _ = JWS("", alg=alg).alg_keys(keys, "sig")
+        self.kid = headers.get("kid", "")
+        self._header = b64encode_item(headers) + b"."
+
+        if alg == "none":
+            self._sign = None
+            return
+        try:
+            _signer = SIGNER_ALGS[alg]
+        except KeyError:
+            raise UnknownAlgorithm(alg)
+
+        material = self.key.get_key(alg=alg, private=True)
+        bits = alg[2:]
+        if alg.startswith("HS"):
+            digest = getattr(hashlib, "sha" + bits)
+            self._sign = lambda msg: hmac.new(material, msg, digest).digest()
+        elif alg.startswith("RS") or alg.startswith("PS"):
+            _key = cast(
+                rsa.RSAPrivateKey,
+                serialization.load_der_private_key(material.export_key("DER"), None),
+            )
+            _hash = getattr(hashes, "SHA" + bits)()
+            _padding: padding.AsymmetricPadding
+            if alg.startswith("RS"):
+                _padding = padding.PKCS1v15()
+            else:
+                _padding = padding.PSS(
+                    mgf=padding.MGF1(_hash), salt_length=_hash.digest_size
+                )
+            self._sign = lambda msg: _key.sign(msg, _padding, _hash)
+        elif alg.startswith("ES"):
+            _curve = EC_CURVES[self.key.crv]()
+            _ec_key = ec.derive_private_key(self.key.d, _curve)
+            _ecdsa = ec.ECDSA(getattr(hashes, "SHA" + bits)())
+            _size = (_curve.key_size + 7) // 8
+
+            def _sign(msg):
+                r, s = asym_utils.decode_dss_signature(_ec_key.sign(msg, _ecdsa))
+                return r.to_bytes(_size, "big") + s.to_bytes(_size, "big")
+
+            self._sign = _sign
+        else:
+            self._sign = lambda msg: _signer.sign(msg, material)
+
+    def __reduce__(self):
+        # The prepared key material can not be pickled, send the JWK instead
+        keys = [] if self.key is None else [self.key.serialize(private=True)]
+        return (_load_compact_signer, (self.alg, keys))
+
+    def sign(self, payload):
+        """
+        Sign a payload.
+
+        :param payload: The JSON document to sign
+        :return: The signed JWT
+        """
+        _input = self._header + b64e(payload.encode("utf-8"))
+        if self._sign is None:
+            return _input.decode("utf-8") + "."
+        return ".".join(
+            [_input.decode("utf-8"), b64e(self._sign(_input)).decode("utf-8")]
+        )
+
+
+# Signers unpickled in this process, loading the keys again for every task
+# would cost more than the signing.
+_LOADED_SIGNERS = LRUCache(maxsize=64, ttl=None)
+
+
+def _load_compact_signer(alg, keys):
+    cache_key = json.dumps([alg, keys], sort_keys=True)
+    signer = _LOADED_SIGNERS.get(cache_key)
+    if signer is None:
+        signer = CompactSigner(alg, KeyBundle(keys).keys())
+        _LOADED_SIGNERS.set(cache_key, signer)
+    return signer
+
+
+def _sign_payloads(signer, payloads):
+    return [signer.sign(payload) for payload in payloads]
+
+
+def sign_many(jobs, executor=None, chunk_size=64):
+    """
+    Sign many payloads.
+
+    :param jobs: Pairs of a :class:`CompactSigner` and the payload it should sign
+    :param executor: A :class:`concurrent.futures.Executor` to spread the signing
+        over, a ``ProcessPoolExecutor`` makes use of all cores for RSA signatures.
+    :param chunk_size: Number of payloads signed per task given to the executor
+    :return: The signed JWTs, in the order of the jobs
+    """
+    if executor is None:
+        return [signer.sign(payload) for signer, payload in jobs]
+
+    # Group per signer so each task needs only one signer
+    groups: Dict[int, Tuple[CompactSigner, List[int]]] = {}
+    for pos, (signer, _) in enumerate(jobs):
+        groups.setdefault(id(signer), (signer, []))[1].append(pos)
+
+    tasks = []
+    for signer, positions in groups.values():
+        for start in range(0, len(positions), chunk_size):
+            chunk = positions[start : start + chunk_size]
+            future = executor.submit(
+                _sign_payloads, signer, [jobs[pos][1] for pos in chunk]
+            )
+            tasks.append((chunk, future))
+
+    result: List[str] = [""] * len(jobs)
+    for chunk, future in tasks:
+        for pos, token in zip(chunk, future.result()):
+            result[pos] = token
+    return result
+
 
 class JWT(object):
     def __init__(
@@ -4,11 +4,14 @@ import json
 import logging
 import os
 import sys
+import threading
 import time
+import weakref
 from typing import Any
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 from typing import Union
 from urllib.parse import urlsplit
 
@@ -74,6 +77,7 @@ class KeyBundle(object):
         keytype="RSA",
         keyusage=None,
         timeout=5,
+        refresher=None,
     ):
         """
         Initialize the KeyBundle.
@@ -87,6 +91,8 @@ class KeyBundle(object):
         :param timeout: Timeout for requests library. Can be specified either as
             a single integer or as a tuple of integers. For more details, refer to
             ``requests`` documentation.
+        :param refresher: A :class:`KeyBundleRefresher` that refreshes a remote
+            key set in the background instead of when the keys are asked for.
         """
         self._keys: List[KEYS] = []
         self.remote = False
@@ -101,6 +107,7 @@ class KeyBundle(object):
         self.imp_jwks: Dict[str, Any] = {}
         self.last_updated: float = 0
         self.timeout = timeout
+        self.refresher = refresher
 
         if keys:
             self.source = None
@@ -124,14 +131,20 @@ class KeyBundle(object):
                     self.do_local_jwk(self.source)
                 elif self.fileformat == "der":  # Only valid for RSA keys
                     self.do_local_der(self.source, self.keytype, self.keyusage)
+            elif refresher is not None:
+                refresher.add(self)
 
-    def do_keys(self, keys):
+    def do_keys(self, keys, replace=False):
         """
         Go from JWK description to binary keys.
 
-        :param keys:
-        :return:
+        The keys are collected in a new list that replaces the old one once all
+        keys are loaded, so readers never see a partially loaded key set.
+
+        :param keys: A list of JWKs
+        :param replace: Replace the present keys instead of adding to them
         """
+        _keys = [] if replace else list(self._keys)
         for inst in keys:
             if not isinstance(inst, dict):
                 raise JWKSError("Illegal JWK")
@@ -148,12 +161,13 @@ class KeyBundle(object):
                 except JWKException as err:
                     logger.warning("Loading a key failed: %s", err)
                 else:
-                    if _key not in self._keys:
-                        self._keys.append(_key)
+                    if _key not in _keys:
+                        _keys.append(_key)
                         flag = 1
                         break
             if not flag:
                 logger.warning("Unknown key type: %s", typ)
+        self._keys = _keys
 
     def do_local_jwk(self, filename):
         try:
@@ -174,20 +188,27 @@ class KeyBundle(object):
         if not keyusage:
             keyusage = ["enc", "sig"]
 
+        _keys = list(self._keys)
         for use in keyusage:
             _key = RSAKey().load_key(_bkey)
             _key.use = use
-            self._keys.append(_key)
+            _keys.append(_key)
+        self._keys = _keys
 
         self.last_updated = time.time()
 
+    def remote_request_args(self):
+        """Return the arguments for the HTTP client used to fetch the remote key set."""
+        args = {"verify": self.verify_ssl, "timeout": self.timeout}
+        if self.etag:
+            args["headers"] = {"If-None-Match": self.etag}
+        return args
+
     def do_remote(self):
         if self.source is None:
             # Nothing to do
             return False
-        args = {"verify": self.verify_ssl, "timeout": self.timeout}
-        if self.etag:
-            args["headers"] = {"If-None-Match": self.etag}
+        args = self.remote_request_args()
 
         try:
             logging.debug("KeyBundle fetch keys from: %s", self.source)
@@ -196,11 +217,20 @@ class KeyBundle(object):
             logger.error(err)
             raise_exception(UpdateFailed, REMOTE_FAILED.format(self.source, str(err)))
 
+        return self.handle_remote_response(r)
+
+    def handle_remote_response(self, r):
+        """
+        Load the keys from the HTTP response of the remote key set.
+
+        :param r: HTTP response from the 'jwks_uri' endpoint
+        :return: True if new content was loaded
+        """
         if r.status_code == 304:  # file has not changed
             self.time_out = time.time() + self.cache_time
             self.last_updated = time.time()
             try:
-                self.do_keys(self.imp_jwks["keys"])
+                self.do_keys(self.imp_jwks["keys"], replace=True)
             except KeyError:
                 logger.error("No 'keys' keyword in JWKS")
                 raise_exception(UpdateFailed, "No 'keys' keyword in JWKS")
@@ -215,7 +245,7 @@ class KeyBundle(object):
 
             logger.debug("Loaded JWKS: %s from %s" % (r.text, self.source))
             try:
-                self.do_keys(self.imp_jwks["keys"])
+                self.do_keys(self.imp_jwks["keys"], replace=True)
             except KeyError:
                 logger.error("No 'keys' keyword in JWKS")
                 raise_exception(UpdateFailed, MALFORMED.format(self.source))
@@ -259,14 +289,13 @@ class KeyBundle(object):
 
     def _uptodate(self):
         res = False
-        if self._keys is not []:
-            if self.remote:  # verify that it's not to old
-                if time.time() > self.time_out:
-                    if self.update():
-                        res = True
-        elif self.remote:
-            if self.update():
-                res = True
+        if self.remote:  # verify that it's not to old
+            if time.time() > self.time_out:
+                if self.refresher is not None and self.last_updated:
+                    # Keep serving the present keys while they are refreshed
+                    self.refresher.schedule(self)
+                elif self.update():
+                    res = True
         return res
 
     def update(self):
@@ -274,13 +303,13 @@ class KeyBundle(object):
         Reload the key if necessary.
 
         This is a forced update, will happen even if cache time has not elapsed.
+        A remote key set replaces the present keys only once it has been loaded.
         """
         res = True  # An update was successful
         if self.source:
-            # reread everything
-            self._keys = []
-
             if self.remote is False:
+                # reread everything
+                self._keys = []
                 if self.fileformat == "jwk":
                     self.do_local_jwk(self.source)
                 elif self.fileformat == "der":
@@ -342,11 +371,15 @@ class KeyBundle(object):
             keys.append(key)
         return json.dumps({"keys": keys})
 
+    # The key list is never changed in place, so that a KeyJar can tell from its
+    # identity if its index of the bundle is still valid.
     def append(self, key):
-        self._keys.append(key)
+        self._keys = self._keys + [key]
 
     def remove(self, key):
-        self._keys.remove(key)
+        _keys = list(self._keys)
+        _keys.remove(key)
+        self._keys = _keys
 
     def __len__(self):
         return len(self._keys)
@@ -357,7 +390,11 @@ class KeyBundle(object):
                 return key
 
         # Try updating since there might have been an update to the key file
-        self.update()
+        if self.refresher is not None and self.last_updated:
+            if not self.refresher.refresh_now(self):
+                return None
+        else:
+            self.update()
 
         for key in self._keys:
             if key.kid == kid:
@@ -394,6 +431,154 @@ class KeyBundle(object):
         self._keys = _kl
 
 
+class KeyBundleRefresher(object):
+    """
+    Refreshes remote key bundles in a background thread.
+
+    A bundle is refreshed ahead of the end of its cache time, while that is done the
+    old keys are still served and replaced only once the new key set is loaded.
+    This keeps the fetching of a key set out of signature verification.
+    Failed refreshes are retried with an exponential backoff.
+    """
+
+    def __init__(
+        self, refresh_ahead=30, min_backoff=1, max_backoff=300, min_interval=5
+    ):
+        """
+        Initialize the refresher, the thread is started when the first bundle is added.
+
+        :param refresh_ahead: How many seconds before the end of the cache time to
+            refresh, at most half of the cache time of the bundle.
+        :param min_backoff: Seconds to wait before retrying a failed refresh
+        :param max_backoff: Upper limit of the seconds between retries
+        :param min_interval: Seconds between the refreshes asked for by unknown key ids
+        """
+        self.refresh_ahead = refresh_ahead
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.min_interval = min_interval
+        self._bundles: weakref.WeakSet = weakref.WeakSet()
+        self._requested: weakref.WeakSet = weakref.WeakSet()
+        # Bundle to (time of next retry, present delay)
+        self._backoff: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, kb):
+        """Start refreshing a bundle."""
+        with self._lock:
+            self._bundles.add(kb)
+        self._start()
+        self._wakeup.set()
+
+    def schedule(self, kb):
+        """Ask for a bundle to be refreshed as soon as its backoff allows."""
+        with self._lock:
+            self._bundles.add(kb)
+            self._requested.add(kb)
+        self._start()
+        self._wakeup.set()
+
+    def next_refresh(self, kb):
+        """Return the time at which a bundle is to be refreshed."""
+        try:
+            return self._backoff[kb][0]
+        except KeyError:
+            pass
+        if kb in self._requested:
+            return 0
+        return kb.time_out - min(self.refresh_ahead, kb.cache_time / 2)
+
+    def refresh(self, kb, now=None):
+        """
+        Refresh a bundle, keeping its keys if that fails.
+
+        :return: True if the refresh succeeded
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._requested.discard(kb)
+        try:
+            kb.update()
+        except Exception as err:
+            delay = self._backoff.get(kb, (0, 0))[1]
+            delay = min(self.max_backoff, delay * 2 if delay else self.min_backoff)
+            self._backoff[kb] = (now + delay, delay)
+            logger.warning(
+                "Refreshing keys from %s failed, retrying in %s seconds: %s",
+                kb.source,
+                delay,
+                err,
+            )
+            return False
+        self._backoff.pop(kb, None)
+        return True
+
+    def refresh_now(self, kb, now=None):
+        """
+        Refresh a bundle inline, as when a key with an unknown key id is asked for.
+
+        Nothing is done if the bundle was loaded less than ``min_interval`` seconds
+        ago or a failed refresh is waiting for its backoff.
+
+        :return: True if the bundle was refreshed
+        """
+        if now is None:
+            now = time.time()
+        if now - kb.last_updated < self.min_interval:
+            return False
+        if self._backoff.get(kb, (0, 0))[0] > now:
+            return False
+        return self.refresh(kb, now)
+
+    def refresh_due(self, now=None):
+        """
+        Refresh all the bundles that are due.
+
+        :return: Seconds until the next refresh is due, None if there are no bundles
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            bundles = list(self._bundles)
+        wait = None
+        for kb in bundles:
+            if self.next_refresh(kb) <= now:
+                self.refresh(kb, now)
+            _wait = max(self.next_refresh(kb) - now, 0)
+            if wait is None or _wait < wait:
+                wait = _wait
+        return wait
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(
+                    target=self._run, name="KeyBundleRefresher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            try:
+                wait = self.refresh_due()
+            except Exception:
+                logger.exception("Refreshing keys failed")
+                wait = self.min_backoff
+            self._wakeup.wait(wait)
+
+    def stop(self, timeout=None):
+        """Stop the background thread."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
 def keybundle_from_local_file(filename, typ, usage):
     if typ.upper() == "RSA":
         kb = KeyBundle()
@@ -445,11 +630,84 @@ def dump_jwks(kbl, target, private=False):
     f.close()
 
 
+class _IssuerKeyIndex(object):
+    """
+    Lookup tables of the keys of one issuer.
+
+    The tables are filled on demand and only hold the keys matching a key type and
+    usage, the rest of the selection is done on these few keys at lookup time.
+    They are valid as long as the issuer has the same bundles with the same key lists.
+    """
+
+    def __init__(self, bundles):
+        self.bundles = list(bundles)
+        self.key_lists = [kb._keys for kb in self.bundles]
+        # (key_use, key_type) -> [(bundle position, key)]
+        self.candidates: Dict[Tuple[str, str], List[Tuple[int, KEYS]]] = {}
+        # key_type -> kid -> [(bundle position, key)]
+        self.kids: Dict[str, Dict[str, List[Tuple[int, KEYS]]]] = {}
+
+    def valid(self, bundles):
+        if len(bundles) != len(self.bundles):
+            return False
+        for kb, _kb, _keys in zip(bundles, self.bundles, self.key_lists):
+            if kb is not _kb or kb._keys is not _keys:
+                return False
+        return True
+
+    def _keys(self, key_type):
+        if not key_type:
+            return [
+                (pos, key) for pos, kb in enumerate(self.bundles) for key in kb._keys
+            ]
+        _typs = [key_type.lower(), key_type.upper()]
+        return [
+            (pos, key)
+            for pos, kb in enumerate(self.bundles)
+            for key in kb._keys
+            if key.kty in _typs
+        ]
+
+    def get_candidates(self, key_use, key_type):
+        try:
+            return self.candidates[(key_use, key_type)]
+        except KeyError:
+            pass
+        use = "enc" if key_use in ["dec", "enc"] else "sig"
+        _cand = []
+        for pos, key in self._keys(key_type):
+            if not key.use or use == key.use:
+                _cand.append((pos, key))
+            # Verification can be performed by both `sig` and `ver` keys
+            elif key_use == "ver" and key.use in ("sig", "ver"):
+                _cand.append((pos, key))
+        self.candidates[(key_use, key_type)] = _cand
+        return _cand
+
+    def get_kids(self, key_type):
+        try:
+            return self.kids[key_type]
+        except KeyError:
+            pass
+        _kids: Dict[str, List[Tuple[int, KEYS]]] = {}
+        for pos, key in self._keys(key_type):
+            if key.kid:
+                _kids.setdefault(key.kid, []).append((pos, key))
+        self.kids[key_type] = _kids
+        return _kids
+
+
 class KeyJar(object):
     """A keyjar contains a number of KeyBundles."""
 
     def __init__(
-        self, verify_ssl=True, keybundle_cls=KeyBundle, remove_after=3600, timeout=5
+        self,
+        verify_ssl=True,
+        keybundle_cls=KeyBundle,
+        remove_after=3600,
+        timeout=5,
+        refresher=None,
+        jwt_cache=None,
     ):
         """
         Initialize the class.
@@ -458,6 +716,11 @@ class KeyJar(object):
         :param timeout: Timeout for requests library. Can be specified either as
             a single integer or as a tuple of integers. For more details, refer to
             ``requests`` documentation.
+        :param refresher: A :class:`KeyBundleRefresher` used for the remote key sets
+            added to the jar.
+        :param jwt_cache: A :class:`oic.utils.cache.LRUCache` in which
+            :meth:`oic.oauth2.message.Message.from_jwt` keeps the payloads of the
+            JWTs it verified with keys from this jar.
         :return:
         """
         self.issuer_keys: Dict[str, List[KeyBundle]] = {}
@@ -465,6 +728,9 @@ class KeyJar(object):
         self.timeout = timeout
         self.keybundle_cls = keybundle_cls
         self.remove_after = remove_after
+        self.refresher = refresher
+        self.jwt_cache = jwt_cache
+        self._index: Dict[str, _IssuerKeyIndex] = {}
 
     def __repr__(self):
         issuers = list(self.issuer_keys.keys())
@@ -494,6 +760,9 @@ class KeyJar(object):
         if not url:
             raise KeyError("No jwks_uri")
 
+        if self.refresher is not None:
+            kwargs.setdefault("refresher", self.refresher)
+
         if "/localhost:" in url or "/localhost/" in url:
             kc = self.keybundle_cls(
                 source=url, verify_ssl=False, timeout=self.timeout, **kwargs
@@ -552,72 +821,85 @@ class KeyJar(object):
         :param kid: A Key Identifier
         :return: A possibly empty list of keys
         """
-        if key_use in ["dec", "enc"]:
-            use = "enc"
-        else:
-            use = "sig"
-
-        if issuer != "":
-            try:
-                _keys = self.issuer_keys[issuer]
-            except KeyError:
-                if issuer.endswith("/"):
-                    try:
-                        _keys = self.issuer_keys[issuer[:-1]]
-                    except KeyError:
-                        _keys = []
-                else:
-                    try:
-                        _keys = self.issuer_keys[issuer + "/"]
-                    except KeyError:
-                        _keys = []
-        else:
-            try:
-                _keys = self.issuer_keys[issuer]
-            except KeyError:
-                _keys = []
-
-        lst: List[KEYS] = []
-        if _keys:
-            for bundle in _keys:
-                if key_type:
-                    _bkeys = bundle.get(key_type)
-                else:
-                    _bkeys = bundle.keys()
-                for key in _bkeys:
-                    if key.inactive_since and key_use != "ver":
-                        # Skip inactive keys unless for signature verification
-                        continue
-                    if kid and key.kid == kid:
-                        lst = [key]
-                        break
-                    if not key.use or use == key.use:
-                        lst.append(key)
-                        continue
-                    # Verification can be performed by both `sig` and `ver` keys
-                    if key_use == "ver" and key.use in ("sig", "ver"):
-                        lst.append(key)
+        issuer = self._resolve_issuer(issuer)
+        lst = self._lookup(issuer, key_use, key_type, kid)
 
         # if elliptic curve have to check I have a key of the right curve
         if key_type == "EC" and "alg" in kwargs:
             name = "P-{}".format(kwargs["alg"][2:])  # the type
-            _lst = []
-            for key in lst:
-                if name == key.crv:
-                    _lst.append(key)
-            lst = _lst
+            lst = [key for key in lst if name == key.crv]
 
-        if use == "enc" and key_type == "oct" and issuer != "":
+        if key_use in ["dec", "enc"] and key_type == "oct" and issuer != "":
             # Add my symmetric keys
-            for kb in self.issuer_keys[""]:
-                for key in kb.get(key_type):
-                    if key.inactive_since:
-                        continue
-                    if not key.use or key.use == use:
-                        lst.append(key)
+            if "" not in self.issuer_keys:
+                raise KeyError("")
+            lst.extend(self._lookup("", "enc", key_type))
 
         return lst
 
+    def _resolve_issuer(self, issuer):
+        """Return the issuer the keys are kept for, allowing a missing or extra trailing slash."""
+        if issuer != "" and issuer not in self.issuer_keys:
+            if issuer.endswith("/"):
+                return issuer[:-1]
+            return issuer + "/"
+        return issuer
+
+    def key_set_version(self, issuers):
+        """
+        Return a value that changes whenever the keys of one of the issuers do.
+
+        :param issuers: The issuers
+        :return: A tuple to compare with a previously returned one
+        """
+        return tuple(self._issuer_index(self._resolve_issuer(iss)) for iss in issuers)
+
+    def _issuer_index(self, issuer):
+        """Return the index of the keys of an issuer, rebuilding it if the keys have changed."""
+        bundles = self.issuer_keys.get(issuer)
+        if not bundles:
+            return None
+        for kb in bundles:
+            kb._uptodate()
+        try:
+            index = self._index[issuer]
+        except KeyError:
+            pass
+        else:
+            if index.valid(bundles):
+                return index
+        index = _IssuerKeyIndex(bundles)
+        self._index[issuer] = index
+        return index
+
+    def _lookup(self, issuer, key_use, key_type="", kid=None):
+        index = self._issuer_index(issuer)
+        if index is None:
+            return []
+
+        candidates = index.get_candidates(key_use, key_type)
+        if kid:
+            hits = [
+                (pos, key)
+                for pos, key in index.get_kids(key_type).get(kid, [])
+                if key_use == "ver" or not key.inactive_since
+            ]
+            if hits:
+                # The key is first in the list, followed by the keys of the
+                # bundles after the last one holding a key with the kid
+                last = hits[-1][0]
+                _pos, _key = next(hit for hit in hits if hit[0] == last)
+                return [_key] + [
+                    key
+                    for pos, key in candidates
+                    if pos > last and (key_use == "ver" or not key.inactive_since)
+                ]
+
+        # Skip inactive keys unless for signature verification
+        return [
+            key for _, key in candidates if key_use == "ver" or not key.inactive_since
+        ]
+
     def get_signing_key(self, key_type="", owner="", kid=None, **kwargs):
         return self.get("sig", key_type, owner, kid, **kwargs)
 
@@ -638,6 +920,12 @@ class KeyJar(object):
         :param owner: The owner of the key
         :return: a specific key instance or None
         """
+        index = self._issuer_index(owner)
+        if index is not None:
+            hits = index.get_kids("").get(kid)
+            if hits:
+                return hits[0][1]
+
         for kb in self.issuer_keys[owner]:
             _key = kb.get_key_with_kid(kid)
             if _key:
@@ -0,0 +1,190 @@
+"""
+Revocation lists for self-contained tokens.
+
+Only a digest and the expiry time of a revoked token are kept, and only until
+the token expires, after which it is rejected anyway. A Bloom filter can be put
+in front so that most tokens, which are not revoked, are passed after hashing.
+"""
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Dict
+from typing import Optional
+
+
+def token_digest(token: str) -> bytes:
+    """Return the digest a token is stored as."""
+    return hashlib.sha256(token.encode("utf-8")).digest()[:16]
+
+
+class BloomFilter(object):
+    """Bloom filter over token digests, using double hashing to get the bit positions."""
+
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.001):
+        """
+        Initialize the filter.
+
+        :param capacity: Number of entries for which the false positive rate holds
+        :param error_rate: The false positive rate
+        """
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2) + 1
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, digest: bytes) -> None:
+        for pos in self._positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+
+class RevocationList(object):
+    """
+    Set of revoked tokens, each kept until it expires.
+
+    The list can be serialized with :meth:`to_json` and stored with :meth:`save` to
+    be shared by several workers, each loading it with :meth:`load` or merging it
+    into its own with :meth:`update`.
+    """
+
+    def __init__(self, bloom_capacity: int = 0, error_rate: float = 0.001):
+        """
+        Initialize the list.
+
+        :param bloom_capacity: Expected number of revoked tokens, 0 for no Bloom filter
+        :param error_rate: False positive rate of the Bloom filter
+        """
+        self.bloom_capacity = bloom_capacity
+        self.error_rate = error_rate
+        self._revoked: Dict[bytes, Optional[int]] = {}
+        self._bloom = self._build_bloom(self._revoked)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def _build_bloom(
+        self, revoked: Dict[bytes, Optional[int]]
+    ) -> Optional[BloomFilter]:
+        if not self.bloom_capacity:
+            return None
+        bloom = BloomFilter(max(self.bloom_capacity, len(revoked)), self.error_rate)
+        for digest in revoked:
+            bloom.add(digest)
+        return bloom
+
+    def _replace(self, revoked: Dict[bytes, Optional[int]]) -> None:
+        # Entries can not be removed from a Bloom filter, so it is built anew.
+        # Lookups skip the filter while the set is being replaced.
+        bloom = self._build_bloom(revoked)
+        self._bloom = None
+        self._revoked = revoked
+        self._bloom = bloom
+
+    def _add(self, digest: bytes, exp: Optional[int]) -> None:
+        self._revoked[digest] = exp
+        if self._bloom is not None:
+            self._bloom.add(digest)
+
+    def add(self, token: str, exp: Optional[int] = None) -> None:
+        """
+        Revoke a token.
+
+        :param token: The token
+        :param exp: Expiry time of the token, None to keep it revoked forever
+        """
+        with self._lock:
+            self._add(token_digest(token), exp)
+
+    def check_and_add(self, token: str, exp: Optional[int] = None) -> bool:
+        """
+        Revoke a token unless it already is, as one step.
+
+        :param token: The token
+        :param exp: Expiry time of the token, None to keep it revoked forever
+        :return: True if the token was already revoked
+        """
+        digest = token_digest(token)
+        with self._lock:
+            if digest in self._revoked:
+                return True
+            self._add(digest, exp)
+            return False
+
+    def __contains__(self, token: str) -> bool:
+        digest = token_digest(token)
+        if self._bloom is not None and digest not in self._bloom:
+            return False
+        return digest in self._revoked
+
+    def remove_expired(self, when: Optional[float] = None) -> int:
+        """
+        Forget the revoked tokens that expired.
+
+        :param when: Timestamp to compare the expiry times with, defaults to now
+        :return: Number of tokens removed
+        """
+        if when is None:
+            when = time.time()
+        with self._lock:
+            revoked = {
+                digest: exp
+                for digest, exp in self._revoked.items()
+                if exp is None or exp >= when
+            }
+            removed = len(self._revoked) - len(revoked)
+            if removed:
+                self._replace(revoked)
+        return removed
+
+    def update(self, other: "RevocationList") -> None:
+        """Add the tokens revoked in another list."""
+        with self._lock:
+            for digest, exp in list(other._revoked.items()):
+                self._add(digest, exp)
+
+    def to_json(self) -> str:
+        with self._lock:
+            revoked = {digest.hex(): exp for digest, exp in self._revoked.items()}
+        return json.dumps(revoked, separators=(",", ":"))
+
+    def from_json(self, txt: str) -> "RevocationList":
+        """Replace the revoked tokens with those in the JSON document."""
+        revoked = {
+            bytes.fromhex(digest): exp for digest, exp in json.loads(txt).items()
+        }
+        with self._lock:
+            self._replace(revoked)
+        return self
+
+    def save(self, path: str) -> None:
+        """Write the list to a file, replacing the file atomically."""
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, "w") as fp:
+                fp.write(self.to_json())
+            os.replace(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def load(self, path: str) -> "RevocationList":
+        """Replace the revoked tokens with those in a file written by :meth:`save`."""
+        with open(path) as fp:
+            return self.from_json(fp.read())
@@ -1,33 +1,64 @@
 import base64
 import copy
 import hashlib
+import heapq
 import json
 import logging
+import os
+import struct
+import threading
 import uuid
 import warnings
 from binascii import Error
+from collections import namedtuple
+from contextlib import contextmanager
 from typing import Any
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet
 from cryptography.fernet import InvalidToken
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 from oic import rndstr
 from oic.exception import ImproperlyConfigured
 from oic.oauth2.message import AuthorizationRequest
 from oic.utils import tobytes
+from oic.utils.cache import LRUCache
 from oic.utils.session_backend import AuthnEvent
 from oic.utils.session_backend import DictSessionBackend
 from oic.utils.session_backend import SessionBackend
+from oic.utils.session_backend import SessionRecord
+from oic.utils.session_backend import session_authn_event
 from oic.utils.time_util import utc_time_sans_frac
+from oic.utils.token_family import RefreshTokenFamilies
 
 __author__ = "rohe0002"
 
 logger = logging.getLogger(__name__)
 
 
+class ParsedToken(namedtuple("ParsedToken", ["type", "sid", "iat", "expires_at"])):
+    """A decoded token, the issue and expiry times are None if not known."""
+
+    __slots__ = ()
+
+    def is_expired(self, when=None):
+        """Return if the token has expired, tokens without an expiry time never do."""
+        if self.expires_at is None:
+            return False
+        if when is None:
+            when = utc_time_sans_frac()
+        return when > self.expires_at
+
+
+# Decoded DefaultTokens shared by all the factories, keyed on the encryption key and token
+PARSED_TOKENS = LRUCache(maxsize=4096, ttl=None)
+
+
 def lv_pack(*args):
     s = []
     for a in args:
@@ -61,6 +92,21 @@ class UnknownToken(Exception):
     pass
 
 
+class SessionConflict(Exception):
+    """A session was stored by someone else after it was read."""
+
+    def __init__(self, sid, session=None):
+        """
+        Initialize the exception.
+
+        :param sid: The session id
+        :param session: The session information that could not be written
+        """
+        super().__init__(sid)
+        self.sid = sid
+        self.session = session
+
+
 def pairwise_id(sub, sector_identifier, seed):
     return hashlib.sha256(
         ("%s%s%s" % (sub, sector_identifier, seed)).encode("utf-8")
@@ -85,6 +131,42 @@ class Crypt(object):
         return self.core.decrypt(ciphertext)
 
 
+class AEADCrypt(object):
+    """
+    AES-GCM encryption of short binary payloads.
+
+    The ciphertext is a version byte, a 12 byte nonce and the encrypted payload
+    followed by the 16 byte tag. The version byte is authenticated too.
+    """
+
+    VERSION = b"\x01"
+
+    def __init__(self, password):
+        # Not the Fernet key, the same password is used by both
+        self.key = hashlib.sha256(
+            b"pyoidc-aead-token:" + password.encode("utf-8")
+        ).digest()
+        self.core = AESGCM(self.key)
+
+    def encrypt(self, data, associated_data=b""):
+        nonce = os.urandom(12)
+        return (
+            self.VERSION
+            + nonce
+            + self.core.encrypt(nonce, data, self.VERSION + associated_data)
+        )
+
+    def decrypt(self, ciphertext, associated_data=b""):
+        if ciphertext[:1] != self.VERSION or len(ciphertext) < 29:
+            raise InvalidToken()
+        try:
+            return self.core.decrypt(
+                ciphertext[1:13], ciphertext[13:], self.VERSION + associated_data
+            )
+        except InvalidTag:
+            raise InvalidToken()
+
+
 class Token(object):
     def __init__(self, typ, lifetime=0, token_storage=None, **kwargs):
         self.type = typ
@@ -146,6 +228,34 @@ class Token(object):
         """
         raise NotImplementedError()
 
+    def parse(self, token):
+        """
+        Return everything known about the token.
+
+        Factories that can decode the token once should override this.
+
+        :param token: A token
+        :return: A ParsedToken
+        """
+        typ, sid = self.type_and_key(token)
+        try:
+            expires_at = self.expires_at(token)
+        except NotImplementedError:
+            expires_at = None
+        return ParsedToken(typ, sid, None, expires_at)
+
+    def peek_type(self, token):
+        """
+        Return the type a token claims to have, without verifying it.
+
+        The claim must be checked when the token is decoded, this is only used to
+        pick the factory decoding the token.
+
+        :param token: A token
+        :return: The claimed type or None if this factory can not tell
+        """
+        return None
+
     def is_expired(self, token, when=None):
         """Return if token is still valid."""
         if when is None:
@@ -170,15 +280,54 @@ class Token(object):
         if typ != self.type:
             raise WrongTokenType()
         if typ == "R":
+            if isinstance(self.token_storage, RefreshTokenFamilies):
+                return self.token_storage.is_active(key, token)
             return not self.token_storage[key].get("revoked", False)
         else:
             return True
 
 
 class DefaultToken(Token):
-    def __init__(self, secret, password, typ="", **kwargs):
+    """
+    Factory of encrypted tokens.
+
+    Two formats are supported: "fernet", the default, and "aead", a compact binary
+    layout encrypted with AES-GCM which gives shorter tokens that are cheaper to
+    issue and decode. With `migrate` set tokens are still issued in the configured
+    format, but tokens in the other format are accepted too. This allows switching
+    formats without invalidating the tokens already issued.
+    """
+
+    CODECS = ("fernet", "aead")
+
+    def __init__(
+        self,
+        secret,
+        password,
+        typ="",
+        parsed_tokens=None,
+        codec="fernet",
+        migrate=False,
+        **kwargs,
+    ):
+        """
+        Initialize the factory.
+
+        :param secret: Not used
+        :param password: Password from which the encryption key is derived
+        :param typ: Type of the tokens
+        :param parsed_tokens: LRUCache of decoded tokens, defaults to one shared by all factories
+        :param codec: Format of the issued tokens, "fernet" or "aead"
+        :param migrate: Whether tokens in the other format are accepted
+        """
+        if codec not in self.CODECS:
+            raise ValueError("Unknown token codec: {}".format(codec))
         Token.__init__(self, typ, **kwargs)
         self.crypt = Crypt(password)
+        self.aead = AEADCrypt(password)
+        self.codec = codec
+        self.migrate = migrate
+        self.parsed_tokens = PARSED_TOKENS if parsed_tokens is None else parsed_tokens
 
     def __call__(self, sid="", ttype="", **kwargs):
         """
@@ -194,19 +343,34 @@ class DefaultToken(Token):
         else:
             ttype = "A"
 
-        tmp = ""
-        rnd = ""
-        while rnd == tmp:  # Don't use the same random value again
-            rnd = rndstr(32)  # Ultimate length multiple of 16
-
-        issued_at = "{}".format(utc_time_sans_frac())
+        issued_at = utc_time_sans_frac()
+        families = None
         if ttype == "R":
-            # kwargs["sinfo"] is a dictionary and we do not want updates...
-            self.token_storage[sid] = copy.deepcopy(kwargs["sinfo"])
-
-        return base64.b64encode(
-            self.crypt.encrypt(lv_pack(rnd, ttype, sid, issued_at).encode())
-        ).decode("utf-8")
+            if isinstance(self.token_storage, RefreshTokenFamilies):
+                families = self.token_storage
+            else:
+                # kwargs["sinfo"] is a dictionary and we do not want updates...
+                self.token_storage[sid] = copy.deepcopy(kwargs["sinfo"])
+
+        if self.codec == "aead":
+            # The random nonce makes every token unique, the type in front is
+            # authenticated as associated data so it is not repeated inside.
+            data = self.aead.encrypt(
+                struct.pack(">Q", issued_at) + sid.encode("utf-8"),
+                ttype.encode("utf-8"),
+            )
+        else:
+            tmp = ""
+            rnd = ""
+            while rnd == tmp:  # Don't use the same random value again
+                rnd = rndstr(32)  # Ultimate length multiple of 16
+            data = self.crypt.encrypt(lv_pack(rnd, ttype, sid, str(issued_at)).encode())
+
+        # The type is repeated in clear in front, base64 does not use "_"
+        token = "{}_{}".format(ttype, base64.b64encode(data).decode("utf-8"))
+        if families is not None:
+            families.issue(sid, token, kwargs["sinfo"])
+        return token
 
     def key(self, user="", areq=None):
         """
@@ -225,13 +389,56 @@ class DefaultToken(Token):
         Decode the token.
 
         :param token: A token
-        :return: Tuple of sid, type, iat, salt
+        :return: Tuple of type, sid, iat, salt
         """
-        plain = self.crypt.decrypt(base64.b64decode(token)).decode()
+        # Tokens issued by older versions have no type in front
+        claimed, _, token = token.rpartition("_")
+        data = base64.b64decode(token)
+        # A Fernet token is base64 text, it never starts with the version byte
+        codec = "aead" if data[:1] == AEADCrypt.VERSION else "fernet"
+        if codec != self.codec and not self.migrate:
+            raise InvalidToken()
+        if codec == "aead":
+            plain = self.aead.decrypt(data, claimed.encode("utf-8"))
+            if len(plain) < 8:
+                raise InvalidToken()
+            (iat,) = struct.unpack(">Q", plain[:8])
+            return claimed, plain[8:].decode("utf-8"), iat, ""
+
+        plain = self.crypt.decrypt(data).decode()
         # order: rnd, type, sid, iat
         p = lv_unpack(plain)
+        if claimed and claimed != p[1]:
+            raise InvalidToken()
         return p[1], p[2], int(p[3]), p[0]
 
+    def peek_type(self, token):
+        """
+        Return the type a token claims to have, without decrypting it.
+
+        :param token: A token
+        :return: The claimed type or None if not a DefaultToken with the type in front
+        """
+        if "." in token or token.count("_") != 1:
+            return None
+        return token.split("_")[0]
+
+    def parse(self, token):
+        """
+        Decode the token, a token is only decrypted the first time it is seen.
+
+        :param token: A token
+        :return: A ParsedToken
+        """
+        cache_key = (self.crypt.key, self.codec, self.migrate, token)
+        decoded = self.parsed_tokens.get(cache_key)
+        if decoded is None:
+            typ, sid, iat, _ = self._split_token(token)
+            decoded = (typ, sid, iat)
+            self.parsed_tokens.set(cache_key, decoded)
+        typ, sid, iat = decoded
+        return ParsedToken(typ, sid, iat, iat + self.lifetime)
+
     def type_and_key(self, token):
         """
         Return type of Token (A=Access code, T=Token, R=Refresh token) and the session id.
@@ -239,8 +446,8 @@ class DefaultToken(Token):
         :param token: A token
         :return: tuple of token type and session id
         """
-        a, b, _, _ = self._split_token(token)
-        return a, b
+        parsed = self.parse(token)
+        return parsed.type, parsed.sid
 
     def get_key(self, token):
         """
@@ -249,7 +456,7 @@ class DefaultToken(Token):
         :param token: A token
         :return: The session id
         """
-        return self._split_token(token)[1]
+        return self.parse(token).sid
 
     def get_type(self, token):
         """
@@ -258,7 +465,7 @@ class DefaultToken(Token):
         :param token: A token
         :return: Type of Token (A=Access code, T=Token, R=Refresh token)
         """
-        return self._split_token(token)[0]
+        return self.parse(token).type
 
     def expires_at(self, token):
         """
@@ -267,7 +474,7 @@ class DefaultToken(Token):
         :param token: A token
         :return: expiry timestamp
         """
-        return self._split_token(token)[2] + self.lifetime
+        return self.parse(token).expires_at
 
 
 class RefreshDB(object):
@@ -380,6 +587,9 @@ def create_session_db(
     token_expires_in=3600,
     grant_expires_in=600,
     refresh_token_expires_in=86400,
+    token_codec="fernet",
+    migrate_tokens=False,
+    refresh_token_storage=None,
 ):
     """
     Construct SessionDB instance.
@@ -394,14 +604,28 @@ def create_session_db(
     :param token_expires_in: Expiry time for access tokens in seconds.
     :param grant_expires_in: Expiry time for access codes in seconds.
     :param refresh_token_expires_in: Expiry time for refresh tokens.
+    :param token_codec: Format of the issued tokens, "fernet" or "aead".
+    :param migrate_tokens: Whether tokens in the other format are accepted.
+    :param refresh_token_storage: Storage of the refresh tokens, for instance a
+        `RefreshTokenFamilies`, defaults to a dict.
 
     :return: A constructed `SessionDB` object.
     """
-    code_factory = DefaultToken(secret, password, typ="A", lifetime=grant_expires_in)
-    token_factory = DefaultToken(secret, password, typ="T", lifetime=token_expires_in)
+    kwargs = {"codec": token_codec, "migrate": migrate_tokens}
+    code_factory = DefaultToken(
+        secret, password, typ="A", lifetime=grant_expires_in, **kwargs
+    )
+    token_factory = DefaultToken(
+        secret, password, typ="T", lifetime=token_expires_in, **kwargs
+    )
     db = DictSessionBackend() if db is None else db
     refresh_token_factory = DefaultToken(
-        secret, password, typ="R", lifetime=refresh_token_expires_in, token_storage={}
+        secret,
+        password,
+        typ="R",
+        lifetime=refresh_token_expires_in,
+        token_storage={} if refresh_token_storage is None else refresh_token_storage,
+        **kwargs,
     )
 
     return SessionDB(
@@ -414,6 +638,128 @@ def create_session_db(
     )
 
 
+class UnitOfWork(SessionBackend):
+    """
+    Changes to the sessions collected while a request is handled.
+
+    Sessions are read from the backend once, all changes are kept here until
+    :meth:`flush` writes every changed session in a single backend write. The write
+    only succeeds if the session was not stored by someone else since it was read,
+    otherwise SessionConflict is raised.
+
+    Lookups by attribute are answered by the backend and do not see the changes that
+    have not been flushed yet.
+    """
+
+    def __init__(self, backend):
+        """
+        Initialize the unit of work.
+
+        :param backend: The SessionBackend the sessions are stored in
+        """
+        self.backend = backend
+        self._sessions: Dict[str, Any] = {}
+        self._versions: Dict[str, Any] = {}
+        self._dirty: Dict[str, None] = {}
+        self._deleted: Dict[str, None] = {}
+
+    def _load(self, key):
+        if isinstance(self.backend, SessionBackend):
+            value, version = self.backend.get_versioned(key)
+        else:
+            value, version = self.backend[key], _UNVERSIONED
+        self._sessions[key] = value
+        self._versions[key] = version
+        return value
+
+    def __getitem__(self, key):
+        try:
+            return self._sessions[key]
+        except KeyError:
+            if key in self._deleted:
+                raise
+        return self._load(key)
+
+    def __setitem__(self, key, value):
+        # A session stored without being read first is overwritten when flushed
+        self._versions.setdefault(key, _UNVERSIONED)
+        self._sessions[key] = value
+        self._dirty[key] = None
+        self._deleted.pop(key, None)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        del self._sessions[key]
+        self._dirty.pop(key, None)
+        self._deleted[key] = None
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def delete_many(self, keys):
+        for key in keys:
+            self._sessions.pop(key, None)
+            self._dirty.pop(key, None)
+            self._deleted[key] = None
+
+    def get_by_uid(self, uid):
+        return self.backend.get_by_uid(uid)
+
+    def get_by_sub(self, sub):
+        return self.backend.get_by_sub(sub)
+
+    def get(self, attr, val):
+        return self.backend.get(attr, val)
+
+    def get_uid_by_sid(self, sid):
+        return self.backend.get_uid_by_sid(sid)
+
+    def get_uid_by_sub(self, sub):
+        return self.backend.get_uid_by_sub(sub)
+
+    def discard(self):
+        """Forget the changes and the sessions read."""
+        self._sessions.clear()
+        self._versions.clear()
+        self._dirty.clear()
+        self._deleted.clear()
+
+    def flush(self):
+        """
+        Write the changed sessions to the backend.
+
+        Every session is written on its own, a conflict leaves the sessions written
+        before it in place.
+
+        :raises: SessionConflict if a session was stored by someone else since it was read
+        """
+        try:
+            for key in self._dirty:
+                version = self._versions[key]
+                if version is _UNVERSIONED:
+                    self.backend[key] = self._sessions[key]
+                elif not self.backend.set_versioned(key, self._sessions[key], version):
+                    raise SessionConflict(key, self._sessions[key])
+            if self._deleted:
+                if isinstance(self.backend, SessionBackend):
+                    self.backend.delete_many(list(self._deleted))
+                else:
+                    for key in self._deleted:
+                        self.backend.pop(key, None)
+        finally:
+            # The versions of the written sessions are not known, they are read again
+            self.discard()
+
+
+# Version of the sessions that are overwritten without a check
+_UNVERSIONED = object()
+
+
 class SessionDB(object):
     def __init__(
         self,
@@ -443,7 +789,13 @@ class SessionDB(object):
                 "Please use `SessionBackend` to ensure proper API for the database.",
                 DeprecationWarning,
             )
+        # The units of work of the threads in a transaction
+        self._units: Dict[int, UnitOfWork] = {}
         self._db = db
+        # Heap of the times after which the sessions may have expired, see gc_step
+        self._expiry: List[Tuple[int, str]] = []
+        self._deadlines: Dict[str, int] = {}
+        self._expiry_lock = threading.Lock()
 
         self.sm_salt = sm_salt or rndstr(32)
 
@@ -477,48 +829,104 @@ class SessionDB(object):
         self.access_token = self.token_factory["access_token"]
         self.token = self.access_token
 
-    def _get_token_key(self, item, order=None):
-        if order is None:
-            order = self.token_factory_order
+    @property
+    def _db(self):
+        """The session backend, or the unit of work of the transaction of this thread."""
+        if self._units:
+            return self._units.get(threading.get_ident(), self._backend)
+        return self._backend
 
-        for key in order:
-            try:
-                return self.token_factory[key].get_key(item)
-            except Exception:  # nosec
-                # FIXME: Catch specific exception
-                pass
+    @_db.setter
+    def _db(self, db):
+        self._backend = db
 
-        logger.info("Unknown token format")
-        raise KeyError(item)
+    @contextmanager
+    def transaction(self):
+        """
+        Collect the session changes made by this thread and write them once at the end.
 
-    def _get_token_type_and_key(self, item, order=None):
-        if order is None:
-            order = self.token_factory_order
+        Inside the block every session is read from the backend once and all changes
+        to it are written in one backend write when the block is left. Nothing is
+        written if the block raises. A transaction started inside another one is
+        part of the outer transaction.
 
-        for key in order:
-            try:
-                return self.token_factory[key].type_and_key(item)
-            except Exception:  # nosec
-                # FIXME: Catch specific exception.
-                pass
+        :raises: SessionConflict if a changed session was stored by someone else
+            since it was read, the request may be retried
+        """
+        ident = threading.get_ident()
+        if ident in self._units:
+            yield self._units[ident]
+            return
+        unit = UnitOfWork(self._backend)
+        self._units[ident] = unit
+        try:
+            yield unit
+        except BaseException:
+            unit.discard()
+            raise
+        else:
+            unit.flush()
+        finally:
+            del self._units[ident]
 
-        logger.info("Unknown token format")
-        raise KeyError(item)
+    def parse_token(self, item, order=None):
+        """
+        Decode a token using the first factory that can.
 
-    def _get_token_type(self, item, order=None):
+        :param item: A token
+        :param order: Names of the factories to try
+        :return: A ParsedToken, expiring as set by the factory for that type of token
+        :raises: KeyError if none of the factories can decode the token
+        """
         if order is None:
             order = self.token_factory_order
 
-        for key in order:
+        factories = [self.token_factory[key] for key in order]
+        for factory in factories:
+            claimed = factory.peek_type(item) if factory is not None else None
+            if claimed is not None:
+                # Only the factory for that type can have issued the token
+                for _factory in factories:
+                    if getattr(_factory, "type", None) == claimed:
+                        try:
+                            return _factory.parse(item)
+                        except Exception:  # nosec
+                            # FIXME: Catch specific exception
+                            logger.info("Invalid token")
+                            raise KeyError(item)
+                break
+
+        for factory in factories:
             try:
-                return self.token_factory[key].get_type(item)
+                parsed = factory.parse(item)
             except Exception:  # nosec
                 # FIXME: Catch specific exception
-                pass
+                continue
 
-        logger.info("Unknown token format or invalid token")
+            if parsed.type != factory.type:
+                # Factories sharing a key decode each others tokens
+                for _factory in factories:
+                    if getattr(_factory, "type", None) == parsed.type:
+                        try:
+                            parsed = _factory.parse(item)
+                        except Exception:  # nosec
+                            pass
+                        break
+            return parsed
+
+        logger.info("Unknown token format")
         raise KeyError(item)
 
+    def _get_token_key(self, item, order=None):
+        return self.parse_token(item, order).sid
+
+    def _get_token_type_and_key(self, item, order=None):
+        parsed = self.parse_token(item, order)
+        return parsed.type, parsed.sid
+
+    def _get_token_type(self, item, order=None):
+        return self.parse_token(item, order).type
+
     def __getitem__(self, item):
         """
         Return Session item.
@@ -547,6 +955,18 @@ class SessionDB(object):
         """
         del self._db[sid]
 
+    def delete_many(self, sids):
+        """
+        Delete several sessions at once.
+
+        :param sids: session identifiers
+        """
+        if isinstance(self._db, SessionBackend):
+            self._db.delete_many(sids)
+        else:
+            for sid in sids:
+                del self._db[sid]
+
     def update(self, key, attribute, value):
         if key in self._db:
             pass
@@ -604,16 +1024,16 @@ class SessionDB(object):
         sid = self.token_factory["code"].key(user=aevent.uid, areq=areq)
         access_grant = self.token_factory["code"](sid=sid)
 
-        _dic = {
-            "oauth_state": "authz",
-            "code": access_grant,
-            "code_used": False,
-            "authzreq": areq.to_json(),
-            "client_id": areq["client_id"],
-            "response_type": areq["response_type"],
-            "revoked": False,
-            "authn_event": aevent.to_json(),
-        }
+        _dic = SessionRecord(
+            oauth_state="authz",
+            code=access_grant,
+            code_used=False,
+            authzreq=areq.to_json(),
+            client_id=areq["client_id"],
+            response_type=areq["response_type"],
+            revoked=False,
+            authn_event=aevent.to_json(),
+        )
 
         _dic.update(kwargs)
 
@@ -636,16 +1056,13 @@ class SessionDB(object):
             _dic["oidreq"] = oidreq.to_json()
 
         self._db[sid] = _dic
+        self._track_expiry(sid, aevent.valid_until, self.token_factory["code"])
 
         return sid
 
-    def get_authentication_event(self, sid):
+    def get_authentication_event(self, sid) -> AuthnEvent:
         """Return AuthnEvent based on sid."""
-        # This is a compatibility shim for older sessions
-        if isinstance(self._db[sid]["authn_event"], dict):
-            return AuthnEvent(**self._db[sid]["authn_event"])
-        else:
-            return AuthnEvent.from_json(self._db[sid]["authn_event"])
+        return session_authn_event(self._db[sid])
 
     def get_token(self, sid):
         if self._db[sid]["oauth_state"] == "authz":
@@ -700,7 +1117,7 @@ class SessionDB(object):
 
         if issue_refresh:
             if "authn_event" in dic:
-                authn_event = AuthnEvent.from_json(dic["authn_event"])
+                authn_event = session_authn_event(dic)
             else:
                 authn_event = None
             if authn_event:
@@ -721,7 +1138,9 @@ class SessionDB(object):
             elif self.token_factory["refresh_token"] is not None:
                 refresh_token = self.token_factory["refresh_token"](key, sinfo=dic)
                 dic["refresh_token"] = refresh_token
+                self._track_expiry(key, 0, self.token_factory["refresh_token"])
         self._db[key] = dic
+        self._track_expiry(key, 0, self.access_token)
         return dic
 
     def refresh_token(self, rtoken, client_id):
@@ -765,14 +1184,16 @@ class SessionDB(object):
         elif self.token_factory["refresh_token"] is None:
             raise WrongTokenType()
         elif self.token_factory["refresh_token"].valid(rtoken):
-            if self.token_factory["refresh_token"].is_expired(rtoken):
+            factory = self.token_factory["refresh_token"]
+            parsed = factory.parse(rtoken)
+            if parsed.is_expired():
                 raise ExpiredToken()
-            sid = self.token_factory["refresh_token"].get_key(rtoken)
+            sid = parsed.sid
             try:
                 dic = self._db[sid]
             except KeyError:
                 # Session is cleared, use the storage in token factory
-                dic = self.token_factory["refresh_token"].token_storage[sid]
+                dic = factory.token_storage[sid].copy()
             access_token = self.access_token(sid=sid, sinfo=dic)
 
             try:
@@ -784,6 +1205,10 @@ class SessionDB(object):
                     self.access_token.invalidate(at)
 
             dic["access_token"] = access_token
+            if getattr(factory.token_storage, "rotate", False):
+                # The presented token can not be used again
+                rtoken = factory(sid, sinfo=dic)
+                self._track_expiry(sid, 0, factory)
         else:
             raise ExpiredToken()
 
@@ -792,6 +1217,7 @@ class SessionDB(object):
         dic["refresh_token"] = rtoken
         dic["revoked"] = False
         self._db[sid] = dic
+        self._track_expiry(sid, 0, self.access_token)
         return dic
 
     def is_valid(self, token, client_id=None):
@@ -903,8 +1329,7 @@ class SessionDB(object):
     def set_verify_logout(self, uid: str) -> None:
         """Save the key that is used for logout verification."""
         for sid in self._db.get_by_uid(uid):
-            _dict = self._db[sid]
-            _dict["verified_logout"] = uuid.uuid4().urn
+            self.update(sid, "verified_logout", uuid.uuid4().urn)
 
     def is_revoke_uid(self, uid: str) -> bool:
         """Return if the uid session has been revoked."""
@@ -917,7 +1342,7 @@ class SessionDB(object):
 
     def duplicate(self, sinfo):
         _dic = copy.copy(sinfo)
-        areq = AuthorizationRequest().from_json(_dic["authzreq"])
+        areq = AuthorizationRequest().from_json(_dic["authzreq"], lazy=True)
         sid = self.token_factory["code"].key(user=_dic["sub"], areq=areq)
 
         _dic["code"] = self.token_factory["code"](sid=sid, sinfo=sinfo)
@@ -942,9 +1367,108 @@ class SessionDB(object):
 
         self._db[sid] = _dic
         self._db.update(sid, "sub", _dic["sub"])
+        self._track_expiry(sid, 0, self.token_factory["code"])
 
         return sid
 
+    def _track_expiry(self, sid, deadline, factory=None):
+        """
+        Record that a session lives at least until `deadline`.
+
+        :param sid: Session id
+        :param deadline: Timestamp until which the session is kept
+        :param factory: Factory of a token just issued, the session is kept until the token expires
+        """
+        lifetime = getattr(factory, "lifetime", 0)
+        if lifetime:
+            deadline = max(deadline, utc_time_sans_frac() + lifetime)
+        with self._expiry_lock:
+            if deadline > self._deadlines.get(sid, 0):
+                self._deadlines[sid] = deadline
+                heapq.heappush(self._expiry, (deadline, sid))
+
+    def _session_deadline(self, sinfo):
+        """
+        Return when the session can be removed.
+
+        That is once all its tokens expired and the authentication is no longer valid.
+
+        :param sinfo: The session information
+        :return: A timestamp, None if the session must be kept
+        """
+        try:
+            deadlines = [session_authn_event(sinfo).valid_until]
+        except (KeyError, TypeError, ValueError):
+            deadlines = []
+        for key in self.token_factory_order:
+            token = sinfo.get(key)
+            if not token or (key == "code" and sinfo.get("code_used")):
+                continue
+            try:
+                parsed = self.parse_token(token, [key])
+            except KeyError:
+                continue
+            if parsed.expires_at is None:
+                return None
+            deadlines.append(parsed.expires_at)
+        if self._refresh_db and sinfo.get("refresh_token"):
+            # Refresh tokens in a RefreshDB do not expire
+            return None
+        return max(deadlines, default=0)
+
+    def gc_step(self, budget=100, when=None):
+        """
+        Remove some of the sessions that expired, with their refresh token storage.
+
+        Only the sessions issued or refreshed through this instance are known. At most
+        `budget` of them are looked at, so this can be called often, from a request hook
+        or a background thread, without pausing for long. The expiry time of a session
+        is checked against its tokens before it is removed.
+
+        :param budget: Maximum number of sessions to look at
+        :param when: Timestamp to compare the expiry times with, defaults to now
+        :return: Number of removed sessions
+        """
+        if when is None:
+            when = utc_time_sans_frac()
+        removed = 0
+        for _ in range(budget):
+            with self._expiry_lock:
+                if not self._expiry or self._expiry[0][0] >= when:
+                    break
+                deadline, sid = heapq.heappop(self._expiry)
+                if self._deadlines.get(sid) != deadline:
+                    # Superseded by a later deadline
+                    continue
+                del self._deadlines[sid]
+            if self._collect(sid, when):
+                removed += 1
+        return removed
+
+    def _collect(self, sid, when):
+        try:
+            sinfo = self._db[sid]
+        except KeyError:
+            sinfo = None
+        else:
+            deadline = self._session_deadline(sinfo)
+            if deadline is None:
+                return False
+            if deadline >= when:
+                # Extended elsewhere, for instance by another worker
+                self._track_expiry(sid, deadline)
+                return False
+            try:
+                del self._db[sid]
+            except KeyError:
+                sinfo = None
+
+        factory = self.token_factory.get("refresh_token")
+        storage = getattr(factory, "token_storage", None)
+        if storage is not None:
+            storage.pop(sid, None)
+        return sinfo is not None
+
     def read(self, token):
         (typ, key) = self._get_token_type_and_key(token)
 
@@ -1,14 +1,28 @@
+import bisect
+import copy
+import hashlib
+import itertools
 import json
+import sqlite3
+import struct
+import threading
 import time
 from abc import ABCMeta
 from abc import abstractmethod
+from collections.abc import MutableMapping
 from typing import Any
 from typing import Dict
+from typing import Hashable
+from typing import Iterable
 from typing import List
+from typing import Mapping
 from typing import Optional
+from typing import Sequence
+from typing import Tuple
 from typing import Union
 from typing import cast
 
+from oic.utils.cache import LRUCache
 from oic.utils.time_util import time_sans_frac
 
 
@@ -55,6 +69,254 @@ class AuthnEvent(object):
         return cls(**dic)
 
 
+def _decode_authn_event(authn_event: Any) -> AuthnEvent:
+    # Older sessions store the AuthnEvent as a dict
+    if isinstance(authn_event, dict):
+        return AuthnEvent(**authn_event)
+    return AuthnEvent.from_json(authn_event)
+
+
+# Known session attributes, stored in slots. Only ever append to this, the
+# position of an attribute is its tag in the binary serialization.
+SESSION_FIELDS = (
+    "oauth_state",
+    "code",
+    "code_used",
+    "authzreq",
+    "client_id",
+    "response_type",
+    "revoked",
+    "authn_event",
+    "nonce",
+    "redirect_uri",
+    "state",
+    "scope",
+    "si_redirects",
+    "id_token",
+    "oidreq",
+    "sub",
+    "access_token",
+    "access_token_scope",
+    "token_type",
+    "refresh_token",
+    "verified_logout",
+    "permission",
+)
+_FIELD_TAGS = {name: tag for tag, name in enumerate(SESSION_FIELDS)}
+_EXTRA_TAG = 0xFF
+_MISSING = object()
+
+# Types of the values in the binary serialization
+_NONE, _FALSE, _TRUE, _STR, _INT, _JSON = range(6)
+_INT64 = struct.Struct(">q")
+_CONSTANTS = (None, False, True)
+
+
+def _pack_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _unpack_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _pack_text(text: str, out: bytearray) -> None:
+    raw = text.encode("utf-8")
+    _pack_varint(len(raw), out)
+    out += raw
+
+
+def _unpack_text(data: bytes, pos: int) -> Tuple[str, int]:
+    length, pos = _unpack_varint(data, pos)
+    return data[pos : pos + length].decode("utf-8"), pos + length
+
+
+class SessionRecord(MutableMapping):
+    """
+    Session information with the known attributes kept in slots.
+
+    It is used like the dict sessions used to be, other attributes are kept in a
+    dict of their own. The JSON encoded authn_event and authzreq are decoded on
+    first use and the result is kept until the attribute is replaced, see
+    `session_authn_event` and `session_authzreq`.
+
+    `to_bytes` gives a compact binary serialization for backends: the known
+    attributes are tagged with a single byte and strings are stored as they are.
+    """
+
+    __slots__ = SESSION_FIELDS + ("_extra", "_authn", "_authzreq")
+
+    def __init__(self, *args, **kwargs):
+        # The slots of missing attributes are left empty
+        self._extra: Optional[Dict[str, Any]] = None
+        self._authn: Optional[Tuple[Any, AuthnEvent]] = None
+        self._authzreq: Optional[Tuple[Any, Dict[str, Any]]] = None
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _FIELD_TAGS:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _FIELD_TAGS:
+            setattr(self, key, value)
+        elif self._extra is None:
+            self._extra = {key: value}
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in _FIELD_TAGS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        if key in _FIELD_TAGS:
+            return hasattr(self, cast(str, key))
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for name in SESSION_FIELDS:
+            if hasattr(self, name):
+                yield name
+        if self._extra is not None:
+            yield from list(self._extra)
+
+    def __len__(self) -> int:
+        count = sum(hasattr(self, name) for name in SESSION_FIELDS)
+        return count + (len(self._extra) if self._extra is not None else 0)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def copy(self) -> "SessionRecord":
+        """Return a shallow copy, sharing what has been decoded so far."""
+        other = self.__class__(self)
+        other._authn = self._authn
+        other._authzreq = self._authzreq
+        return other
+
+    def get_authn_event(self) -> AuthnEvent:
+        """Return the decoded authn_event, it must not be modified."""
+        raw = self["authn_event"]
+        if self._authn is None or self._authn[0] is not raw:
+            self._authn = (raw, _decode_authn_event(raw))
+        return self._authn[1]
+
+    def get_authzreq(self) -> Dict[str, Any]:
+        """Return the decoded authorization request, it must not be modified."""
+        raw = self["authzreq"]
+        if self._authzreq is None or self._authzreq[0] is not raw:
+            self._authzreq = (raw, json.loads(raw))
+        return self._authzreq[1]
+
+    def to_bytes(self) -> bytes:
+        """Serialize the session information."""
+        out = bytearray(b"\x01")
+        for key, value in self.items():
+            tag = _FIELD_TAGS.get(key)
+            if tag is None:
+                out.append(_EXTRA_TAG)
+                _pack_text(key, out)
+            else:
+                out.append(tag)
+            if value is None:
+                out.append(_NONE)
+            elif value is True:
+                out.append(_TRUE)
+            elif value is False:
+                out.append(_FALSE)
+            elif isinstance(value, str):
+                out.append(_STR)
+                _pack_text(value, out)
+            elif isinstance(value, int) and -(2 ** 63) <= value < 2 ** 63:
+                out.append(_INT)
+                out += _INT64.pack(value)
+            else:
+                out.append(_JSON)
+                _pack_text(json.dumps(value), out)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SessionRecord":
+        """Deserialize session information serialized by `to_bytes`."""
+        if data[:1] != b"\x01":
+            raise ValueError("Unknown session serialization")
+        record = cls()
+        extra = None
+        pos = 1
+        end = len(data)
+        while pos < end:
+            tag = data[pos]
+            pos += 1
+            if tag == _EXTRA_TAG:
+                key, pos = _unpack_text(data, pos)
+            kind = data[pos]
+            pos += 1
+            value: Any
+            if kind == _STR or kind == _JSON:
+                length = data[pos]
+                if length < 0x80:
+                    pos += 1
+                else:
+                    length, pos = _unpack_varint(data, pos)
+                value = data[pos : pos + length].decode("utf-8")
+                pos += length
+                if kind == _JSON:
+                    value = json.loads(value)
+            elif kind == _INT:
+                (value,) = _INT64.unpack_from(data, pos)
+                pos += 8
+            else:
+                value = _CONSTANTS[kind]
+            if tag == _EXTRA_TAG:
+                if extra is None:
+                    extra = record._extra = {}
+                extra[key] = value
+            else:
+                setattr(record, SESSION_FIELDS[tag], value)
+        return record
+
+
+def session_authn_event(session: Mapping[str, Any]) -> AuthnEvent:
+    """Return the AuthnEvent of a session, a SessionRecord decodes it only once."""
+    if isinstance(session, SessionRecord):
+        return session.get_authn_event()
+    return _decode_authn_event(session["authn_event"])
+
+
+def session_authzreq(session: Mapping[str, Any]) -> Dict[str, Any]:
+    """Return the decoded authorization request of a session, it must not be modified."""
+    if isinstance(session, SessionRecord):
+        return session.get_authzreq()
+    return json.loads(session["authzreq"])
+
+
 class SessionBackend(metaclass=ABCMeta):
     """Backend for storing sessionDB data."""
 
@@ -132,12 +394,48 @@ class SessionBackend(metaclass=ABCMeta):
     def get_uid_by_sub(self, sub: str) -> Optional[str]:
         """Return User id based on sub."""
         for sid in self.get_by_sub(sub):
-            return AuthnEvent.from_json(self[sid]["authn_event"]).uid
+            return session_authn_event(self[sid]).uid
         return None
 
+    def delete_many(self, keys: Iterable[str]) -> None:
+        """Remove several stored sessions from storage."""
+        for key in keys:
+            del self[key]
+
     def get_uid_by_sid(self, sid: str) -> str:
         """Return User id based on session ID."""
-        return AuthnEvent.from_json(self[sid]["authn_event"]).uid
+        return session_authn_event(self[sid]).uid
+
+    def get_versioned(self, key: str) -> Tuple[Dict[str, Union[str, bool]], Any]:
+        """
+        Return a copy of the session information and its version.
+
+        The version changes every time the session is stored. This default uses a
+        copy of the session as the version, backends should use something cheaper.
+
+        @raises KeyError when no key is found.
+        """
+        value = self[key]
+        return copy.deepcopy(value), copy.deepcopy(value)
+
+    def set_versioned(
+        self, key: str, value: Dict[str, Union[str, bool]], version: Any
+    ) -> bool:
+        """
+        Store the session information if the stored session has not changed.
+
+        This default is not atomic, backends shared by several workers should override it.
+
+        :param key: Key to the database
+        :param value: The session information
+        :param version: Version returned by `get_versioned`, None if the session must not exist
+        :return: Whether the session was stored
+        """
+        current = self[key] if key in self else None
+        if current != version:
+            return False
+        self[key] = value
+        return True
 
 
 class DictSessionBackend(SessionBackend):
@@ -147,13 +445,19 @@ class DictSessionBackend(SessionBackend):
     This should really not be used in production.
     """
 
+    # Shared by all instances so that a version is never handed out twice
+    _version_counter = itertools.count(1)
+
     def __init__(self):
         """Create the storage."""
         self.storage: Dict[str, Dict[str, Union[str, bool]]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.RLock()
 
     def __setitem__(self, key: str, value: Dict[str, Union[str, bool]]) -> None:
         """Store the session info in the storage."""
         self.storage[key] = value
+        self._versions[key] = next(self._version_counter)
 
     def __getitem__(self, key: str) -> Dict[str, Union[str, bool]]:
         """Retrieve session information based on session id."""
@@ -162,6 +466,23 @@ class DictSessionBackend(SessionBackend):
     def __delitem__(self, key: str) -> None:
         """Delete the session info."""
         del self.storage[key]
+        self._versions.pop(key, None)
+
+    def get_versioned(self, key: str) -> Tuple[Dict[str, Union[str, bool]], Any]:
+        """Return a shallow copy of the session information and its version."""
+        with self._lock:
+            return self.storage[key].copy(), self._versions.get(key, 0)
+
+    def set_versioned(
+        self, key: str, value: Dict[str, Union[str, bool]], version: Any
+    ) -> bool:
+        """Store the session information if the stored session has not changed."""
+        with self._lock:
+            current = self._versions.get(key, 0) if key in self.storage else None
+            if current != version:
+                return False
+            self[key] = value
+            return True
 
     def __contains__(self, key: str) -> bool:
         return key in self.storage
@@ -177,7 +498,7 @@ class DictSessionBackend(SessionBackend):
         return [
             sid
             for sid, session in self.storage.items()
-            if AuthnEvent.from_json(session["authn_event"]).uid == uid
+            if session_authn_event(session).uid == uid
         ]
 
     def get(self, attr: str, val: str) -> List[str]:
@@ -185,3 +506,599 @@ class DictSessionBackend(SessionBackend):
         return [
             sid for sid, session in self.storage.items() if session.get(attr) == val
         ]
+
+
+def _uid_from_authn_event(authn_event: Any) -> Optional[str]:
+    """Extract the uid from stored authn_event, which can be a JSON string or a dict."""
+    if authn_event is None:
+        return None
+    if isinstance(authn_event, dict):
+        return authn_event.get("uid")
+    return AuthnEvent.from_json(authn_event).uid
+
+
+def _session_uid(session: Mapping[str, Any]) -> Optional[str]:
+    if isinstance(session, SessionRecord) and session.get("authn_event") is not None:
+        return session.get_authn_event().uid
+    return _uid_from_authn_event(session.get("authn_event"))
+
+
+def _is_hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _discard(index: Dict[Any, Dict[str, None]], value: Any, key: str) -> None:
+    sids = index.get(value)
+    if sids is None:
+        return
+    sids.pop(key, None)
+    if not sids:
+        del index[value]
+
+
+class IndexedSessionBackend(DictSessionBackend):
+    """
+    Implementation of `SessionBackend` based on dictionary with secondary indexes.
+
+    Lookups by uid, sub, client_id and any other registered attribute are answered
+    from indexes that are kept up to date on `__setitem__`, `update` and `__delitem__`.
+    The cost of a lookup is proportional to the size of the result, not the number of stored sessions.
+
+    Changes made to a session dictionary in place are only picked up by the indexes
+    once the session is stored again using `__setitem__` or `update`.
+    """
+
+    DEFAULT_INDEXES: Tuple[str, ...] = ("sub", "client_id")
+
+    def __init__(self, indexed_attributes: Iterable[str] = ()):
+        """
+        Create the storage and the indexes.
+
+        :param indexed_attributes: Names of session attributes to index in addition to uid, sub and client_id
+        """
+        super().__init__()
+        self._uid_index: Dict[str, Dict[str, None]] = {}
+        self._attr_index: Dict[str, Dict[Hashable, Dict[str, None]]] = {}
+        # Per session: the raw authn_event, the uid parsed from it and the indexed attribute values
+        self._indexed: Dict[str, Tuple[Any, Optional[str], Dict[str, Hashable]]] = {}
+        for attr in self.DEFAULT_INDEXES + tuple(indexed_attributes):
+            self._attr_index.setdefault(attr, {})
+
+    def register_index(self, attr: str) -> None:
+        """Start indexing sessions on `attr`, indexing the sessions already stored."""
+        with self._lock:
+            if attr in self._attr_index:
+                return
+            self._attr_index[attr] = {}
+            for sid, session in self.storage.items():
+                _, _, values = self._indexed[sid]
+                value = session.get(attr)
+                if value is not None and _is_hashable(value):
+                    values[attr] = value
+                    self._attr_index[attr].setdefault(value, {})[sid] = None
+
+    def _unindex(self, key: str) -> None:
+        try:
+            _, uid, values = self._indexed.pop(key)
+        except KeyError:
+            return
+        if uid is not None:
+            _discard(self._uid_index, uid, key)
+        for attr, value in values.items():
+            _discard(self._attr_index[attr], value, key)
+
+    def _index(self, key: str, value: Dict[str, Any]) -> None:
+        authn_event = value.get("authn_event")
+        previous = self._indexed.get(key)
+        if previous is not None and previous[0] == authn_event:
+            # Avoid re-parsing an unchanged authn_event
+            uid = previous[1]
+        else:
+            uid = _uid_from_authn_event(authn_event)
+        self._unindex(key)
+
+        values = {}
+        for attr, index in self._attr_index.items():
+            attr_value = value.get(attr)
+            if attr_value is not None and _is_hashable(attr_value):
+                values[attr] = attr_value
+                index.setdefault(attr_value, {})[key] = None
+        if uid is not None:
+            self._uid_index.setdefault(uid, {})[key] = None
+        self._indexed[key] = (authn_event, uid, values)
+
+    def __setitem__(self, key: str, value: Dict[str, Union[str, bool]]) -> None:
+        """Store the session info in the storage and update the indexes."""
+        with self._lock:
+            super().__setitem__(key, value)
+            self._index(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        """Delete the session info and remove it from the indexes."""
+        with self._lock:
+            super().__delitem__(key)
+            self._unindex(key)
+
+    def update(self, key: str, attribute: str, value: Any):
+        """
+        Update information stored. If the key is not know a new entry will be constructed.
+
+        :param key: Key to the database
+        :param attribute: Attribute name
+        :param value: Attribute value
+        """
+        with self._lock:
+            super().update(key, attribute, value)
+
+    def get_by_sub(self, sub: str) -> List[str]:
+        """Return session ids based on sub."""
+        return self.get("sub", sub)
+
+    def get_by_uid(self, uid: str) -> List[str]:
+        """Return session ids based on uid."""
+        with self._lock:
+            return list(self._uid_index.get(uid, ()))
+
+    def get(self, attr: str, val: str) -> List[str]:
+        """Return session ids based on attribute name and value."""
+        with self._lock:
+            if attr not in self._attr_index or not _is_hashable(val):
+                return super().get(attr, val)
+            return list(self._attr_index[attr].get(val, ()))
+
+    def get_uid_by_sid(self, sid: str) -> str:
+        """Return User id based on session ID."""
+        with self._lock:
+            if sid not in self.storage:
+                raise KeyError(sid)
+            uid = self._indexed[sid][1]
+        if uid is None:
+            return super().get_uid_by_sid(sid)
+        return uid
+
+    def get_uid_by_sub(self, sub: str) -> Optional[str]:
+        """Return User id based on sub."""
+        for sid in self.get_by_sub(sub):
+            return self.get_uid_by_sid(sid)
+        return None
+
+
+class SQLSessionBackend(SessionBackend):
+    """
+    Implementation of `SessionBackend` storing sessions in a SQL database.
+
+    Each session is stored as a row holding the JSON serialized session information
+    together with indexed columns for sid, uid, sub, client_id and expiry time.
+    Several processes can share the sessions by pointing to the same database.
+
+    By default an sqlite3 database is used, but any DB-API 2.0 connection using the
+    `qmark` parameter style can be passed in instead.
+
+    With `binary` set new sessions are stored using `SessionRecord.to_bytes`, which
+    is smaller and faster to decode. Sessions stored as JSON can still be read.
+    """
+
+    COLUMNS = ("sub", "client_id")
+    # Keep well below the maximum number of host parameters of sqlite
+    CHUNK_SIZE = 500
+
+    def __init__(
+        self,
+        db: Any = ":memory:",
+        table: str = "pyoidc_session",
+        lifetime: Optional[int] = None,
+        binary: bool = False,
+    ):
+        """
+        Create the storage.
+
+        :param db: Path to an sqlite3 database or an open DB-API 2.0 connection
+        :param table: Name of the table used to store the sessions
+        :param lifetime: Number of seconds a session is kept after it was last stored, None to keep it forever
+        :param binary: Whether sessions are stored in the binary serialization instead of JSON
+        """
+        if not table.isidentifier():
+            raise ValueError("Invalid table name: {}".format(table))
+        if isinstance(db, str):
+            db = sqlite3.connect(db, check_same_thread=False)
+        self._conn = db
+        self._lock = threading.RLock()
+        self.table = table
+        self.lifetime = lifetime
+        self.binary = binary
+        self._create_table()
+
+    def _create_table(self) -> None:
+        statements = [
+            "CREATE TABLE IF NOT EXISTS {table} ("
+            "sid VARCHAR(255) PRIMARY KEY, "
+            "uid VARCHAR(255), "
+            "sub VARCHAR(255), "
+            "client_id VARCHAR(255), "
+            "expires_at INTEGER, "
+            "data TEXT NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS {table}_uid ON {table} (uid)",
+            "CREATE INDEX IF NOT EXISTS {table}_sub ON {table} (sub)",
+            "CREATE INDEX IF NOT EXISTS {table}_client_id ON {table} (client_id)",
+            "CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)",
+        ]
+        with self._lock:
+            cursor = self._conn.cursor()
+            for statement in statements:
+                cursor.execute(statement.format(table=self.table))
+            self._conn.commit()
+
+    def _execute(self, query: str, params: Tuple = ()) -> Any:
+        """Run a single query in its own transaction and return the cursor."""
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute(query.format(table=self.table), params)
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+            return cursor
+
+    def _fetch_column(self, column: str, where: str, value: Any) -> List[Any]:
+        cursor = self._execute(
+            "SELECT {} FROM {{table}} WHERE {} = ?".format(column, where),  # nosec
+            (value,),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def _row(self, key: str, value: Dict[str, Union[str, bool]]) -> Tuple:
+        expires_at = None
+        if self.lifetime is not None:
+            expires_at = time_sans_frac() + self.lifetime
+        return (
+            key,
+            _session_uid(value),
+            value.get("sub"),
+            value.get("client_id"),
+            expires_at,
+            self._encode(value),
+        )
+
+    def _encode(self, value: Mapping[str, Any]) -> Union[str, bytes]:
+        if self.binary:
+            if not isinstance(value, SessionRecord):
+                value = SessionRecord(value)
+            return value.to_bytes()
+        if not isinstance(value, dict):
+            value = dict(value)
+        return json.dumps(value)
+
+    @staticmethod
+    def _decode(data: Union[str, bytes]) -> Dict[str, Any]:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return cast(Dict[str, Any], SessionRecord.from_bytes(bytes(data)))
+        return json.loads(data)
+
+    def __setitem__(self, key: str, value: Dict[str, Union[str, bool]]) -> None:
+        """Store the session information together with the indexed columns."""
+        row = self._row(key, value)
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute(
+                    "DELETE FROM {} WHERE sid = ?".format(self.table), (key,)
+                )
+                cursor.execute(
+                    "INSERT INTO {} (sid, uid, sub, client_id, expires_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)".format(self.table),  # nosec
+                    row,
+                )
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def __getitem__(self, key: str) -> Dict[str, Union[str, bool]]:
+        """Retrieve session information based on session id."""
+        rows = self._fetch_column("data", "sid", key)
+        if not rows:
+            raise KeyError(key)
+        return self._decode(rows[0])
+
+    def get_versioned(self, key: str) -> Tuple[Dict[str, Union[str, bool]], Any]:
+        """Return the session information, the stored document is the version."""
+        rows = self._fetch_column("data", "sid", key)
+        if not rows:
+            raise KeyError(key)
+        return self._decode(rows[0]), rows[0]
+
+    def set_versioned(
+        self, key: str, value: Dict[str, Union[str, bool]], version: Any
+    ) -> bool:
+        """Store the session information if the stored session has not changed."""
+        row = self._row(key, value)
+        if version is None:
+            cursor = self._execute(
+                "INSERT INTO {table} (sid, uid, sub, client_id, expires_at, data) "
+                "SELECT ?, ?, ?, ?, ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE sid = ?)",
+                row + (key,),
+            )
+        else:
+            cursor = self._execute(
+                "UPDATE {table} SET uid = ?, sub = ?, client_id = ?, expires_at = ?, "
+                "data = ? WHERE sid = ? AND data = ?",
+                row[1:] + (key, version),
+            )
+        return cursor.rowcount == 1
+
+    def __delitem__(self, key: str) -> None:
+        """Delete the session info."""
+        cursor = self._execute("DELETE FROM {table} WHERE sid = ?", (key,))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return bool(self._fetch_column("1", "sid", key))
+
+    def get_by_sub(self, sub: str) -> List[str]:
+        """Return session ids based on sub."""
+        return self._fetch_column("sid", "sub", sub)
+
+    def get_by_uid(self, uid: str) -> List[str]:
+        """Return session ids based on uid."""
+        return self._fetch_column("sid", "uid", uid)
+
+    def get(self, attr: str, val: str) -> List[str]:
+        """Return session ids based on attribute name and value."""
+        if attr in self.COLUMNS:
+            return self._fetch_column("sid", attr, val)
+        # Not an indexed column, the stored sessions have to be inspected
+        cursor = self._execute("SELECT sid, data FROM {table}")
+        return [
+            sid
+            for sid, data in cursor.fetchall()
+            if self._decode(data).get(attr) == val
+        ]
+
+    def get_client_ids_for_uid(self, uid: str) -> List[str]:
+        """Return client ids that have a session for given uid."""
+        client_ids = self._fetch_column("client_id", "uid", uid)
+        if None in client_ids:
+            raise KeyError("client_id")
+        return client_ids
+
+    def get_token_ids(self, uid: str) -> List[str]:
+        """Return id_tokens for the given uid."""
+        return [
+            self._decode(data)["id_token"]
+            for data in self._fetch_column("data", "uid", uid)
+        ]
+
+    def is_revoke_uid(self, uid: str) -> bool:
+        """Return if the session is revoked."""
+        return any(
+            self._decode(data)["revoked"]
+            for data in self._fetch_column("data", "uid", uid)
+        )
+
+    def get_uid_by_sid(self, sid: str) -> str:
+        """Return User id based on session ID."""
+        uids = self._fetch_column("uid", "sid", sid)
+        if not uids:
+            raise KeyError(sid)
+        if uids[0] is None:
+            raise KeyError("authn_event")
+        return uids[0]
+
+    def get_uid_by_sub(self, sub: str) -> Optional[str]:
+        """Return User id based on sub."""
+        uids = self._fetch_column("uid", "sub", sub)
+        if not uids:
+            return None
+        return uids[0]
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        """Remove several stored sessions using bulk deletes."""
+        keys = list(keys)
+        for start in range(0, len(keys), self.CHUNK_SIZE):
+            chunk = tuple(keys[start : start + self.CHUNK_SIZE])
+            placeholders = ", ".join("?" * len(chunk))
+            self._execute(
+                "DELETE FROM {{table}} WHERE sid IN ({})".format(placeholders),  # nosec
+                chunk,
+            )
+
+    def remove_expired(self, when: Optional[float] = None) -> int:
+        """
+        Remove all sessions that expired using a single bulk delete.
+
+        :param when: Timestamp to compare the expiry time with, defaults to now
+        :return: Number of removed sessions
+        """
+        if when is None:
+            when = time_sans_frac()
+        cursor = self._execute(
+            "DELETE FROM {table} WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (when,),
+        )
+        return cursor.rowcount
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class ShardedSessionBackend(SessionBackend):
+    """
+    Implementation of `SessionBackend` spreading the sessions over several backends.
+
+    Every session is stored in the shard its session id hashes to on a consistent
+    hash ring, so adding a shard at the end only moves a fraction of the sessions.
+    Lookups by session id touch a single shard.
+
+    Lookups by uid and sub are answered by the shards listed for the uid or sub in a
+    routing index. The index is itself a `SessionBackend`, to be shared by the worker
+    processes using the shards, and it is only written when a uid or sub gets its
+    first session on a shard. Other lookups by attribute ask every shard.
+    """
+
+    def __init__(
+        self,
+        shards: Sequence[SessionBackend],
+        routing: Optional[SessionBackend] = None,
+        replicas: int = 100,
+        routed_cache_size: int = 10000,
+    ):
+        """
+        Create the storage.
+
+        :param shards: The backends the sessions are spread over, always in the same order
+        :param routing: Backend storing the routing index, defaults to a DictSessionBackend
+        :param replicas: Number of points of every shard on the hash ring
+        :param routed_cache_size: Number of routing entries remembered as stored
+        """
+        if not shards:
+            raise ValueError("At least one shard is needed")
+        self.shards = list(shards)
+        self.routing = DictSessionBackend() if routing is None else routing
+        ring = sorted(
+            (_ring_hash("{}:{}".format(index, replica)), index)
+            for index in range(len(self.shards))
+            for replica in range(replicas)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [index for _, index in ring]
+        # Routing entries this instance knows to be stored
+        self._routed = LRUCache(maxsize=routed_cache_size, ttl=None)
+
+    def shard_index(self, key: str) -> int:
+        """Return the index of the shard storing a session."""
+        pos = bisect.bisect(self._points, _ring_hash(key))
+        return self._owners[pos % len(self._owners)]
+
+    def _shard(self, key: str) -> SessionBackend:
+        return self.shards[self.shard_index(key)]
+
+    def _route(self, name: str, index: int) -> None:
+        """Add a shard to the routing entry of a uid or sub."""
+        if (name, index) in self._routed:
+            return
+        while True:
+            try:
+                stored, version = self.routing.get_versioned(name)
+            except KeyError:
+                shards: List[int] = []
+                version = None
+            else:
+                shards = cast(Dict[str, List[int]], stored)["shards"]
+            if index in shards:
+                break
+            entry: Dict[str, List[int]] = {"shards": sorted(shards + [index])}
+            if self.routing.set_versioned(name, cast(Dict[str, Any], entry), version):
+                break
+        self._routed.set((name, index), True)
+
+    def _routed_shards(self, name: str) -> List[SessionBackend]:
+        try:
+            indexes = self.routing[name]["shards"]
+        except KeyError:
+            return []
+        return [self.shards[index] for index in cast(List[int], indexes)]
+
+    def __setitem__(self, key: str, value: Dict[str, Union[str, bool]]) -> None:
+        """Store the session info in its shard and route its uid and sub there."""
+        index = self.shard_index(key)
+        self.shards[index][key] = value
+        self._route_session(index, value)
+
+    def _route_session(self, index: int, value: Dict[str, Union[str, bool]]) -> None:
+        uid = _session_uid(value)
+        if uid is not None:
+            self._route("uid:{}".format(uid), index)
+        sub = value.get("sub")
+        if sub is not None:
+            self._route("sub:{}".format(sub), index)
+
+    def __getitem__(self, key: str) -> Dict[str, Union[str, bool]]:
+        """Retrieve session information from its shard."""
+        return self._shard(key)[key]
+
+    def __delitem__(self, key: str) -> None:
+        """Delete the session info from its shard, the routing index is left as is."""
+        del self._shard(key)[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._shard(key)
+
+    def get_versioned(self, key: str) -> Tuple[Dict[str, Union[str, bool]], Any]:
+        return self._shard(key).get_versioned(key)
+
+    def set_versioned(
+        self, key: str, value: Dict[str, Union[str, bool]], version: Any
+    ) -> bool:
+        index = self.shard_index(key)
+        if not self.shards[index].set_versioned(key, value, version):
+            return False
+        self._route_session(index, value)
+        return True
+
+    def get_by_uid(self, uid: str) -> List[str]:
+        """Return session ids based on uid."""
+        return [
+            sid
+            for shard in self._routed_shards("uid:{}".format(uid))
+            for sid in shard.get_by_uid(uid)
+        ]
+
+    def get_by_sub(self, sub: str) -> List[str]:
+        """Return session ids based on sub."""
+        return [
+            sid
+            for shard in self._routed_shards("sub:{}".format(sub))
+            for sid in shard.get_by_sub(sub)
+        ]
+
+    def get(self, attr: str, val: str) -> List[str]:
+        """Return session ids based on attribute name and value."""
+        if attr == "sub":
+            return self.get_by_sub(val)
+        return [sid for shard in self.shards for sid in shard.get(attr, val)]
+
+    def get_client_ids_for_uid(self, uid: str) -> List[str]:
+        """Return client ids that have a session for given uid."""
+        return [
+            client_id
+            for shard in self._routed_shards("uid:{}".format(uid))
+            for client_id in shard.get_client_ids_for_uid(uid)
+        ]
+
+    def get_token_ids(self, uid: str) -> List[str]:
+        """Return id_tokens for the given uid."""
+        return [
+            token_id
+            for shard in self._routed_shards("uid:{}".format(uid))
+            for token_id in shard.get_token_ids(uid)
+        ]
+
+    def get_uid_by_sub(self, sub: str) -> Optional[str]:
+        """Return User id based on sub."""
+        for shard in self._routed_shards("sub:{}".format(sub)):
+            uid = shard.get_uid_by_sub(sub)
+            if uid is not None:
+                return uid
+        return None
+
+    def get_uid_by_sid(self, sid: str) -> str:
+        """Return User id based on session ID."""
+        return self._shard(sid).get_uid_by_sid(sid)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        """Remove several stored sessions, with one bulk delete per shard."""
+        per_shard: Dict[int, List[str]] = {}
+        for key in keys:
+            per_shard.setdefault(self.shard_index(key), []).append(key)
+        for index, shard_keys in per_shard.items():
+            self.shards[index].delete_many(shard_keys)
@@ -10,9 +10,12 @@ In order to configure some objects in PyOIDC, you need a settings object.
 If you need to add some settings, make sure that you settings class inherits from the appropriate class in this module.
 """
 import typing
+from typing import Optional
 from typing import Tuple
 from typing import Union
 
+from oic.utils.json_codec import JSONCodec
+
 
 class SettingsException(Exception):
     """Exception raised by misconfigured settings class."""
@@ -36,18 +39,32 @@ class PyoidcSettings:
             Timeout for requests library.
             Can be specified either as a single float or as a tuple of floats.
             For more details, refer to ``requests`` documentation.
+        pool_connections
+            Number of per-host connection pools kept by the HTTP session.
+        pool_maxsize
+            Maximum number of keep-alive connections kept in each per-host connection pool.
+        json_codec
+            Instance of :class:`oic.utils.json_codec.JSONCodec` used to encode and decode the JSON of messages.
+            It is installed for all the messages when the client or server is created, unless another codec is
+            installed already, the default is the standard library ``json`` module.
 
     """
 
     def __init__(
         self,
         verify_ssl: Union[bool, str] = True,
-        client_cert: Union[str, Tuple[str, str]] = None,
+        client_cert: Optional[Union[str, Tuple[str, str]]] = None,
         timeout: Union[float, Tuple[float, float]] = 5,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        json_codec: Optional[JSONCodec] = None,
     ):
         self.verify_ssl = verify_ssl
         self.client_cert = client_cert
         self.timeout = timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.json_codec = json_codec
 
     def __setattr__(self, name, value):
         """This attempts to check if value matches the expected value."""
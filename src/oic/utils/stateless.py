@@ -1,12 +1,10 @@
 import time
-from typing import List
 
-from oic.oauth2.grant import Grant
-from oic.oauth2.grant import Token
 from oic.oauth2.message import SINGLE_OPTIONAL_STRING
 from oic.oauth2.message import SINGLE_REQUIRED_STRING
 from oic.oauth2.message import Message
 from oic.oic.message import SINGLE_REQUIRED_INT
+from oic.utils.revocation import RevocationList
 from oic.utils.time_util import epoch_in_a_while
 
 __author__ = "roland"
@@ -33,7 +31,15 @@ class StateLess(object):
         grant_validity=300,
         access_validity=600,
         refresh_validity=0,
+        revoked=None,
+        used_grants=None,
     ):
+        """
+        Initialize the instance.
+
+        :param revoked: RevocationList of the revoked tokens, may be shared with other workers
+        :param used_grants: RevocationList of the used authorization codes
+        """
         self.keys = keys
         self.alg = enc_alg
         self.enc = enc_method
@@ -42,8 +48,8 @@ class StateLess(object):
             "access": access_validity,
             "refresh": refresh_validity,
         }
-        self.used_grants: List[Grant] = []
-        self.revoked: List[Token] = []
+        self.used_grants = RevocationList() if used_grants is None else used_grants
+        self.revoked = RevocationList() if revoked is None else revoked
 
     def __getitem__(self, token):
         """
@@ -100,24 +106,31 @@ class StateLess(object):
             return True
 
     def is_valid(self, token):
-        _cont = Content().from_jwe(token, self.keys)
-
-        if _cont["val"] >= time.time():
-            return False
+        # Checking the revocation list is cheaper than decrypting
         if token in self.revoked:
             return False
+
+        _cont = Content().from_jwe(token, self.keys)
+        if _cont["val"] < time.time():
+            return False
         else:
             return True
 
     def is_revoked(self, token):
-        if token in self.revoked:
-            return True
-        else:
-            return False
+        return token in self.revoked
 
     def revoke_token(self, token):
         # revokes either the refresh token or the access token
-        self.revoked.append(token)
+        _cont = Content().from_jwe(token, self.keys)
+        self.revoked.add(token, _cont["val"])
+
+    def use_grant(self, token):
+        """Mark an authorization code as used, return False if it already was."""
+        if token in self.used_grants:
+            return False
+        _cont = Content().from_jwe(token, self.keys)
+        # Concurrent requests may have passed the check above
+        return not self.used_grants.check_and_add(token, _cont["val"])
 
     def store_session(self, cont):
         pass
@@ -0,0 +1,127 @@
+"""
+Storage of refresh tokens by family.
+
+All the refresh tokens issued for a session form a family. The family keeps a
+single shallow copy of the session, which is used when the session itself has
+been removed, and the digests of its tokens. When refresh tokens are rotated
+only the last one issued can be used; presenting an earlier one means the
+token leaked, and the whole family is revoked by setting one flag.
+"""
+import threading
+from collections.abc import MutableMapping
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from oic.utils.revocation import token_digest
+
+
+class TokenFamily(object):
+    """The session and the tokens of one family."""
+
+    __slots__ = ("sinfo", "current", "previous")
+
+    def __init__(self, sinfo: Dict[str, Any]):
+        self.sinfo = sinfo
+        self.current: Optional[bytes] = None
+        # Rotated tokens, oldest first, only created on the first rotation
+        self.previous: Optional[List[bytes]] = None
+
+
+class RefreshTokenFamilies(MutableMapping):
+    """
+    Refresh token storage keyed on session id, to be used as `token_storage` of a refresh token factory.
+
+    Like the dict used by default it maps the session id to the session as it was
+    when the refresh token was issued, with a "revoked" flag shared by all the
+    tokens of the family.
+    """
+
+    def __init__(self, rotate: bool = True, history: int = 16):
+        """
+        Initialize the storage.
+
+        :param rotate: Whether SessionDB issues a new refresh token with every refresh
+        :param history: Number of rotated tokens of a family recognized on reuse
+        """
+        self.rotate = rotate
+        self.history = history
+        self._families: Dict[str, TokenFamily] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, sid: str) -> Dict[str, Any]:
+        return self._families[sid].sinfo
+
+    def __setitem__(self, sid: str, sinfo: Dict[str, Any]) -> None:
+        with self._lock:
+            family = self._families.get(sid)
+            if family is None:
+                self._families[sid] = TokenFamily(sinfo)
+            else:
+                family.sinfo = sinfo
+
+    def __delitem__(self, sid: str) -> None:
+        with self._lock:
+            del self._families[sid]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._families))
+
+    def __len__(self) -> int:
+        return len(self._families)
+
+    def issue(self, sid: str, token: str, sinfo: Dict[str, Any]) -> None:
+        """
+        Add a token to the family of a session, it replaces the current one.
+
+        :param sid: Session id
+        :param token: The refresh token
+        :param sinfo: The session information, a shallow copy is kept
+        """
+        snapshot = sinfo.copy()
+        digest = token_digest(token)
+        with self._lock:
+            family = self._families.get(sid)
+            if family is None:
+                family = self._families[sid] = TokenFamily(snapshot)
+            else:
+                if family.sinfo.get("revoked"):
+                    # A revoked family stays revoked
+                    snapshot["revoked"] = True
+                family.sinfo = snapshot
+                if family.current is not None and self.history:
+                    if family.previous is None:
+                        family.previous = []
+                    family.previous.append(family.current)
+                    del family.previous[: -self.history]
+            family.current = digest
+
+    def is_active(self, sid: str, token: str) -> bool:
+        """
+        Return whether a token can be used, revoke the family if a rotated token is used again.
+
+        :param sid: Session id
+        :param token: The refresh token
+        :raises: KeyError if the session has no family
+        """
+        family = self._families[sid]
+        if family.sinfo.get("revoked", False):
+            return False
+        if family.current is None:
+            # Stored without a token, as by older versions
+            return True
+        digest = token_digest(token)
+        if digest == family.current:
+            return True
+        if family.previous is not None and digest in family.previous:
+            self.revoke(sid)
+        return False
+
+    def revoke(self, sid: str) -> None:
+        """Revoke all the tokens of the family of a session."""
+        with self._lock:
+            family = self._families.get(sid)
+            if family is not None:
+                family.sinfo["revoked"] = True
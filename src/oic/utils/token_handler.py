@@ -1,5 +1,6 @@
 from oic import rndstr
 from oic.extension.token import JWTToken
+from oic.utils.jti_store import MemoryJTIStore
 
 __author__ = "roland"
 
@@ -12,7 +13,7 @@ class TokenHandler(object):
     """
     Class for handling tokens.
 
-    Note! the token and refresh token factories both keep their own token databases.
+    Unless given, the token and refresh token factories share one store of the active tokens.
     """
 
     def __init__(
@@ -23,6 +24,7 @@ class TokenHandler(object):
         refresh_token_factory=None,
         keyjar=None,
         sign_alg="RS256",
+        jti_store=None,
     ):
         """
         Initialize the class.
@@ -35,12 +37,15 @@ class TokenHandler(object):
              'refresh_token': {<target_id>: {<grant_type>: <lifetime>}}}
         :param keyjar: A oic.utils.keyio.KeyJar instance
         :param sign_alg: Which signature algorithm to use.
+        :param jti_store: JTIStore used by the default factories, defaults to a MemoryJTIStore
         :return: a TokenHandler instance
         """
         self.token_policy = token_policy
+        if jti_store is None:
+            jti_store = MemoryJTIStore()
         if token_factory is None:
             self.token_factory = JWTToken(
-                "T", keyjar=keyjar, iss=issuer, sign_alg=sign_alg
+                "T", keyjar=keyjar, iss=issuer, sign_alg=sign_alg, jti_store=jti_store
             )
         else:
             self.token_factory = token_factory
@@ -52,6 +57,7 @@ class TokenHandler(object):
                 iss="https://example.com/as",
                 sign_alg=sign_alg,
                 token_storage={},
+                jti_store=jti_store,
             )
         else:
             self.refresh_token_factory = refresh_token_factory
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from typing import Any
+from typing import Dict
+from typing import Tuple
+from urllib.parse import parse_qs
+
+import pytest
+
+from oic.oic import Client
+from oic.oic import Grant
+from oic.oic.async_client import AsyncClient
+from oic.oic.async_client import AsyncResponse
+from oic.oic.message import AccessTokenResponse
+from oic.oic.message import AuthorizationResponse
+from oic.oic.message import IdToken
+from oic.oic.message import OpenIDSchema
+from oic.oic.message import ProviderConfigurationResponse
+from oic.oic.message import RegistrationResponse
+from oic.utils.authn.client import CLIENT_AUTHN_METHOD
+from oic.utils.keyio import KeyBundle
+from oic.utils.keyio import rsa_load
+from oic.utils.time_util import utc_time_sans_frac
+
+BASE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "data/keys"))
+RSA_KEY = rsa_load(os.path.join(BASE_PATH, "rsa.key"))
+OP_KEYS = KeyBundle({"key": RSA_KEY, "kty": "RSA", "use": "sig", "kid": "op"})
+
+ISSUER = "https://op.example.com"
+CLIENT_ID = "client_1"
+
+
+class FakeTransport(object):
+    """Answers requests from canned responses, recording the requests made."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+        self.closed = False
+
+    async def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        # Let the other pending requests run
+        await asyncio.sleep(0)
+        status, body = self.responses[(method, url)]
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        return AsyncResponse(status, body, {"content-type": "application/json"}, url)
+
+    async def close(self):
+        self.closed = True
+
+
+def provider_info():
+    return {
+        "issuer": ISSUER,
+        "authorization_endpoint": ISSUER + "/authorization",
+        "token_endpoint": ISSUER + "/token",
+        "userinfo_endpoint": ISSUER + "/userinfo",
+        "registration_endpoint": ISSUER + "/registration",
+        "jwks_uri": ISSUER + "/jwks",
+        "response_types_supported": ["code"],
+        "subject_types_supported": ["public"],
+        "id_token_signing_alg_values_supported": ["RS256"],
+    }
+
+
+def signed_id_token(nonce):
+    idt = IdToken(
+        iss=ISSUER,
+        sub="sub",
+        aud=CLIENT_ID,
+        exp=utc_time_sans_frac() + 86400,
+        iat=utc_time_sans_frac(),
+        nonce=nonce,
+    )
+    return idt.to_jwt(OP_KEYS.keys(), "RS256")
+
+
+def make_client(responses):
+    client = Client(CLIENT_ID, client_authn_method=CLIENT_AUTHN_METHOD)
+    client.client_secret = "abcdefghijklmnop"
+    client.redirect_uris = ["https://example.com/redirect"]
+    return AsyncClient(client, transport=FakeTransport(responses))
+
+
+def add_grant(client, state, nonce):
+    grant = Grant()
+    grant.add_code(AuthorizationResponse(code="code_" + state, state=state))
+    client.grant[state] = grant
+    client.state2nonce[state] = nonce
+
+
+class TestAsyncClient(object):
+    def test_attribute_delegation(self):
+        aclient = make_client({})
+        assert aclient.client_id == CLIENT_ID
+        aclient.client.token_endpoint = ISSUER + "/token"
+        assert aclient.token_endpoint == ISSUER + "/token"
+
+    def test_provider_config(self):
+        aclient = make_client(
+            {
+                ("GET", ISSUER + "/.well-known/openid-configuration"): (
+                    200,
+                    provider_info(),
+                ),
+                ("GET", ISSUER + "/jwks"): (200, OP_KEYS.jwks()),
+            }
+        )
+        pcr = asyncio.run(aclient.provider_config(ISSUER))
+
+        assert isinstance(pcr, ProviderConfigurationResponse)
+        assert aclient.token_endpoint == ISSUER + "/token"
+        assert [k.kid for k in aclient.keyjar.get_signing_key("RSA", ISSUER)] == ["op"]
+        assert [c[1] for c in aclient.transport.calls] == [
+            ISSUER + "/.well-known/openid-configuration",
+            ISSUER + "/jwks",
+        ]
+
+    def test_do_access_token_request_concurrent(self):
+        token_responses: Dict[Tuple[str, str], Any] = {}
+        aclient = make_client(token_responses)
+        aclient.client.token_endpoint = ISSUER + "/token"
+        aclient.client.keyjar.add_kb(ISSUER, OP_KEYS)
+
+        # All states are answered by the same token endpoint, so reply with the
+        # id_token matching the code sent.
+        class Transport(FakeTransport):
+            async def request(self, method, url, **kwargs):
+                self.calls.append((method, url, kwargs))
+                await asyncio.sleep(0)
+                state = parse_qs(kwargs["data"])["code"][0][len("code_") :]
+                body = {
+                    "access_token": "access_" + state,
+                    "token_type": "Bearer",
+                    "id_token": signed_id_token("nonce_" + state),
+                }
+                return AsyncResponse(
+                    200, json.dumps(body), {"content-type": "application/json"}, url
+                )
+
+        aclient.transport = Transport(token_responses)
+        states = ["state{}".format(i) for i in range(10)]
+        for state in states:
+            add_grant(aclient.client, state, "nonce_" + state)
+
+        async def run():
+            return await asyncio.gather(
+                *[aclient.do_access_token_request(state=state) for state in states]
+            )
+
+        results = asyncio.run(run())
+        for state, atr in zip(states, results):
+            assert isinstance(atr, AccessTokenResponse)
+            assert atr["access_token"] == "access_" + state
+            assert atr["id_token"]["nonce"] == "nonce_" + state
+        assert "Authorization" in aclient.transport.calls[0][2]["headers"]
+
+    def test_do_user_info_request(self):
+        aclient = make_client(
+            {
+                ("POST", ISSUER + "/userinfo"): (
+                    200,
+                    {"sub": "sub", "name": "Melody Gardot"},
+                )
+            }
+        )
+        aclient.client.userinfo_endpoint = ISSUER + "/userinfo"
+        grant = Grant()
+        grant.add_code(AuthorizationResponse(code="code", state="state"))
+        grant.add_token(AccessTokenResponse(access_token="access", token_type="Bearer"))
+        aclient.client.grant["state"] = grant
+
+        resp = asyncio.run(aclient.do_user_info_request(state="state"))
+
+        assert isinstance(resp, OpenIDSchema)
+        assert resp["name"] == "Melody Gardot"
+        assert parse_qs(aclient.transport.calls[0][2]["data"]) == {
+            "access_token": ["access"]
+        }
+
+    def test_register(self):
+        aclient = make_client(
+            {
+                ("POST", ISSUER + "/registration"): (
+                    201,
+                    {
+                        "client_id": "registered",
+                        "client_secret": "secret",
+                        "redirect_uris": ["https://example.com/redirect"],
+                    },
+                )
+            }
+        )
+        resp = asyncio.run(
+            aclient.register(
+                ISSUER + "/registration",
+                redirect_uris=["https://example.com/redirect"],
+            )
+        )
+
+        assert isinstance(resp, RegistrationResponse)
+        assert aclient.client_id == "registered"
+        method, url, kwargs = aclient.transport.calls[0]
+        assert json.loads(kwargs["data"])["redirect_uris"] == [
+            "https://example.com/redirect"
+        ]
+
+    def test_fetch_distributed_claims(self):
+        aclient = make_client(
+            {
+                ("GET", "https://bank.example.com/claim_source"): (
+                    200,
+                    {"shoe_size": 11},
+                ),
+                ("GET", "https://shop.example.com/claim_source"): (
+                    200,
+                    {"hat_size": 7},
+                ),
+            }
+        )
+        userinfo = {
+            "sub": "foobar",
+            "_claim_names": {"shoe_size": "src1", "hat_size": "src2"},
+            "_claim_sources": {
+                "src1": {"endpoint": "https://bank.example.com/claim_source"},
+                "src2": {
+                    "endpoint": "https://shop.example.com/claim_source",
+                    "access_token": "abcdef",
+                },
+            },
+        }
+
+        _ui = asyncio.run(aclient.fetch_distributed_claims(userinfo))
+
+        assert _ui["shoe_size"] == 11
+        assert _ui["hat_size"] == 7
+        assert "_claim_names" not in _ui
+        assert "_claim_sources" not in _ui
+
+    def test_close(self):
+        aclient = make_client({})
+        asyncio.run(aclient.close())
+        assert aclient.transport.closed
+
+
+class JWKSHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = OP_KEYS.jwks().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_aiohttp_transport():
+    pytest.importorskip("aiohttp")
+    server = HTTPServer(("127.0.0.1", 0), JWKSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/jwks".format(server.server_port)
+
+    client = Client(CLIENT_ID, client_authn_method=CLIENT_AUTHN_METHOD)
+    aclient = AsyncClient(client)
+    aclient.keyjar.add(ISSUER, url)
+
+    async def run():
+        try:
+            await aclient.update_keys()
+        finally:
+            await aclient.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+    assert [k.kid for k in aclient.keyjar.get_signing_key("RSA", ISSUER)] == ["op"]
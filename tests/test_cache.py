@@ -0,0 +1,51 @@
+import time
+
+import pytest
+from freezegun import freeze_time
+
+from oic.utils.cache import LRUCache
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl():
+    cache = LRUCache(ttl=10)
+    with freeze_time("2020-01-01 00:00:00") as frozen:
+        cache.set("a", 1)
+        cache.set("b", 2, expires_at=time.time() + 5)
+        cache.set("c", 3, expires_at=time.time() + 60)
+        frozen.tick(6)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        frozen.tick(5)
+        assert cache.get("a") is None
+        assert cache.get("c") is None
+    assert len(cache) == 0
+
+
+def test_delete_and_clear():
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    cache.delete("unknown")
+    assert "a" not in cache
+    assert "b" in cache
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_maxsize():
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
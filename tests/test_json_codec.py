@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from oic.oauth2.base import PBase
+from oic.oauth2.message import DecodeError
+from oic.oauth2.message import Message
+from oic.oic.message import ProviderConfigurationResponse
+from oic.oic.message import jwt_deser
+from oic.utils import json_codec
+from oic.utils.json_codec import STDLIB_CODEC
+from oic.utils.json_codec import JSONCodec
+from oic.utils.json_codec import get_json_codec
+from oic.utils.json_codec import set_json_codec
+from oic.utils.settings import PyoidcSettings
+
+
+class CountingCodec(JSONCodec):
+    def __init__(self):
+        super().__init__(dumps=self._dumps, loads=self._loads)
+        self.dumped = 0
+        self.loaded = 0
+
+    def _dumps(self, obj):
+        self.dumped += 1
+        return json.dumps(obj, separators=(",", ":"))
+
+    def _loads(self, txt):
+        self.loaded += 1
+        return json.loads(txt)
+
+
+@pytest.fixture
+def codec():
+    codec = CountingCodec()
+    set_json_codec(codec)
+    yield codec
+    set_json_codec(None)
+
+
+def test_default_codec():
+    assert get_json_codec() is STDLIB_CODEC
+    assert json_codec.dumps({"a": 1}) == '{"a": 1}'
+    assert json_codec.loads('{"a": 1}') == {"a": 1}
+
+
+def test_set_json_codec(codec):
+    assert get_json_codec() is codec
+    set_json_codec(None)
+    assert get_json_codec() is STDLIB_CODEC
+
+
+def test_message_json(codec):
+    msg = Message(foo="bar", baz=["a", "b"])
+    txt = msg.to_json()
+    assert txt == '{"foo":"bar","baz":["a","b"]}'
+    assert codec.dumped == 1
+
+    assert Message().from_json(txt) == msg
+    assert codec.loaded == 1
+
+
+def test_message_json_indent(codec):
+    txt = Message(foo="bar").to_json(indent=2)
+    assert txt == '{\n  "foo": "bar"\n}'
+    assert codec.dumped == 0
+
+
+def test_message_json_decode_error(codec):
+    with pytest.raises(DecodeError):
+        Message().from_json("{not json")
+
+
+def test_nested_message_json(codec):
+    pcr = ProviderConfigurationResponse().from_json(
+        json.dumps({"issuer": "https://op.example.com", "mtls": {"a": "b"}})
+    )
+    assert pcr["issuer"] == "https://op.example.com"
+    assert codec.loaded == 1
+
+
+def test_jwt_deser(codec):
+    jwt = jwt_deser({"iss": "https://op.example.com", "exp": 1}, "dict")
+    assert jwt["iss"] == "https://op.example.com"
+    assert codec.dumped == 1
+    assert codec.loaded == 1
+
+
+def test_client_keeps_codec(codec):
+    # A client without a codec does not replace the installed one
+    PBase(settings=PyoidcSettings())
+    assert get_json_codec() is codec
+
+
+def test_settings_install_codec():
+    codec = CountingCodec()
+    try:
+        PBase(settings=PyoidcSettings(json_codec=codec))
+        assert get_json_codec() is codec
+        # Clients sharing the codec
+        PBase(settings=PyoidcSettings(json_codec=codec))
+        assert get_json_codec() is codec
+    finally:
+        set_json_codec(None)
+
+
+def test_settings_conflicting_codec(codec):
+    with pytest.raises(ValueError):
+        PBase(settings=PyoidcSettings(json_codec=CountingCodec()))
+    assert get_json_codec() is codec
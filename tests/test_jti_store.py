@@ -0,0 +1,76 @@
+import pytest
+
+from oic.utils.jti_store import MemoryJTIStore
+from oic.utils.jti_store import SQLJTIStore
+from oic.utils.time_util import utc_time_sans_frac
+
+
+@pytest.fixture(params=["memory", "sql"])
+def store(request):
+    if request.param == "memory":
+        return MemoryJTIStore(grace=10)
+    return SQLJTIStore(grace=10)
+
+
+class TestJTIStore(object):
+    def test_add_get(self, store):
+        store.add("T-1", "sid1", utc_time_sans_frac() + 60)
+        store["T-2"] = "sid2"
+
+        assert store["T-1"] == "sid1"
+        assert store["T-2"] == "sid2"
+        assert "T-1" in store
+        assert "T-3" not in store
+        assert store.get("T-3") is None
+        with pytest.raises(KeyError):
+            store["T-3"]
+
+    def test_add_again(self, store):
+        now = utc_time_sans_frac()
+        store.add("T-1", "sid1", now + 100)
+        store.add("T-1", "sid2", now + 200)
+
+        assert store["T-1"] == "sid2"
+        assert store.remove_expired(when=now + 200) == 0
+        assert len(store) == 1
+
+    def test_delete(self, store):
+        store.add("T-1", "sid1", utc_time_sans_frac() + 60)
+        del store["T-1"]
+
+        assert "T-1" not in store
+        with pytest.raises(KeyError):
+            del store["T-1"]
+
+    def test_remove_expired(self, store):
+        now = utc_time_sans_frac()
+        store.add("T-1", "sid1", now + 100)
+        store.add("T-2", "sid2", now + 200)
+        store.add("T-3", "sid3")
+
+        assert store.remove_expired(when=now + 110) == 0
+        assert store.remove_expired(when=now + 111) == 1
+        assert "T-1" not in store
+        assert store["T-2"] == "sid2"
+        assert store.remove_expired(when=now + 1000) == 1
+        assert store["T-3"] == "sid3"
+
+    def test_shared_file(self, tmp_path):
+        path = str(tmp_path / "jti.db")
+        SQLJTIStore(path).add("T-1", "sid1", utc_time_sans_frac() + 60)
+
+        assert SQLJTIStore(path)["T-1"] == "sid1"
+
+    def test_invalid_table(self):
+        with pytest.raises(ValueError):
+            SQLJTIStore(table="jti; DROP TABLE x")
+
+
+def test_memory_evicts_on_add():
+    store = MemoryJTIStore(grace=0)
+    now = utc_time_sans_frac()
+    store.add("T-1", "sid1", now - 10)
+    store.add("T-2", "sid2", now + 60)
+
+    assert "T-1" not in store
+    assert len(store) == 1
@@ -1,6 +1,16 @@
 import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 
+import pytest
+from jwkest.jwk import SYMKey
+from jwkest.jws import NoSuitableSigningKeys
+from jwkest.jws import alg2keytype
+
+from oic.oauth2.message import Message
 from oic.utils.jwt import JWT
+from oic.utils.jwt import CompactSigner
+from oic.utils.jwt import sign_many
 from oic.utils.keyio import build_keyjar
 from oic.utils.keyio import keybundle_from_local_file
 
@@ -55,3 +65,64 @@ class TestJWT(object):
         keyjar.add_kb("", kb)
         info = srv.unpack(_jwt)
         assert info["sub"] == "sub"
+
+
+class TestCompactSigner(object):
+    msg = Message(iss=issuer, sub="sub", aud="client")
+    keyjar = build_keyjar(
+        [
+            {"type": "RSA", "key": os.path.join(BASE_PATH, "cert.key"), "use": ["sig"]},
+            {"type": "EC", "crv": "P-256", "use": ["sig"]},
+        ]
+    )[1]
+
+    @pytest.mark.parametrize("alg", ["HS256", "HS512", "RS256", "RS512", "none"])
+    def test_same_as_to_jwt(self, alg):
+        if alg.startswith("HS"):
+            keys = [SYMKey(key="abcdefghijklmnop", kid="sym")]
+        else:
+            keys = self.keyjar.get_signing_key("RSA")
+        signer = CompactSigner(alg, keys)
+        assert signer.sign(self.msg.to_json()) == self.msg.to_jwt(keys, alg)
+
+    @pytest.mark.parametrize("alg", ["PS256", "ES256"])
+    def test_verify(self, alg):
+        keys = self.keyjar.get_signing_key(alg2keytype(alg))
+        signer = CompactSigner(alg, keys)
+        assert signer.kid == keys[0].kid
+        _jwt = signer.sign(self.msg.to_json())
+        assert Message().from_jwt(_jwt, key=keys) == self.msg
+
+    def test_no_key(self):
+        with pytest.raises(NoSuitableSigningKeys):
+            CompactSigner("HS256", self.keyjar.get_signing_key("RSA"))
+
+    @pytest.mark.parametrize("alg", ["HS256", "RS256", "ES256"])
+    def test_pickle(self, alg):
+        if alg.startswith("HS"):
+            keys = [SYMKey(key="abcdefghijklmnop", kid="sym")]
+        else:
+            keys = self.keyjar.get_signing_key(alg2keytype(alg))
+        signer = pickle.loads(pickle.dumps(CompactSigner(alg, keys)))
+        assert signer.kid == keys[0].kid
+        assert Message().from_jwt(signer.sign(self.msg.to_json()), key=keys) == self.msg
+
+
+def test_sign_many():
+    hs_signer = CompactSigner("HS256", [SYMKey(key="abcdefghijklmnop")])
+    rs_signer = CompactSigner(
+        "RS256",
+        keybundle_from_local_file(
+            os.path.join(BASE_PATH, "cert.key"), "RSA", ["sig"]
+        ).keys(),
+    )
+    jobs = [
+        (signer, Message(sub=str(i)).to_json())
+        for i in range(10)
+        for signer in [hs_signer, rs_signer]
+    ]
+    expected = [signer.sign(payload) for signer, payload in jobs]
+
+    assert sign_many(jobs) == expected
+    with ThreadPoolExecutor(2) as executor:
+        assert sign_many(jobs, executor, chunk_size=3) == expected
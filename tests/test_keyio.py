@@ -12,6 +12,7 @@ from unittest.mock import sentinel
 import pytest
 import responses
 from freezegun import freeze_time
+from jwkest.jwk import SYMKey
 from jwkest.jws import JWS
 
 from oic.oauth2.message import MissingSigningKey
@@ -19,6 +20,7 @@ from oic.oic import AuthorizationResponse
 from oic.oic.provider import Provider
 from oic.utils.keyio import JWKSError
 from oic.utils.keyio import KeyBundle
+from oic.utils.keyio import KeyBundleRefresher
 from oic.utils.keyio import KeyJar
 from oic.utils.keyio import RSAKey
 from oic.utils.keyio import build_keyjar
@@ -215,6 +217,115 @@ class TestKeyBundle(object):
         assert kc.do_remote() is False
 
 
+class TestKeyBundleRefresher(object):
+    source = "https://example.com/jwks"
+
+    @pytest.fixture
+    def refresher(self):
+        refresher = KeyBundleRefresher()
+        # Drive the refreshes from the test instead of the thread
+        refresher.stop()
+        return refresher
+
+    def test_serve_stale_keys(self, refresher):
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, json=JWK0)
+            kb = KeyBundle(source=self.source, refresher=refresher)
+            # Nothing to serve yet, so the first load is done inline
+            assert [k.kid for k in kb.keys()] == ["abc"]
+
+        kb.time_out = 0
+        with responses.RequestsMock() as rsps:
+            assert [k.kid for k in kb.keys()] == ["abc"]
+            assert kb.get_key_with_kid("unknown") is None
+        assert refresher.next_refresh(kb) == 0
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, json=JWK1)
+            assert refresher.refresh_due() > 0
+        assert len(kb.keys()) == 2
+        assert refresher.next_refresh(kb) > time.time()
+
+    def test_refresh_unknown_kid(self, refresher):
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, json=JWK0)
+            kb = KeyBundle(source=self.source, refresher=refresher)
+            kb.update()
+
+        # Loaded just now, so not fetched again
+        with responses.RequestsMock() as rsps:
+            assert kb.get_key_with_kid("rsa1") is None
+
+        kb.last_updated -= refresher.min_interval
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, json=JWK1)
+            assert kb.get_key_with_kid("rsa1").kid == "rsa1"
+            assert kb.get_key_with_kid("unknown") is None
+            assert len(rsps.calls) == 1
+
+    def test_refresh_unknown_kid_backoff(self, refresher):
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, json=JWK0)
+            kb = KeyBundle(source=self.source, refresher=refresher)
+            kb.update()
+
+        kb.last_updated -= refresher.min_interval
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, status=500)
+            assert kb.get_key_with_kid("rsa1") is None
+            assert kb.get_key_with_kid("rsa1") is None
+            assert len(rsps.calls) == 1
+        assert kb.get_key_with_kid("abc").kid == "abc"
+
+    def test_refresh_ahead(self, refresher):
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, json=JWK0)
+            kb = KeyBundle(source=self.source, cache_time=300, refresher=refresher)
+            kb.update()
+        assert refresher.next_refresh(kb) == kb.time_out - 30
+        with responses.RequestsMock() as rsps:
+            assert refresher.refresh_due(kb.time_out - 31) == 1
+            rsps.add(rsps.GET, self.source, json=JWK1)
+            refresher.refresh_due(kb.time_out - 29)
+        assert len(kb.keys()) == 2
+
+    def test_backoff(self, refresher):
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, json=JWK0)
+            kb = KeyBundle(source=self.source, refresher=refresher)
+            kb.update()
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, status=500)
+            assert refresher.refresh(kb, now=100) is False
+            assert refresher.next_refresh(kb) == 101
+            assert refresher.refresh(kb, now=101) is False
+            assert refresher.next_refresh(kb) == 103
+        assert [k.kid for k in kb.keys()] == ["abc"]
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(rsps.GET, self.source, json=JWK1)
+            assert refresher.refresh(kb) is True
+        assert refresher.next_refresh(kb) == kb.time_out - 30
+        assert len(kb.keys()) == 2
+
+    def test_background_thread(self):
+        refresher = KeyBundleRefresher()
+        keyjar = KeyJar(refresher=refresher)
+        try:
+            with responses.RequestsMock() as rsps:
+                rsps.add(rsps.GET, self.source, json=JWK0)
+                kb = keyjar.add("https://example.com", self.source)
+                assert kb.refresher is refresher
+                for _ in range(100):
+                    if kb.last_updated:
+                        break
+                    time.sleep(0.01)
+            assert [k.kid for k in kb.available_keys()] == ["abc"]
+        finally:
+            refresher.stop(1)
+
+
 class TestKeyJar(object):
     def test_keyjar_group_keys(self):
         ks = KeyJar()
@@ -291,6 +402,50 @@ class TestKeyJar(object):
         assert _key
         assert _key.kid == "abc"
 
+    def test_get_by_kid_several_bundles(self):
+        kj = KeyJar()
+        kj.add_kb(
+            "https://example.com",
+            KeyBundle(
+                [
+                    {"kty": "oct", "key": "a1b2c3d4", "use": "sig", "kid": "a"},
+                    {"kty": "oct", "key": "e5f6g7h8", "use": "sig", "kid": "b"},
+                ]
+            ),
+        )
+        kj.add_kb(
+            "https://example.com",
+            KeyBundle([{"kty": "oct", "key": "i9j0k1l2", "use": "sig", "kid": "c"}]),
+        )
+
+        keys = kj.get_signing_key("oct", "https://example.com", kid="b")
+        assert [k.kid for k in keys] == ["b", "c"]
+        keys = kj.get_signing_key("oct", "https://example.com/", kid="c")
+        assert [k.kid for k in keys] == ["c"]
+        keys = kj.get_signing_key("oct", "https://example.com", kid="x")
+        assert [k.kid for k in keys] == ["a", "b", "c"]
+        assert kj.get_key_by_kid("c", "https://example.com").kid == "c"
+
+    def test_get_after_change(self):
+        kj = KeyJar()
+        kb = KeyBundle([{"kty": "oct", "key": "a1b2c3d4", "use": "sig", "kid": "a"}])
+        kj.add_kb("", kb)
+        assert [k.kid for k in kj.get_signing_key("oct")] == ["a"]
+
+        kb.append(SYMKey(key="e5f6g7h8", use="sig", kid="b"))
+        assert [k.kid for k in kj.get_signing_key("oct")] == ["a", "b"]
+
+        kj.add_kb("", KeyBundle([{"kty": "oct", "key": "i9j0k1l2", "kid": "c"}]))
+        assert [k.kid for k in kj.get_signing_key("oct")] == ["a", "b", "c"]
+
+        kb.get_key_with_kid("a").inactive_since = 1
+        assert [k.kid for k in kj.get_signing_key("oct")] == ["b", "c"]
+        assert [k.kid for k in kj.get_verify_key("oct")] == ["a", "b", "c"]
+        assert [k.kid for k in kj.get_signing_key("oct", kid="a")] == ["b", "c"]
+
+        kj.remove_key("", "oct", kb.get_key_with_kid("b"))
+        assert [k.kid for k in kj.get_signing_key("oct")] == ["c"]
+
     def test_get_inactive_ver(self):
         ks = KeyJar()
         ks["http://example.com"] = KeyBundle(
@@ -1,4 +1,5 @@
 import json
+from typing import cast
 from urllib.parse import parse_qs
 from urllib.parse import quote
 from urllib.parse import urlencode
@@ -6,6 +7,7 @@ from urllib.parse import urlparse
 
 import pytest
 import responses
+from requests.adapters import HTTPAdapter
 
 from oic.oauth2 import Client
 from oic.oauth2 import Grant
@@ -31,6 +33,7 @@ from oic.oauth2.message import OauthMessageFactory
 from oic.oauth2.message import RefreshAccessTokenRequest
 from oic.utils import time_util
 from oic.utils.keyio import KeyBundle
+from oic.utils.settings import OauthClientSettings
 
 __author__ = "rohe0002"
 
@@ -600,6 +603,34 @@ class TestClient(object):
         assert isinstance(resp, AccessTokenResponse)
         assert resp["access_token"] == "Token"
 
+    def test_http_request_pool_settings(self):
+        settings = OauthClientSettings(pool_connections=2, pool_maxsize=20)
+        client = Client("1", settings=settings)
+        adapter = cast(
+            HTTPAdapter, client.http_session.get_adapter("https://example.com")
+        )
+        # Pools are kept for pool_connections hosts, each of pool_maxsize connections
+        assert adapter.poolmanager.pools._maxsize == 2
+        assert adapter.poolmanager.connection_pool_kw["maxsize"] == 20
+
+    def test_http_request_cookies(self):
+        with responses.RequestsMock() as rsps:
+            rsps.add(
+                rsps.GET,
+                "https://example.com/first",
+                headers={"Set-Cookie": "session=abc; Path=/"},
+            )
+            rsps.add(rsps.GET, "https://example.com/second")
+            rsps.add(rsps.GET, "https://example.org/other")
+
+            self.client.http_request("https://example.com/first")
+            self.client.http_request("https://example.com/second")
+            self.client.http_request("https://example.org/other")
+
+            assert rsps.calls[1].request.headers["Cookie"] == "session=abc"
+            assert "Cookie" not in rsps.calls[2].request.headers
+        assert [c.name for c in self.client.cookiejar] == ["session"]
+
 
 class TestServer(object):
     @pytest.fixture(autouse=True)
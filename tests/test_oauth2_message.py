@@ -1,10 +1,15 @@
 import json
+import pickle
+import time
 from unittest import TestCase
+from unittest.mock import patch
 from urllib.parse import parse_qs
+from urllib.parse import urlencode
 from urllib.parse import urlparse
 
 import pytest
 from jwkest.jwk import SYMKey
+from jwkest.jws import JWS
 
 from oic.oauth2.message import OPTIONAL_LIST_OF_STRINGS
 from oic.oauth2.message import REQUIRED_LIST_OF_STRINGS
@@ -25,13 +30,22 @@ from oic.oauth2.message import MessageException
 from oic.oauth2.message import MessageFactory
 from oic.oauth2.message import MessageTuple
 from oic.oauth2.message import MissingRequiredAttribute
+from oic.oauth2.message import NotAllowedValue
 from oic.oauth2.message import ParamDefinition
+from oic.oauth2.message import ParamDict
+from oic.oauth2.message import ParameterError
 from oic.oauth2.message import RefreshAccessTokenRequest
 from oic.oauth2.message import ROPCAccessTokenRequest
 from oic.oauth2.message import TokenErrorResponse
+from oic.oauth2.message import TooManyValues
+from oic.oauth2.message import WrongSigningAlgorithm
 from oic.oauth2.message import json_deserializer
 from oic.oauth2.message import json_serializer
+from oic.oauth2.message import parse_form
 from oic.oauth2.message import sp_sep_list_deserializer
+from oic.utils.cache import LRUCache
+from oic.utils.keyio import KeyBundle
+from oic.utils.keyio import KeyJar
 from oic.utils.keyio import build_keyjar
 
 __author__ = "rohe0002"
@@ -864,6 +878,293 @@ def test_to_jwe(keytype, alg, enc):
     assert msg1 == msg
 
 
+class TestJWTCache(object):
+    @pytest.fixture(autouse=True)
+    def create_keyjar(self):
+        self.keyjar = KeyJar(jwt_cache=LRUCache())
+        self.keyjar.add_symmetric("https://op.example.com", "A1B2C3D4E5F6G7H8")
+        self.payload = Message(
+            iss="https://op.example.com", sub="sub", exp=int(time.time()) + 60
+        )
+        self.jwt = self.payload.to_jwt(
+            self.keyjar.get_signing_key("oct", "https://op.example.com"), "HS256"
+        )
+
+    def test_verified_once(self):
+        msg = Message().from_jwt(self.jwt, keyjar=self.keyjar)
+        assert msg == self.payload
+        assert len(self.keyjar.jwt_cache) == 1
+
+        with patch.object(JWS, "verify_compact", side_effect=AssertionError):
+            msg = Message().from_jwt(self.jwt, keyjar=self.keyjar)
+        assert msg == self.payload
+        assert msg.jwt == self.jwt
+        assert msg.jws_header["alg"] == "HS256"
+
+    def test_key_change(self):
+        Message().from_jwt(self.jwt, keyjar=self.keyjar)
+        self.keyjar.add_kb("https://op.example.com", KeyBundle())
+
+        with patch.object(JWS, "verify_compact") as verify:
+            Message().from_jwt(self.jwt, keyjar=self.keyjar)
+        assert verify.called
+
+    def test_arguments(self):
+        Message().from_jwt(self.jwt, keyjar=self.keyjar, algs={"sign": "HS256"})
+        with pytest.raises(WrongSigningAlgorithm):
+            Message().from_jwt(self.jwt, keyjar=self.keyjar, algs={"sign": "RS256"})
+
+    def test_expired(self):
+        payload = Message(iss="https://op.example.com", exp=int(time.time()) - 1)
+        _jwt = payload.to_jwt(
+            self.keyjar.get_signing_key("oct", "https://op.example.com"), "HS256"
+        )
+        Message().from_jwt(_jwt, keyjar=self.keyjar)
+        assert len(self.keyjar.jwt_cache) == 1
+        assert self.keyjar.jwt_cache.get(Message._jwt_cache_key(_jwt, {})) is None
+
+    def test_not_verified(self):
+        Message().from_jwt(self.jwt, keyjar=self.keyjar, verify=False)
+        assert len(self.keyjar.jwt_cache) == 0
+
+
+class TestMessageSchema(object):
+    def test_subclass_params_are_tracked(self):
+        assert isinstance(DummyMessage.c_param, ParamDict)
+        assert DummyMessage._schema() is DummyMessage._schema()
+
+    def test_lang_tagged_and_wildcard_lookup(self):
+        schema = DummyMessage._schema()
+        assert schema.lookup("opt_str#en") is SINGLE_OPTIONAL_STRING
+        assert schema.lookup("unknown") is None
+        assert StarMessage._schema().lookup("unknown") is SINGLE_REQUIRED_STRING
+
+    def test_changed_params(self):
+        class ChangingMessage(Message):
+            c_param = {"token": SINGLE_REQUIRED_STRING}
+
+        with pytest.raises(MissingRequiredAttribute):
+            ChangingMessage().to_urlencoded()
+        ChangingMessage.c_param["token"] = SINGLE_OPTIONAL_STRING
+        assert ChangingMessage().to_urlencoded() == ""
+        ChangingMessage.c_param.update({"count": SINGLE_OPTIONAL_INT})
+        assert ChangingMessage(count="3")["count"] == 3
+
+    def test_replaced_params(self):
+        class ReplacedMessage(Message):
+            c_param = {"count": SINGLE_OPTIONAL_STRING}
+
+        ReplacedMessage.c_param = {"count": SINGLE_OPTIONAL_INT}
+        assert ReplacedMessage(count="3")["count"] == 3
+        ReplacedMessage.c_param["count"] = SINGLE_OPTIONAL_STRING
+        assert ReplacedMessage(count="3")["count"] == "3"
+
+    def test_subclass_schema(self):
+        class SubMessage(DummyMessage):
+            c_allowed_values = {"opt_str": ["game"]}
+
+        assert SubMessage._schema() is not DummyMessage._schema()
+        assert SubMessage._schema().spec is DummyMessage.c_param
+
+
+class TestFormCodec(object):
+    def test_parse_form(self):
+        assert list(parse_form("a=1&b=x+y%26z&&c=&d&a=%C3%A9")) == [
+            ("a", "1"),
+            ("b", "x y&z"),
+            ("a", "é"),
+        ]
+
+    def test_duplicate_single_value(self):
+        with pytest.raises(TooManyValues):
+            AccessTokenRequest().from_urlencoded(
+                "grant_type=authorization_code&code=a&code=b"
+            )
+
+    def test_repeated_values(self):
+        msg = DummyMessage().from_urlencoded(
+            "req_str=a&opt_str_list=x+y&extra=1&extra=2&other=3"
+        )
+        assert msg["opt_str_list"] == ["x", "y"]
+        assert msg["extra"] == ["1", "2"]
+        assert msg["other"] == "3"
+
+    def test_round_trip(self):
+        atr = AccessTokenRequest(
+            grant_type="authorization_code",
+            code="SplxlOBeZQQYbYS6WxSbIA",
+            redirect_uri="https://client.example.com/cb?a=b&c=d",
+            client_id="r\u00e4ksm\u00f6rg\u00e5s",
+        )
+        txt = atr.to_urlencoded()
+        assert txt == urlencode(atr.to_dict())
+        assert AccessTokenRequest().from_urlencoded(txt) == atr
+        assert AccessTokenRequest().from_urlencoded(txt.encode("ascii")) == atr
+
+
+class TestVerifyPlan(object):
+    class AllowedMessage(Message):
+        c_param = {
+            "req_str": SINGLE_REQUIRED_STRING,
+            "req_bool": ParamDefinition(bool, True, None, None, False),
+            "opt_str": SINGLE_OPTIONAL_STRING,
+            "opt_str_list": OPTIONAL_LIST_OF_STRINGS,
+        }
+        c_allowed_values = {"opt_str": ["a", "b"], "opt_str_list": ["x", "y"]}
+
+    def test_plan(self):
+        plan = self.AllowedMessage._verify_plan(self.AllowedMessage.c_allowed_values)
+        assert plan.required == (("req_str", False), ("req_bool", True))
+        assert plan.checks == (
+            ("opt_str", False, frozenset(["a", "b"])),
+            ("opt_str_list", True, frozenset(["x", "y"])),
+        )
+        assert self.AllowedMessage._verify_plan(plan.allowed) is plan
+
+    def test_verify(self):
+        msg = self.AllowedMessage(
+            req_str="foo", req_bool=False, opt_str="a", opt_str_list=["x", "y"]
+        )
+        assert msg.verify()
+
+    @pytest.mark.parametrize(
+        "args",
+        [
+            {"req_bool": True},
+            {"req_str": "foo"},
+            {"req_str": "", "req_bool": True},
+        ],
+    )
+    def test_missing_required(self, args):
+        msg = self.AllowedMessage()
+        msg._dict.update(args)
+        with pytest.raises(MissingRequiredAttribute):
+            msg.verify()
+
+    @pytest.mark.parametrize(
+        "args",
+        [{"opt_str": "c"}, {"opt_str_list": ["x", "z"]}, {"opt_str": ["a"]}],
+    )
+    def test_not_allowed(self, args):
+        msg = self.AllowedMessage(req_str="foo", req_bool=True)
+        msg._dict.update(args)
+        with pytest.raises(NotAllowedValue):
+            msg.verify()
+
+    def test_changed_allowed_values(self):
+        class ChangingMessage(TestVerifyPlan.AllowedMessage):
+            pass
+
+        msg = ChangingMessage(req_str="foo", req_bool=True, opt_str="c")
+        with pytest.raises(NotAllowedValue):
+            msg.verify()
+        ChangingMessage.c_allowed_values = {"opt_str": ["c"]}
+        assert msg.verify()
+
+
+class TestLazyMessage(object):
+    class CountingMessage(Message):
+        c_param = {
+            "req_str": SINGLE_REQUIRED_STRING,
+            "count": SINGLE_OPTIONAL_INT,
+            "opt_str_list": OPTIONAL_LIST_OF_STRINGS,
+            "opt_json": SINGLE_OPTIONAL_JSON,
+            "opt_msg_list": ParamDefinition([Message], False, None, None, False),
+        }
+
+    def test_deserialized_on_access(self):
+        deserialized = []
+
+        def deser(val, sformat="urlencoded"):
+            deserialized.append(val)
+            return json_deserializer(val, sformat)
+
+        class LazyMessage(Message):
+            c_param = {
+                "req_str": SINGLE_REQUIRED_STRING,
+                "opt_json": ParamDefinition(dict, False, None, deser, False),
+            }
+
+        msg = LazyMessage().from_dict(
+            {"req_str": "foo", "opt_json": '{"a": 1}'}, lazy=True
+        )
+        assert msg._lazy == {"opt_json": '{"a": 1}'}
+        assert msg["req_str"] == "foo"
+        assert deserialized == []
+        assert msg["opt_json"] == {"a": 1}
+        assert msg["opt_json"] == {"a": 1}
+        assert deserialized == ['{"a": 1}']
+        assert msg._lazy is None
+
+    def test_same_as_eager(self):
+        info = {
+            "req_str": "foo",
+            "count": "3",
+            "extra": "value",
+            "opt_str_list": "a b",
+            "opt_msg_list": [{"a": "b"}],
+            "opt_json": "",
+        }
+        lazy = self.CountingMessage().from_dict(info, lazy=True)
+        eager = self.CountingMessage().from_dict(info)
+        assert list(lazy.keys()) == list(eager.keys())
+        assert lazy.to_dict() == eager.to_dict()
+        assert lazy == eager
+
+    def test_verify_loads_all(self):
+        msg = self.CountingMessage().from_dict(
+            {"req_str": "foo", "count": "three"}, lazy=True
+        )
+        assert msg["req_str"] == "foo"
+        with pytest.raises(ParameterError):
+            msg.verify()
+
+    def test_skipped_value(self):
+        msg = self.CountingMessage().from_dict(
+            {"req_str": "foo", "opt_msg_list": []}, lazy=True
+        )
+        assert "opt_msg_list" not in msg
+        assert msg.get("opt_msg_list") is None
+        assert msg.to_dict() == {"req_str": "foo"}
+
+    def test_replaced_value(self):
+        msg = self.CountingMessage().from_dict(
+            {"req_str": "foo", "count": "3"}, lazy=True
+        )
+        msg["count"] = 4
+        assert msg._lazy is None
+        assert msg.to_dict() == {"req_str": "foo", "count": 4}
+
+    @pytest.mark.parametrize("value", [[], [None]])
+    def test_replaced_with_skipped_value(self, value):
+        msg = AuthorizationRequest().from_json(
+            '{"scope": "openid email", "client_id": "foobar"}', lazy=True
+        )
+        msg["scope"] = value
+        assert "scope" not in msg
+        with pytest.raises(KeyError):
+            msg["scope"]
+        assert len(msg) == 1
+        assert msg.to_dict() == {"client_id": "foobar"}
+
+    def test_deleted_value(self):
+        msg = self.CountingMessage().from_dict(
+            {"req_str": "foo", "count": "3"}, lazy=True
+        )
+        del msg["count"]
+        assert msg._lazy is None
+        assert msg.to_dict() == {"req_str": "foo"}
+
+    def test_copy(self):
+        msg = self.CountingMessage().from_dict(
+            {"req_str": "foo", "count": "3"}, lazy=True
+        )
+        for other in [msg.copy(), pickle.loads(pickle.dumps(msg))]:
+            assert other["count"] == 3
+            assert other._lazy is None
+        assert msg._lazy == {"count": "3"}
+
+
 def test_to_dict_with_message_obj():
     content = Message(a={"a": {"foo": {"bar": [{"bat": []}]}}})
     _dict = content.to_dict(lev=0)
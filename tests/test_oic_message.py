@@ -7,6 +7,7 @@ from urllib.parse import urlencode
 import pytest
 from freezegun import freeze_time
 from jwkest import BadSignature
+from jwkest.jwe import JWE
 from jwkest.jwk import SYMKey
 from jwkest.jws import left_hash
 
@@ -15,8 +16,10 @@ from oic.exception import MessageException
 from oic.exception import NotForMe
 from oic.oauth2.message import MissingRequiredAttribute
 from oic.oauth2.message import MissingRequiredValue
+from oic.oauth2.message import NotAllowedValue
 from oic.oauth2.message import WrongSigningAlgorithm
 from oic.oic.message import BACK_CHANNEL_LOGOUT_EVENT
+from oic.oic.message import SCOPE_CHARSET
 from oic.oic.message import AccessTokenResponse
 from oic.oic.message import AddressClaim
 from oic.oic.message import AtHashError
@@ -36,6 +39,7 @@ from oic.oic.message import RegistrationRequest
 from oic.oic.message import RegistrationResponse
 from oic.oic.message import VerificationError
 from oic.oic.message import address_deser
+from oic.oic.message import check_char_set
 from oic.oic.message import claims_deser
 from oic.oic.message import claims_ser
 from oic.oic.message import msg_ser
@@ -209,6 +213,13 @@ def test_claims_ser_json():
     )
 
 
+def test_check_char_set():
+    check_char_set("openid!#[]~", SCOPE_CHARSET)
+    for scope in ['a"b', "a\\b", "a b"]:
+        with pytest.raises(NotAllowedValue):
+            check_char_set(scope, SCOPE_CHARSET)
+
+
 class TestProviderConfigurationResponse(object):
     def test_deserialize(self):
         resp = {
@@ -1180,6 +1191,50 @@ def test_verify_token_encrypted():
     assert vidt.jwe_header == {"enc": "A128CBC-HS256", "alg": "RSA1_5", "cty": "JWT"}
 
 
+def test_verify_token_encrypted_decrypts_once(monkeypatch):
+    idt = IdToken(
+        sub="553df2bcf909104751cfd8b2",
+        aud=["5542958437706128204e0000", "554295ce3770612820620000"],
+        auth_time=1441364872,
+        azp="554295ce3770612820620000",
+    )
+    kj = KeyJar()
+    kb = KeyBundle()
+    kb.do_local_der(
+        os.path.join(os.path.dirname(__file__), "data", "keys", "cert.key"),
+        "some",
+        ["enc", "sig"],
+    )
+    kj.add_kb("", kb)
+    kj.add_kb("https://sso.qa.7pass.ctf.prosiebensat1.com", kb)
+
+    packer = JWT(
+        kj,
+        lifetime=3600,
+        iss="https://sso.qa.7pass.ctf.prosiebensat1.com",
+        encrypt=True,
+    )
+    _jws = packer.pack(**idt.to_dict())
+    msg = AuthorizationResponse(id_token=_jws)
+
+    calls = []
+    _decrypt = JWE.decrypt
+
+    def decrypt(self, *args, **kwargs):
+        calls.append(args)
+        return _decrypt(self, *args, **kwargs)
+
+    monkeypatch.setattr(JWE, "decrypt", decrypt)
+    vidt = verify_id_token(
+        msg,
+        keyjar=kj,
+        iss="https://sso.qa.7pass.ctf.prosiebensat1.com",
+        client_id="554295ce3770612820620000",
+    )
+    assert vidt["iss"] == "https://sso.qa.7pass.ctf.prosiebensat1.com"
+    assert len(calls) == 1
+
+
 def test_verify_token_encrypted_no_key():
     idt = IdToken(
         sub="553df2bcf909104751cfd8b2",
@@ -2,10 +2,13 @@ import datetime
 import json
 import logging
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from http.cookies import SimpleCookie
 from time import time
 from typing import Any
 from typing import Dict
+from typing import List
 from unittest.mock import Mock
 from unittest.mock import patch
 from urllib.parse import parse_qs
@@ -16,6 +19,8 @@ import responses
 from freezegun import freeze_time
 from jwkest.jwe import JWEException
 from jwkest.jwe import JWEnc
+from jwkest.jwk import SYMKey
+from jwkest.jws import BadSignature
 from requests import ConnectionError
 from requests.exceptions import MissingSchema
 from testfixtures import LogCapture
@@ -493,6 +498,65 @@ class TestProvider(object):
         atr = AccessTokenResponse().deserialize(resp.message, "json")
         assert _eq(atr.keys(), ["token_type", "id_token", "access_token", "scope"])
 
+    def test_code_grant_type_concurrent(self):
+        authreq = AuthorizationRequest(
+            state="state",
+            redirect_uri="http://example.com/authz",
+            client_id=CLIENT_ID,
+            response_type="code",
+            scope=["openid", "offline_access"],
+            prompt="consent",
+        )
+
+        _sdb = self.provider.sdb
+        sid = _sdb.access_token.key(user="sub", areq=authreq)
+        access_grant = _sdb.access_token(sid=sid)
+        ae = AuthnEvent("user", "salt")
+        _sdb[sid] = {
+            "oauth_state": "authz",
+            "authn_event": ae.to_json(),
+            "authzreq": authreq.to_json(),
+            "client_id": CLIENT_ID,
+            "code": access_grant,
+            "code_used": False,
+            "scope": ["openid", "offline_access"],
+            "redirect_uri": "http://example.com/authz",
+        }
+        _sdb.do_sub(sid, "client_salt")
+
+        areq = AccessTokenRequest(
+            code=access_grant,
+            client_id=CLIENT_ID,
+            redirect_uri="http://example.com/authz",
+            client_secret=CLIENT_SECRET,
+            grant_type="authorization_code",
+        )
+
+        # The second request exchanges the code while the first one is in its transaction
+        results: List[Any] = []
+        upgrade_to_token = _sdb.upgrade_to_token
+
+        def interleaved_upgrade(*args, **kwargs):
+            if not results:
+                results.append(None)
+                other = threading.Thread(
+                    target=lambda: results.append(self.provider.code_grant_type(areq))
+                )
+                other.start()
+                other.join()
+            return upgrade_to_token(*args, **kwargs)
+
+        with patch.object(_sdb, "upgrade_to_token", interleaved_upgrade):
+            first = self.provider.code_grant_type(areq)
+
+        err = TokenErrorResponse().deserialize(first.message, "json")
+        assert err["error"] == "access_denied"
+        atr = AccessTokenResponse().deserialize(results[1].message, "json")
+        assert "refresh_token" in atr
+        assert not _sdb.is_valid(atr["access_token"])
+        assert not _sdb.is_valid(atr["refresh_token"])
+        assert _sdb[sid]["revoked"]
+
     def test_code_grant_type_missing_code(self):
         # Construct Access token request
         areq = AccessTokenRequest(
@@ -776,6 +840,127 @@ class TestProvider(object):
         for key, value in claims.items():
             assert parsed[key] == value
 
+    def test_idtoken_signer_cached(self):
+        areq = AuthorizationRequest(
+            response_type="code",
+            client_id=CLIENT_ID,
+            redirect_uri="http://example.com/authz",
+            scope=["openid"],
+            state="state000",
+        )
+        sid = self.provider.sdb.create_authz_session(AuthnEvent("sub", "salt"), areq)
+        self.provider.sdb.do_sub(sid, "client_salt")
+        session = self.provider.sdb[sid]
+
+        self.provider.signer_cache.clear()
+        for _ in range(2):
+            id_token = self.provider.id_token_as_signed_jwt(session)
+            parsed = IdToken().from_jwt(id_token, keyjar=self.provider.keyjar)
+            assert parsed.jws_header["alg"] == "RS256"
+        assert len(self.provider.signer_cache) == 1
+        assert self.provider.id_token_signer(
+            "RS256", CLIENT_ID
+        ) is self.provider.id_token_signer("RS256", "number5")
+
+    def test_idtoken_signer_client_secret_change(self):
+        areq = AuthorizationRequest(
+            response_type="code",
+            client_id="client_hs",
+            redirect_uri="http://localhost:8087/authz",
+            scope=["openid"],
+            state="state000",
+        )
+        sid = self.provider.sdb.create_authz_session(AuthnEvent("sub", "salt"), areq)
+        self.provider.sdb.do_sub(sid, "client_salt")
+        session = self.provider.sdb[sid]
+        self.provider.cdb = {"client_hs": {"client_secret": "very_secret"}}
+
+        id_token = self.provider.id_token_as_signed_jwt(session, alg="HS256")
+        IdToken().from_jwt(id_token, key=[SYMKey(key="very_secret")])
+
+        self.provider.cdb["client_hs"]["client_secret"] = "even_more_secret"
+        id_token = self.provider.id_token_as_signed_jwt(session, alg="HS256")
+        IdToken().from_jwt(id_token, key=[SYMKey(key="even_more_secret")])
+        with pytest.raises(BadSignature):
+            IdToken().from_jwt(id_token, key=[SYMKey(key="very_secret")])
+
+    def test_idtoken_signer_key_rollover(self):
+        provider = Provider("FOOP", {}, {}, None, None, None, None, None)
+        provider.keyjar = KeyJar()
+        provider.keyjar[""] = keybundle_from_local_file(
+            os.path.join(BASE_PATH, "rsa.key"), "RSA", ["sig"]
+        )
+        provider.keyjar[""][0].keys()[0].kid = "old"
+        assert provider.id_token_signer("RS256", CLIENT_ID).kid == "old"
+
+        kb = keybundle_from_local_file(
+            os.path.join(BASE_PATH, "cert.key"), "RSA", ["sig"]
+        )
+        kb.keys()[0].kid = "new"
+        provider.do_key_rollover(json.loads(kb.jwks()), "b%d")
+        assert provider.id_token_signer("RS256", CLIENT_ID).kid == "new"
+
+    def test_sign_encrypt_id_tokens(self):
+        batch = []
+        for client_id in [CLIENT_ID, "number5", CLIENT_ID]:
+            areq = AuthorizationRequest(
+                response_type="code",
+                client_id=client_id,
+                redirect_uri="http://localhost:8087/authz",
+                scope=["openid"],
+                state="state000",
+                nonce="nonce_" + client_id,
+            )
+            sid = self.provider.sdb.create_authz_session(
+                AuthnEvent("sub", "salt"), areq
+            )
+            self.provider.sdb.do_sub(sid, "client_salt")
+            batch.append(
+                {
+                    "sinfo": self.provider.sdb[sid],
+                    "client_info": {},
+                    "areq": areq,
+                    "access_token": "access_" + client_id,
+                }
+            )
+
+        with ProcessPoolExecutor(2) as executor:
+            for _executor in [None, executor]:
+                id_tokens = self.provider.sign_encrypt_id_tokens(
+                    batch, executor=_executor, chunk_size=1
+                )
+                assert len(id_tokens) == 3
+                for item, id_token in zip(batch, id_tokens):
+                    idt = IdToken().from_jwt(id_token, keyjar=self.provider.keyjar)
+                    assert idt.jws_header["alg"] == "RS256"
+                    assert idt["aud"] == [item["areq"]["client_id"]]
+                    assert idt["nonce"] == "nonce_" + item["areq"]["client_id"]
+                    assert "at_hash" in idt
+
+    def test_sign_encrypt_id_tokens_default_alg(self):
+        areq = AuthorizationRequest(
+            response_type="code",
+            client_id=CLIENT_ID,
+            redirect_uri="http://localhost:8087/authz",
+            scope=["openid"],
+            state="state000",
+            nonce="nonce",
+        )
+        sid = self.provider.sdb.create_authz_session(AuthnEvent("sub", "salt"), areq)
+        self.provider.sdb.do_sub(sid, "client_salt")
+        item = {
+            "sinfo": self.provider.sdb[sid],
+            "client_info": {"id_token_signed_response_alg": ""},
+            "areq": areq,
+        }
+
+        id_token = self.provider.sign_encrypt_id_token(**item)
+        (batch_id_token,) = self.provider.sign_encrypt_id_tokens([item])
+        for _id_token in [id_token, batch_id_token]:
+            idt = IdToken().from_jwt(_id_token, keyjar=self.provider.keyjar)
+            assert idt.jws_header["alg"] == "RS256"
+            assert idt["nonce"] == "nonce"
+
     def test_userinfo_endpoint(self):
         self.cons.client_secret = "drickyoughurt"
         self.cons.config["response_type"] = ["token"]
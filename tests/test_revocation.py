@@ -0,0 +1,83 @@
+import pytest
+
+from oic.utils.revocation import BloomFilter
+from oic.utils.revocation import RevocationList
+from oic.utils.revocation import token_digest
+
+
+class TestBloomFilter(object):
+    def test_contains(self):
+        bloom = BloomFilter(capacity=100, error_rate=0.01)
+        digests = [token_digest("token{}".format(i)) for i in range(100)]
+        for digest in digests:
+            bloom.add(digest)
+
+        assert all(digest in bloom for digest in digests)
+        false_positives = sum(
+            token_digest("other{}".format(i)) in bloom for i in range(1000)
+        )
+        assert false_positives < 50
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            BloomFilter(capacity=0)
+        with pytest.raises(ValueError):
+            BloomFilter(error_rate=1)
+
+
+@pytest.fixture(params=[0, 100])
+def revoked(request):
+    return RevocationList(bloom_capacity=request.param)
+
+
+class TestRevocationList(object):
+    def test_add(self, revoked):
+        revoked.add("token1", 100)
+        revoked.add("token2")
+
+        assert "token1" in revoked
+        assert "token2" in revoked
+        assert "token3" not in revoked
+        assert len(revoked) == 2
+
+    def test_check_and_add(self, revoked):
+        assert revoked.check_and_add("token1", 100) is False
+        assert revoked.check_and_add("token1", 100) is True
+        assert "token1" in revoked
+        assert len(revoked) == 1
+
+    def test_remove_expired(self, revoked):
+        revoked.add("token1", 100)
+        revoked.add("token2", 200)
+        revoked.add("token3")
+
+        assert revoked.remove_expired(when=150) == 1
+        assert "token1" not in revoked
+        assert "token2" in revoked
+        assert "token3" in revoked
+        assert revoked.remove_expired(when=150) == 0
+
+    def test_serialize(self, revoked):
+        revoked.add("token1", 100)
+        revoked.add("token2")
+
+        other = RevocationList(bloom_capacity=10).from_json(revoked.to_json())
+        assert "token1" in other
+        assert "token2" in other
+        assert "token3" not in other
+
+    def test_save_load(self, revoked, tmp_path):
+        path = str(tmp_path / "revoked.json")
+        revoked.add("token1", 100)
+        revoked.save(path)
+
+        assert "token1" in RevocationList().load(path)
+
+    def test_update(self, revoked):
+        other = RevocationList()
+        other.add("token1", 100)
+        revoked.add("token2")
+        revoked.update(other)
+
+        assert "token1" in revoked
+        assert "token2" in revoked
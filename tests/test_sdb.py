@@ -1,27 +1,43 @@
 import base64
+import copy
 import datetime
 import hashlib
 import hmac
 import json
+import os
 import random
+import tempfile
+import threading
 import time
+from typing import Any
 from unittest import TestCase
 
 import pytest
+from cryptography.fernet import InvalidToken
 from freezegun import freeze_time
 
 from oic.oic.message import AuthorizationRequest
 from oic.oic.message import OpenIDRequest
+from oic.utils.cache import LRUCache
 from oic.utils.sdb import AccessCodeUsed
 from oic.utils.sdb import AuthnEvent
 from oic.utils.sdb import Crypt
 from oic.utils.sdb import DefaultToken
 from oic.utils.sdb import DictRefreshDB
 from oic.utils.sdb import ExpiredToken
+from oic.utils.sdb import ParsedToken
+from oic.utils.sdb import SessionConflict
 from oic.utils.sdb import SessionDB
 from oic.utils.sdb import WrongTokenType
 from oic.utils.sdb import create_session_db
 from oic.utils.session_backend import DictSessionBackend
+from oic.utils.session_backend import IndexedSessionBackend
+from oic.utils.session_backend import SessionBackend
+from oic.utils.session_backend import SessionRecord
+from oic.utils.session_backend import ShardedSessionBackend
+from oic.utils.session_backend import SQLSessionBackend
+from oic.utils.session_backend import session_authn_event
+from oic.utils.session_backend import session_authzreq
 from oic.utils.time_util import utc_time_sans_frac
 
 __author__ = "rohe0002"
@@ -179,12 +195,140 @@ class TestToken(object):
         when = time.time() + 5  # 5 seconds from now
         assert factory.is_expired(token, when=when) is True
 
+    def test_parse_decrypts_once(self, monkeypatch):
+        factory = DefaultToken(
+            "secret", "password", typ="T", lifetime=60, parsed_tokens=LRUCache()
+        )
+        token = factory(sid="abc")
+        calls = []
+        decrypt = factory.crypt.decrypt
+
+        def counting_decrypt(txt):
+            calls.append(txt)
+            return decrypt(txt)
+
+        monkeypatch.setattr(factory.crypt, "decrypt", counting_decrypt)
+
+        parsed = factory.parse(token)
+        assert factory.type_and_key(token) == ("T", "abc")
+        assert factory.expires_at(token) == parsed.iat + 60
+        assert not factory.is_expired(token)
+        assert len(calls) == 1
+
+    def test_parse_other_password(self):
+        cache = LRUCache()
+        token = DefaultToken("secret", "password", parsed_tokens=cache)(sid="abc")
+        other = DefaultToken("secret", "other", parsed_tokens=cache)
+        with pytest.raises(InvalidToken):
+            other.parse(token)
+
+    def test_type_in_front(self):
+        factory = DefaultToken("secret", "password", typ="T", parsed_tokens=LRUCache())
+        token = factory(sid="abc")
+
+        assert token.startswith("T_")
+        assert factory.peek_type(token) == "T"
+        assert factory.peek_type("a.b_c") is None
+        assert factory.type_and_key(token) == ("T", "abc")
+
+    def test_type_in_front_changed(self):
+        factory = DefaultToken("secret", "password", typ="T", parsed_tokens=LRUCache())
+        token = factory(sid="abc")
+
+        with pytest.raises(InvalidToken):
+            factory.parse("R" + token[1:])
+
+    def test_without_type_in_front(self):
+        factory = DefaultToken("secret", "password", typ="T", parsed_tokens=LRUCache())
+        token = factory(sid="abc")[2:]
+
+        assert factory.peek_type(token) is None
+        assert factory.type_and_key(token) == ("T", "abc")
+
+    def test_aead_codec(self):
+        factory = DefaultToken(
+            "secret", "password", typ="T", codec="aead", parsed_tokens=LRUCache()
+        )
+        fernet = DefaultToken("secret", "password", typ="T", parsed_tokens=LRUCache())
+        token = factory(sid="abc")
+
+        assert token.startswith("T_")
+        assert len(token) < len(fernet(sid="abc"))
+        assert factory(sid="abc") != token
+        assert factory.peek_type(token) == "T"
+        assert factory.type_and_key(token) == ("T", "abc")
+
+    def test_aead_codec_type_changed(self):
+        factory = DefaultToken(
+            "secret", "password", typ="T", codec="aead", parsed_tokens=LRUCache()
+        )
+        token = factory(sid="abc")
+
+        with pytest.raises(InvalidToken):
+            factory.parse("R" + token[1:])
+        with pytest.raises(InvalidToken):
+            factory.parse(token[2:])
+
+    def test_aead_codec_other_password(self):
+        token = DefaultToken("secret", "password", codec="aead")(sid="abc")
+        other = DefaultToken("secret", "other", codec="aead")
+        with pytest.raises(InvalidToken):
+            other.parse(token)
+
+    def test_unknown_codec(self):
+        with pytest.raises(ValueError):
+            DefaultToken("secret", "password", codec="rot13")
+
+    def test_codec_migration(self):
+        cache = LRUCache()
+        fernet = DefaultToken("secret", "password", typ="T", parsed_tokens=cache)
+        aead = DefaultToken(
+            "secret", "password", typ="T", codec="aead", parsed_tokens=cache
+        )
+        migrating = DefaultToken(
+            "secret",
+            "password",
+            typ="T",
+            codec="aead",
+            migrate=True,
+            parsed_tokens=cache,
+        )
+        old, new = fernet(sid="abc"), aead(sid="def")
+
+        assert migrating.type_and_key(old) == ("T", "abc")
+        assert migrating.type_and_key(new) == ("T", "def")
+        assert migrating(sid="ghi") != fernet(sid="ghi")
+        with pytest.raises(InvalidToken):
+            aead.parse(old)
+        with pytest.raises(InvalidToken):
+            fernet.parse(new)
+
+    def test_create_session_db_aead(self):
+        sdb = create_session_db(
+            "https://example.com/", "secret", "password", token_codec="aead"
+        )
+        sid = sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        sdb.do_sub(sid, "client_salt")
+        _dict = sdb.upgrade_to_token(sdb[sid]["code"], issue_refresh=True)
+
+        assert sdb.access_token.codec == "aead"
+        assert sdb.parse_token(_dict["access_token"]).sid == sid
+        assert sdb.is_valid(_dict["access_token"])
+        _dict = sdb.refresh_token(_dict["refresh_token"], AREQ["client_id"])
+        assert sdb.parse_token(_dict["access_token"]).sid == sid
+
+    def test_parsed_token_expired(self):
+        parsed = ParsedToken("T", "abc", 100, 160)
+        assert parsed.is_expired(when=161)
+        assert not parsed.is_expired(when=160)
+        assert not ParsedToken("T", "abc", None, None).is_expired()
+
 
 class TestSessionBackend(TestCase):
     """Unittests for SessionBackend - using the DictSessionBackend."""
 
     def setUp(self):
-        self.backend = DictSessionBackend()
+        self.backend: SessionBackend = DictSessionBackend()
 
     def test_setitem(self):
         self.backend["key"] = {"foobar": "value"}
@@ -201,8 +345,23 @@ class TestSessionBackend(TestCase):
     def test_delitem(self):
         self.backend["key"] = {"foobar": "value"}
         del self.backend["key"]
+        assert isinstance(self.backend, DictSessionBackend)
         self.assertEqual(self.backend.storage, {})
 
+    def test_versioned(self):
+        self.assertTrue(self.backend.set_versioned("key", {"foobar": "value"}, None))
+        self.assertFalse(self.backend.set_versioned("key", {"foobar": "other"}, None))
+        value, version = self.backend.get_versioned("key")
+        self.assertEqual(value, {"foobar": "value"})
+
+        value["foobar"] = "new_value"
+        self.assertEqual(self.backend["key"], {"foobar": "value"})
+        self.assertTrue(self.backend.set_versioned("key", value, version))
+        self.assertFalse(self.backend.set_versioned("key", {"foobar": "old"}, version))
+        self.assertEqual(self.backend["key"], {"foobar": "new_value"})
+        with self.assertRaises(KeyError):
+            self.backend.get_versioned("missing")
+
     def test_contains(self):
         self.backend["key"] = {"foobar": "value"}
         self.assertTrue("key" in self.backend)
@@ -346,6 +505,469 @@ class TestSessionBackend(TestCase):
         assert self.backend.get_uid_by_sid("key") == "my_uid"
 
 
+class TestIndexedSessionBackend(TestSessionBackend):
+    """Unittests for SessionBackend - using the IndexedSessionBackend."""
+
+    def setUp(self):
+        self.backend = IndexedSessionBackend(indexed_attributes=["state"])
+
+    def test_reindex_on_setitem(self):
+        self.backend["session_id"] = {"sub": "my_sub", "client_id": "client"}
+        self.backend["session_id"] = {"sub": "other_sub", "client_id": "client"}
+        self.assertEqual(self.backend.get_by_sub("my_sub"), [])
+        self.assertEqual(self.backend.get_by_sub("other_sub"), ["session_id"])
+        self.assertEqual(self.backend.get("client_id", "client"), ["session_id"])
+
+    def test_reindex_on_update(self):
+        aevent = AuthnEvent("my_uid", "some_salt").to_json()
+        self.backend["session_id"] = {"authn_event": aevent}
+        self.backend.update("session_id", "sub", "my_sub")
+        self.backend.update(
+            "session_id", "authn_event", AuthnEvent("new", "s").to_json()
+        )
+        self.assertEqual(self.backend.get_by_sub("my_sub"), ["session_id"])
+        self.assertEqual(self.backend.get_by_uid("my_uid"), [])
+        self.assertEqual(self.backend.get_by_uid("new"), ["session_id"])
+
+    def test_unindex_on_delitem(self):
+        aevent = AuthnEvent("my_uid", "some_salt").to_json()
+        self.backend["session_id"] = {"authn_event": aevent, "sub": "my_sub"}
+        del self.backend["session_id"]
+        self.assertEqual(self.backend.get_by_uid("my_uid"), [])
+        self.assertEqual(self.backend.get_by_sub("my_sub"), [])
+        assert isinstance(self.backend, IndexedSessionBackend)
+        self.assertEqual(self.backend._uid_index, {})
+        self.assertEqual(self.backend._attr_index["sub"], {})
+
+    def test_get_registered_attribute(self):
+        self.backend["session_id"] = {"state": "state000"}
+        self.assertEqual(self.backend.get("state", "state000"), ["session_id"])
+
+    def test_register_index(self):
+        assert isinstance(self.backend, IndexedSessionBackend)
+        self.backend["session_id"] = {"nonce": "abc"}
+        self.backend.register_index("nonce")
+        self.assertEqual(self.backend.get("nonce", "abc"), ["session_id"])
+        self.backend["session_id2"] = {"nonce": "abc"}
+        self.assertEqual(
+            set(self.backend.get("nonce", "abc")), {"session_id", "session_id2"}
+        )
+
+    def test_get_unindexed_attribute(self):
+        scope: Any = ["openid"]
+        self.backend["session_id"] = {"scope": scope, "code": "abc"}
+        self.assertEqual(self.backend.get("code", "abc"), ["session_id"])
+        self.assertEqual(self.backend.get("scope", scope), ["session_id"])
+
+    def test_get_uid_by_sid(self):
+        authn_event: Any = {"uid": "my_uid", "salt": "salt"}
+        self.backend["session_id"] = {"authn_event": authn_event, "sub": "my_sub"}
+        self.assertEqual(self.backend.get_uid_by_sid("session_id"), "my_uid")
+        self.assertEqual(self.backend.get_uid_by_sub("my_sub"), "my_uid")
+        with self.assertRaises(KeyError):
+            self.backend.get_uid_by_sid("missing")
+
+
+class TestSQLSessionBackend(TestSessionBackend):
+    """Unittests for SessionBackend - using the SQLSessionBackend."""
+
+    def setUp(self):
+        self.backend = SQLSessionBackend()
+
+    def test_delitem(self):
+        self.backend["key"] = {"foobar": "value"}
+        del self.backend["key"]
+        self.assertFalse("key" in self.backend)
+        with self.assertRaises(KeyError):
+            del self.backend["key"]
+
+    def test_get_attribute(self):
+        self.backend["session_id"] = {"client_id": "client", "state": "state000"}
+        self.assertEqual(self.backend.get("client_id", "client"), ["session_id"])
+        self.assertEqual(self.backend.get("state", "state000"), ["session_id"])
+        self.assertEqual(self.backend.get("state", "missing"), [])
+
+    def test_get_uid_by_sub(self):
+        aevent = AuthnEvent("my_uid", "some_salt").to_json()
+        self.backend["session_id"] = {"authn_event": aevent, "sub": "my_sub"}
+        self.assertEqual(self.backend.get_uid_by_sub("my_sub"), "my_uid")
+        self.assertEqual(self.backend.get_uid_by_sid("session_id"), "my_uid")
+        self.assertIsNone(self.backend.get_uid_by_sub("missing"))
+
+    def test_delete_many(self):
+        for i in range(1200):
+            self.backend["session_id{}".format(i)] = {"client_id": "client"}
+        self.backend.delete_many("session_id{}".format(i) for i in range(1100))
+        self.assertEqual(len(self.backend.get("client_id", "client")), 100)
+
+    def test_remove_expired(self):
+        backend = SQLSessionBackend(lifetime=60)
+        backend["session_id"] = {"client_id": "client"}
+        self.assertEqual(backend.remove_expired(), 0)
+        self.assertEqual(backend.remove_expired(when=time.time() + 120), 1)
+        self.assertFalse("session_id" in backend)
+
+    def test_remove_expired_no_lifetime(self):
+        assert isinstance(self.backend, SQLSessionBackend)
+        self.backend["session_id"] = {"client_id": "client"}
+        self.assertEqual(self.backend.remove_expired(when=time.time() + 120), 0)
+        self.assertTrue("session_id" in self.backend)
+
+    def test_shared_database(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "sessions.db")
+            backend1 = SQLSessionBackend(path)
+            backend2 = SQLSessionBackend(path)
+            aevent = AuthnEvent("my_uid", "some_salt").to_json()
+            backend1["session_id"] = {"authn_event": aevent, "client_id": "client"}
+            self.assertEqual(backend2.get_by_uid("my_uid"), ["session_id"])
+            del backend2["session_id"]
+            self.assertFalse("session_id" in backend1)
+
+    def test_invalid_table_name(self):
+        with self.assertRaises(ValueError):
+            SQLSessionBackend(table="sessions; DROP TABLE x")
+
+
+class TestBinarySQLSessionBackend(TestSQLSessionBackend):
+    """Unittests for SessionBackend - using the SQLSessionBackend storing SessionRecords."""
+
+    def setUp(self):
+        self.backend = SQLSessionBackend(binary=True)
+
+    def test_stored_binary(self):
+        scope: Any = ["openid"]
+        self.backend["key"] = {"client_id": "client", "scope": scope}
+        value = self.backend["key"]
+        self.assertIsInstance(value, SessionRecord)
+        self.assertEqual(value, {"client_id": "client", "scope": ["openid"]})
+
+    def test_read_json(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "sessions.db")
+            SQLSessionBackend(path)["key"] = {"client_id": "client"}
+            backend = SQLSessionBackend(path, binary=True)
+            self.assertEqual(backend["key"], {"client_id": "client"})
+            backend.update("key", "sub", "sub")
+            self.assertEqual(
+                SQLSessionBackend(path)["key"], {"client_id": "client", "sub": "sub"}
+            )
+
+
+class TestSessionRecord(object):
+    def test_mapping(self):
+        record = SessionRecord(client_id="client", extra="value")
+        record["revoked"] = False
+
+        assert record == {"client_id": "client", "extra": "value", "revoked": False}
+        assert "client_id" in record and "sub" not in record and "other" not in record
+        assert len(record) == 3
+        assert record.get("sub") is None
+        del record["extra"]
+        del record["client_id"]
+        assert dict(record) == {"revoked": False}
+        with pytest.raises(KeyError):
+            del record["client_id"]
+        with pytest.raises(KeyError):
+            record["other"]
+
+    def test_no_dict(self):
+        with pytest.raises(AttributeError):
+            SessionRecord().__dict__
+
+    def test_copy(self):
+        record = SessionRecord(scope=["openid"], other={"a": 1})
+        assert copy.deepcopy(record) == record
+        assert copy.copy(record) == record
+        assert isinstance(record.copy(), SessionRecord)
+        assert copy.deepcopy(record)["scope"] is not record["scope"]
+
+    def test_authn_event_decoded_once(self):
+        record = SessionRecord(authn_event=AuthnEvent("uid", "salt").to_json())
+        authn_event = session_authn_event(record)
+
+        assert authn_event.uid == "uid"
+        assert session_authn_event(record) is authn_event
+        assert session_authn_event(record.copy()) is authn_event
+        record["authn_event"] = AuthnEvent("other", "salt").to_json()
+        assert session_authn_event(record).uid == "other"
+        assert session_authn_event(dict(record)).uid == "other"
+
+    def test_authzreq_decoded_once(self):
+        record = SessionRecord(authzreq=AREQ.to_json())
+        assert session_authzreq(record)["client_id"] == AREQ["client_id"]
+        assert session_authzreq(record) is session_authzreq(record)
+
+    def test_bytes(self):
+        record = SessionRecord(
+            code="code",
+            code_used=False,
+            revoked=True,
+            id_token=None,
+            scope=["openid", "email"],
+            authzreq=AREQ.to_json(),
+            expires_at=1500000000,
+            large=2 ** 70,
+            name="Jöhn",
+        )
+        data = record.to_bytes()
+
+        assert SessionRecord.from_bytes(data) == record
+        assert len(data) < len(json.dumps(dict(record)))
+        with pytest.raises(ValueError):
+            SessionRecord.from_bytes(b"{}")
+
+
+class TestShardedSessionBackend(TestSessionBackend):
+    """Unittests for SessionBackend - using the ShardedSessionBackend."""
+
+    def setUp(self):
+        self.shards = [DictSessionBackend() for _ in range(4)]
+        self.backend = ShardedSessionBackend(self.shards)
+
+    def test_delitem(self):
+        self.backend["key"] = {"foobar": "value"}
+        del self.backend["key"]
+        self.assertFalse("key" in self.backend)
+        with self.assertRaises(KeyError):
+            del self.backend["key"]
+
+    def test_spread(self):
+        backend = ShardedSessionBackend(self.shards)
+        for i in range(400):
+            backend["session_id{}".format(i)] = {"client_id": "client"}
+        sizes = [len(shard.storage) for shard in self.shards]
+        self.assertEqual(sum(sizes), 400)
+        self.assertTrue(all(size > 40 for size in sizes))
+        self.assertEqual(len(backend.get("client_id", "client")), 400)
+        self.assertTrue(
+            "session_id7" in self.shards[backend.shard_index("session_id7")]
+        )
+
+    def test_added_shard(self):
+        keys = ["session_id{}".format(i) for i in range(400)]
+        four = ShardedSessionBackend(self.shards)
+        five = ShardedSessionBackend(self.shards + [DictSessionBackend()])
+        moved = [key for key in keys if four.shard_index(key) != five.shard_index(key)]
+        self.assertTrue(all(five.shard_index(key) == 4 for key in moved))
+        self.assertLess(len(moved), 160)
+
+    def test_routing(self):
+        backend = ShardedSessionBackend(self.shards)
+        aevent = AuthnEvent("my_uid", "some_salt").to_json()
+        for i in range(20):
+            backend["session_id{}".format(i)] = {"authn_event": aevent, "sub": "sub"}
+        backend["other"] = {"authn_event": AuthnEvent("other", "salt").to_json()}
+        self.assertEqual(backend.routing["uid:my_uid"]["shards"], [0, 1, 2, 3])
+        self.assertEqual(
+            backend.routing["uid:other"]["shards"], [backend.shard_index("other")]
+        )
+
+    def test_shared_routing(self):
+        # Two workers using the same shards and routing index
+        backend = ShardedSessionBackend(self.shards)
+        other = ShardedSessionBackend(self.shards, routing=backend.routing)
+        aevent = AuthnEvent("my_uid", "some_salt").to_json()
+        other["session_id"] = {"authn_event": aevent, "sub": "my_sub"}
+        backend["session_id2"] = {"authn_event": aevent, "sub": "my_sub"}
+        self.assertEqual(
+            set(backend.get_by_uid("my_uid")), {"session_id", "session_id2"}
+        )
+        self.assertEqual(set(other.get_by_sub("my_sub")), {"session_id", "session_id2"})
+
+    def test_routed_cache_bounded(self):
+        backend = ShardedSessionBackend(self.shards, routed_cache_size=2)
+        for i in range(5):
+            aevent = AuthnEvent("uid{}".format(i), "some_salt").to_json()
+            backend["session_id{}".format(i)] = {"authn_event": aevent}
+        self.assertEqual(len(backend._routed), 2)
+        # An entry no longer remembered is found in the routing index
+        backend["session_id0"] = {"authn_event": AuthnEvent("uid0", "salt").to_json()}
+        self.assertEqual(backend.get_by_uid("uid0"), ["session_id0"])
+        self.assertEqual(
+            backend.routing["uid:uid0"]["shards"], [backend.shard_index("session_id0")]
+        )
+
+    def test_session_db(self):
+        sdb = create_session_db(
+            "https://example.com/", "secret", "password", db=self.backend
+        )
+        with sdb.transaction():
+            sid = sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+            sub = sdb.do_sub(sid, "client_salt")
+        _dict = sdb.upgrade_to_token(sdb[sid]["code"])
+
+        self.assertTrue(sdb.is_valid(_dict["access_token"]))
+        self.assertEqual(sdb.get_by_sub(sub), [sid])
+        self.assertEqual(sdb.get_by_uid("uid"), [sid])
+
+    def test_sql_shards(self):
+        backend = ShardedSessionBackend(
+            [SQLSessionBackend() for _ in range(3)], routing=SQLSessionBackend()
+        )
+        aevent = AuthnEvent("my_uid", "some_salt").to_json()
+        for i in range(10):
+            backend["session_id{}".format(i)] = {
+                "authn_event": aevent,
+                "client_id": "client{}".format(i),
+            }
+        self.assertEqual(len(backend.get_by_uid("my_uid")), 10)
+        self.assertEqual(
+            sorted(backend.get_client_ids_for_uid("my_uid")),
+            sorted("client{}".format(i) for i in range(10)),
+        )
+        backend.delete_many("session_id{}".format(i) for i in range(5))
+        self.assertEqual(len(backend.get_by_uid("my_uid")), 5)
+
+
+class CountingBackend(DictSessionBackend):
+    """DictSessionBackend counting the backend round trips."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+        self.writes = 0
+
+    def get_versioned(self, key):
+        self.reads += 1
+        return super().get_versioned(key)
+
+    def __getitem__(self, key):
+        self.reads += 1
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self.writes += 1
+        super().__setitem__(key, value)
+
+
+class TestSessionDBTransaction(object):
+    @pytest.fixture(autouse=True)
+    def create_sdb(self):
+        self.backend = CountingBackend()
+        self.sdb = create_session_db(
+            "https://example.com/", "secret", "password", db=self.backend
+        )
+
+    def test_code_exchange(self):
+        with self.sdb.transaction():
+            sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+            self.sdb.do_sub(sid, "client_salt")
+        assert self.backend.writes == 1
+
+        self.backend.reads = self.backend.writes = 0
+        with self.sdb.transaction():
+            grant = self.sdb[sid]["code"]
+            _dict = self.sdb.upgrade_to_token(grant)
+            self.sdb.update_by_token(grant, "id_token", "id_token")
+        assert (self.backend.reads, self.backend.writes) == (1, 1)
+        assert self.backend.storage[sid]["access_token"] == _dict["access_token"]
+        assert self.backend.storage[sid]["id_token"] == "id_token"
+        assert self.sdb.is_valid(_dict["access_token"])
+
+    def test_nothing_written_on_error(self):
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        with pytest.raises(ValueError):
+            with self.sdb.transaction():
+                self.sdb.update(sid, "sub", "sub")
+                raise ValueError()
+        assert "sub" not in self.backend.storage[sid]
+
+    def test_nested(self):
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        with self.sdb.transaction():
+            with self.sdb.transaction():
+                self.sdb.update(sid, "sub", "sub")
+            assert "sub" not in self.backend.storage[sid]
+        assert self.backend.storage[sid]["sub"] == "sub"
+
+    def test_conflict(self):
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        with pytest.raises(SessionConflict):
+            with self.sdb.transaction():
+                self.sdb.update(sid, "sub", "sub")
+                # Stored by someone else meanwhile
+                self.backend.update(sid, "revoked", True)
+        assert self.backend.storage[sid]["revoked"] is True
+        assert "sub" not in self.backend.storage[sid]
+
+    def test_delete(self):
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        with self.sdb.transaction():
+            del self.sdb[sid]
+            with pytest.raises(KeyError):
+                self.sdb[sid]
+            assert sid in self.backend.storage
+        assert sid not in self.backend.storage
+
+    def test_other_threads_not_affected(self):
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        seen = []
+        with self.sdb.transaction():
+            self.sdb.update(sid, "sub", "sub")
+            thread = threading.Thread(target=lambda: seen.append(self.sdb[sid]))
+            thread.start()
+            thread.join()
+        assert "sub" not in seen[0]
+
+
+class TestSessionDBGarbageCollection(object):
+    @pytest.fixture(autouse=True)
+    def create_sdb(self):
+        self.backend = DictSessionBackend()
+        self.sdb = create_session_db(
+            "https://example.com/", "secret", "password", db=self.backend
+        )
+        self.now = utc_time_sans_frac()
+
+    def test_expired_code(self):
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+
+        # The authentication is valid for an hour
+        assert self.sdb.gc_step(when=self.now + 1200) == 0
+        assert sid in self.backend
+        assert self.sdb.gc_step(when=self.now + 3700) == 1
+        assert sid not in self.backend
+        assert self.sdb.gc_step(when=self.now + 3700) == 0
+
+    def test_refresh_token_kept(self):
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        self.sdb.do_sub(sid, "client_salt")
+        self.sdb.upgrade_to_token(self.sdb[sid]["code"], issue_refresh=True)
+        storage = self.sdb.token_factory["refresh_token"].token_storage
+
+        assert self.sdb.gc_step(when=self.now + 7200) == 0
+        assert sid in self.backend and sid in storage
+        assert self.sdb.gc_step(when=self.now + 86500) == 1
+        assert sid not in self.backend and sid not in storage
+
+    def test_budget(self):
+        for _ in range(5):
+            self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+
+        assert self.sdb.gc_step(budget=2, when=self.now + 3700) == 2
+        assert self.sdb.gc_step(budget=2, when=self.now + 3700) == 2
+        assert self.sdb.gc_step(budget=2, when=self.now + 3700) == 1
+        assert len(self.backend.storage) == 0
+
+    def test_extended_elsewhere(self):
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        # Another worker exchanged the code and issued a refresh token
+        other = create_session_db(
+            "https://example.com/", "secret", "password", db=self.backend
+        )
+        other.upgrade_to_token(self.sdb[sid]["code"], issue_refresh=True)
+
+        assert self.sdb.gc_step(when=self.now + 3700) == 0
+        assert sid in self.backend
+        assert self.sdb.gc_step(when=self.now + 86500) == 1
+
+    def test_removed_session(self):
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        del self.sdb[sid]
+        assert self.sdb.gc_step(when=self.now + 3700) == 0
+
+
 class TestSessionDB(object):
     @pytest.fixture(autouse=True)
     def create_sdb(self, session_db_factory):
@@ -560,6 +1182,52 @@ class TestSessionDB(object):
         except KeyError:
             pass
 
+    def test_parse_token(self):
+        ae = AuthnEvent("uid", "salt")
+        sid = self.sdb.create_authz_session(ae, AREQ)
+        self.sdb[sid]["sub"] = "sub"
+        grant = self.sdb[sid]["code"]
+        sinfo = self.sdb.upgrade_to_token(grant, issue_refresh=True)
+
+        parsed = self.sdb.parse_token(grant)
+        assert (parsed.type, parsed.sid) == ("A", sid)
+        assert parsed.expires_at == parsed.iat + 600
+        # Expiry is that of the factory for the type, not of the first one decoding it
+        parsed = self.sdb.parse_token(sinfo["access_token"])
+        assert (parsed.type, parsed.sid) == ("T", sid)
+        assert parsed.expires_at == parsed.iat + 3600
+        parsed = self.sdb.parse_token(sinfo["refresh_token"])
+        assert parsed.type == "R"
+        assert parsed.expires_at == parsed.iat + 86400
+
+        with pytest.raises(KeyError):
+            self.sdb.parse_token("not a token")
+
+    def test_parse_token_dispatch(self, monkeypatch):
+        ae = AuthnEvent("uid", "salt")
+        sid = self.sdb.create_authz_session(ae, AREQ)
+        self.sdb[sid]["sub"] = "sub"
+        grant = self.sdb[sid]["code"]
+        sinfo = self.sdb.upgrade_to_token(grant, issue_refresh=True)
+        parsed = []
+
+        def recording_parse(name, parse):
+            def _parse(token):
+                parsed.append(name)
+                return parse(token)
+
+            return _parse
+
+        for name, factory in self.sdb.token_factory.items():
+            monkeypatch.setattr(factory, "parse", recording_parse(name, factory.parse))
+
+        assert self.sdb.parse_token(sinfo["refresh_token"]).type == "R"
+        assert parsed == ["refresh_token"]
+        del parsed[:]
+        with pytest.raises(KeyError):
+            self.sdb.parse_token("T" + sinfo["refresh_token"][1:])
+        assert parsed == ["access_token"]
+
     def test_is_valid_refresh_db(self):
         refresh_db = DictRefreshDB()
         token = refresh_db.create_token(
@@ -1,3 +1,6 @@
+import threading
+
+from oic.utils.revocation import RevocationList
 from oic.utils.stateless import StateLess
 
 __author__ = "roland"
@@ -26,3 +29,67 @@ def test_update_to_access_token():
     tok = st.create_authz_session("subject", {"redirect_uri": "https://example.com"})
     assert tok["aud"] == "https://example.com"
     assert tok["sub"] == "subject"
+
+
+def test_revoke_token():
+    keys = {"oct": ["symmetric key123"]}
+    st = StateLess(keys, enc_alg="A128KW", enc_method="A128CBC-HS256")
+    con = st.upgrade_to_token(
+        st.create_authz_session("subject", {"redirect_uri": "https://example.com"})
+    )
+    tok = st.get_token(con)
+
+    assert st.is_valid(tok)
+    assert not st.is_revoked(tok)
+    st.revoke_token(tok)
+    assert st.is_revoked(tok)
+    assert not st.is_valid(tok)
+
+
+def test_shared_revocation_list():
+    keys = {"oct": ["symmetric key123"]}
+    revoked = RevocationList(bloom_capacity=100)
+    workers = [
+        StateLess(keys, enc_alg="A128KW", enc_method="A128CBC-HS256", revoked=revoked)
+        for _ in range(2)
+    ]
+    con = workers[0].create_authz_session(
+        "subject", {"redirect_uri": "https://example.com"}
+    )
+    tok = workers[0].get_token(con)
+
+    workers[0].revoke_token(tok)
+    assert workers[1].is_revoked(tok)
+
+
+def test_use_grant():
+    keys = {"oct": ["symmetric key123"]}
+    st = StateLess(keys, enc_alg="A128KW", enc_method="A128CBC-HS256")
+    tok = st.get_token(
+        st.create_authz_session("subject", {"redirect_uri": "https://example.com"})
+    )
+
+    assert st.use_grant(tok)
+    assert not st.use_grant(tok)
+
+
+def test_use_grant_concurrent():
+    keys = {"oct": ["symmetric key123"]}
+    st = StateLess(keys, enc_alg="A128KW", enc_method="A128CBC-HS256")
+    tok = st.get_token(
+        st.create_authz_session("subject", {"redirect_uri": "https://example.com"})
+    )
+
+    barrier = threading.Barrier(8)
+    results = []
+
+    def use():
+        barrier.wait()
+        results.append(st.use_grant(tok))
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [False] * 7 + [True]
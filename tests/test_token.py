@@ -141,6 +141,13 @@ class TestToken(object):
 
         assert _jwt
 
+    def test_peek_type(self):
+        _jwt = self.access_token(rndstr(32), sinfo=SESSION_INFO, kid="sign1")
+
+        assert self.access_token.peek_type(_jwt) == "T"
+        assert self.access_token.peek_type("T_abc") is None
+        assert self.access_token.peek_type("a.b.c") is None
+
 
 class TestToken2(object):
     @pytest.fixture(autouse=True)
@@ -0,0 +1,127 @@
+import pytest
+
+from oic.oic.message import AuthorizationRequest
+from oic.utils.sdb import AuthnEvent
+from oic.utils.sdb import ExpiredToken
+from oic.utils.sdb import create_session_db
+from oic.utils.token_family import RefreshTokenFamilies
+
+AREQ = AuthorizationRequest(
+    response_type="code",
+    client_id="client1",
+    redirect_uri="http://example.com/authz",
+    scope=["openid", "offline_access"],
+    state="state000",
+)
+
+
+class TestRefreshTokenFamilies(object):
+    def test_issue(self):
+        families = RefreshTokenFamilies()
+        sinfo = {"client_id": "client1", "revoked": False}
+        families.issue("sid", "R_1", sinfo)
+
+        assert families["sid"] == sinfo
+        assert families["sid"] is not sinfo
+        assert families.is_active("sid", "R_1")
+        assert not families.is_active("sid", "R_other")
+        assert len(families) == 1
+        with pytest.raises(KeyError):
+            families.is_active("other", "R_1")
+
+    def test_rotation(self):
+        families = RefreshTokenFamilies()
+        families.issue("sid", "R_1", {"revoked": False})
+        families.issue("sid", "R_2", {"revoked": False})
+
+        assert families.is_active("sid", "R_2")
+        assert families.is_active("sid", "R_2")
+
+    def test_reuse_revokes_family(self):
+        families = RefreshTokenFamilies()
+        families.issue("sid", "R_1", {"revoked": False})
+        families.issue("sid", "R_2", {"revoked": False})
+
+        assert not families.is_active("sid", "R_1")
+        assert not families.is_active("sid", "R_2")
+        assert families["sid"]["revoked"] is True
+        # Stays revoked
+        families.issue("sid", "R_3", {"revoked": False})
+        assert not families.is_active("sid", "R_3")
+
+    def test_history(self):
+        families = RefreshTokenFamilies(history=1)
+        for token in ("R_1", "R_2", "R_3"):
+            families.issue("sid", token, {"revoked": False})
+
+        # Too old to be recognized, rejected without revoking the family
+        assert not families.is_active("sid", "R_1")
+        assert families.is_active("sid", "R_3")
+
+    def test_revoke(self):
+        families = RefreshTokenFamilies()
+        families.issue("sid", "R_1", {"revoked": False})
+        families.revoke("sid")
+        families.revoke("other")
+
+        assert not families.is_active("sid", "R_1")
+
+    def test_mapping(self):
+        families = RefreshTokenFamilies()
+        families["sid"] = {"revoked": False}
+
+        assert families.is_active("sid", "R_any")
+        assert list(families) == ["sid"]
+        del families["sid"]
+        assert "sid" not in families
+
+
+class TestSessionDBRotation(object):
+    @pytest.fixture(autouse=True)
+    def create_sdb(self):
+        self.families = RefreshTokenFamilies()
+        self.sdb = create_session_db(
+            "https://example.com/",
+            "secret",
+            "password",
+            refresh_token_storage=self.families,
+        )
+        sid = self.sdb.create_authz_session(AuthnEvent("uid", "salt"), AREQ)
+        self.sdb.do_sub(sid, "client_salt")
+        self.sid = sid
+        self.rtoken = self.sdb.upgrade_to_token(
+            self.sdb[sid]["code"], issue_refresh=True
+        )["refresh_token"]
+
+    def test_rotated(self):
+        _dict = self.sdb.refresh_token(self.rtoken, AREQ["client_id"])
+        rtoken = _dict["refresh_token"]
+
+        assert rtoken != self.rtoken
+        assert self.sdb.is_valid(rtoken)
+        assert not self.sdb.is_valid(self.rtoken)
+
+    def test_reuse_detected(self):
+        rtoken = self.sdb.refresh_token(self.rtoken, AREQ["client_id"])["refresh_token"]
+        with pytest.raises(ExpiredToken):
+            self.sdb.refresh_token(self.rtoken, AREQ["client_id"])
+        with pytest.raises(ExpiredToken):
+            self.sdb.refresh_token(rtoken, AREQ["client_id"])
+
+    def test_revoke_all_tokens(self):
+        access_token = self.sdb[self.sid]["access_token"]
+        self.sdb.revoke_all_tokens(access_token)
+
+        assert self.families[self.sid]["revoked"] is True
+        with pytest.raises(ExpiredToken):
+            self.sdb.refresh_token(self.rtoken, AREQ["client_id"])
+
+    def test_session_removed(self):
+        del self.sdb[self.sid]
+        _dict = self.sdb.refresh_token(self.rtoken, AREQ["client_id"])
+        assert self.sdb.is_valid(_dict["refresh_token"])
+
+    def test_without_rotation(self):
+        self.families.rotate = False
+        _dict = self.sdb.refresh_token(self.rtoken, AREQ["client_id"])
+        assert _dict["refresh_token"] == self.rtoken
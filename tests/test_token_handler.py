@@ -1,5 +1,6 @@
 import pytest
 
+from oic.utils.jti_store import SQLJTIStore
 from oic.utils.keyio import KeyBundle
 from oic.utils.keyio import KeyJar
 from oic.utils.token_handler import NotAllowed
@@ -126,3 +127,22 @@ class TestTokenHandler(object):
         assert _eq(list(info.keys()), ["jti", "exp", "iss", "aud", "iat", "kid", "azp"])
 
         assert self.th.refresh_token_factory.db[info["jti"]] == sid
+
+    def test_shared_jti_store(self, tmp_path):
+        path = str(tmp_path / "jti.db")
+        handlers = [
+            TokenHandler(
+                "https://example.com/as",
+                self.th.token_policy,
+                keyjar=KEYJAR,
+                jti_store=SQLJTIStore(path),
+            )
+            for _ in range(2)
+        ]
+        token = handlers[0].get_access_token(
+            "https://example.org/rp", "foo bar", "client_credentials"
+        )
+
+        assert handlers[1].token_factory.valid(token)
+        handlers[1].invalidate(token)
+        assert not handlers[0].token_factory.valid(token)